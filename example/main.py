@@ -1,14 +1,8 @@
 import webapp2
 from google.appengine.ext.webapp.template import render
-from google.appengine.api import runtime
 
 import os
-import gc
-
-import time
-import timeit
-
-from datetime import datetime
+import json
 
 class MainPage(webapp2.RequestHandler):
     def get(self):
@@ -17,123 +11,29 @@ class MainPage(webapp2.RequestHandler):
         self.response.out.write(render(template, data))
 
 class TimeitPage(webapp2.RequestHandler):
+    """ Runs the spytz.bench suite against the deployed datastore backend,
+    alongside pytz, and returns the results as JSON. Building every zone
+    takes most of a request's deadline, so it only runs with 'all_zones=1'.
+    """
     def get(self):
-        repeat = self.request.get("repeat", 5)
-        iter = self.request.get("iter", 100)
-
-        self.response.headers['Content-Type'] = 'text/plain'
-        
-        stmt1 = """\
         import pytz
-        from datetime import datetime
-        tz_strings = ('Australia/Perth', 'Australia/Melbourne', 'Europe/London',
-                      'America/Indiana/Indianapolis')
-        for tz in tz_strings:
-            dt = datetime(2009, 4, 15)
-            pytz.timezone(tz)
-        """
-        
-        stmt2 = """\
-        import spytz3
-        from datetime import datetime
-        tz_strings = ('Australia/Perth', 'Australia/Melbourne', 'Europe/London',
-                      'America/Indiana/Indianapolis')
-        for tz in tz_strings:
-            dt = datetime(2009, 4, 15)
-            spytz3.timezone(tz)
-        """
-
-        stmt3 = """\
-        import pytz
-        from datetime import datetime
-        tz_strings = ('Australia/Perth', 'Australia/Melbourne', 'Europe/London',
-                      'America/Indiana/Indianapolis')
-        for tz in tz_strings:
-            dt = datetime(2009, 4, 15)
-            pytz.timezone(tz)
-        pytz.clear_cache()
-        """
-        
-        stmt4 = """\
-        import spytz3
-        from datetime import datetime
-        tz_strings = ('Australia/Perth', 'Australia/Melbourne', 'Europe/London',
-                      'America/Indiana/Indianapolis')
-        for tz in tz_strings:
-            dt = datetime(2009, 4, 15)
-            spytz3.timezone(tz)
-        spytz3.clear_cache()
-        """
-        
-        gc.collect()
-        self.response.write("-- cache --\n")
-
-        mem_st = runtime.memory_usage().current()
-        cpu_st = runtime.cpu_usage().total()
-        t1 = timeit.repeat(stmt=stmt1, number=100, repeat=4)
-        mem = runtime.memory_usage().current() - mem_st
-        cpu = runtime.cpu_usage().total() - cpu_st
-        self.response.write("PYTZ    cpu:{}, memory: {}\n".format(cpu, mem))
-        self.response.write("timeit: {}\n".format(t1))
-
-        mem_st = runtime.memory_usage().current()
-        cpu_st = runtime.cpu_usage().total()
-        gc.collect()
-        time.sleep(1)
-        mem = runtime.memory_usage().current() - mem_st
-        cpu = runtime.cpu_usage().total() - cpu_st
-        self.response.write("SLEEP   cpu:{}, memory: {}\n".format(cpu, mem))
-
-        mem_st = runtime.memory_usage().current()
-        cpu_st = runtime.cpu_usage().total()
-        t2 = timeit.repeat(stmt=stmt2, number=100, repeat=4)
-        mem = runtime.memory_usage().current() - mem_st
-        cpu = runtime.cpu_usage().total() - cpu_st
-        self.response.write("SPYTZ   cpu:{}, memory: {}\n".format(cpu, mem))
-        self.response.write("timeit: {}\n".format(t2))
-
-        self.response.write("\n")
-        self.response.write("-- clear cache --\n")
-
-        mem_st = runtime.memory_usage().current()
-        cpu_st = runtime.cpu_usage().total()
-        gc.collect()
-        time.sleep(1)
-        mem = runtime.memory_usage().current() - mem_st
-        cpu = runtime.cpu_usage().total() - cpu_st
-        self.response.write("SLEEP   cpu:{}, memory: {}\n".format(cpu, mem))
-
-        mem_st = runtime.memory_usage().current()
-        cpu_st = runtime.cpu_usage().total()
-        t3 = timeit.repeat(stmt=stmt3, number=100, repeat=4)
-        mem = runtime.memory_usage().current() - mem_st
-        cpu = runtime.cpu_usage().total() - cpu_st
-        self.response.write("PYTZ    cpu:{}, memory: {}\n".format(cpu, mem))
-        self.response.write("timeit: {}\n".format(t3))
-
-        mem_st = runtime.memory_usage().current()
-        cpu_st = runtime.cpu_usage().total()
-        gc.collect()
-        time.sleep(1)
-        mem = runtime.memory_usage().current() - mem_st
-        cpu = runtime.cpu_usage().total() - cpu_st
-        self.response.write("SLEEP   cpu:{}, memory: {}\n".format(cpu, mem))
-
-        mem_st = runtime.memory_usage().current()
-        cpu_st = runtime.cpu_usage().total()
-        t4 = timeit.repeat(stmt=stmt4, number=100, repeat=4)
-        mem = runtime.memory_usage().current() - mem_st
-        cpu = runtime.cpu_usage().total() - cpu_st
-        self.response.write("SPYTZ   cpu:{}, memory: {}\n".format(cpu, mem))
-        self.response.write("timeit: {}\n".format(t4))
-
-        mem_st = runtime.memory_usage().current()
-        cpu_st = runtime.cpu_usage().total()
-        gc.collect()
-        time.sleep(1)
-        mem = runtime.memory_usage().current() - mem_st
-        cpu = runtime.cpu_usage().total() - cpu_st
-        self.response.write("SLEEP   cpu:{}, memory: {}\n".format(cpu, mem))
+        import spytz
+        from spytz import bench
+
+        number = int(self.request.get("iter", 1000))
+        repeat = int(self.request.get("repeat", 3))
+        all_zones = self.request.get("all_zones") == "1"
+
+        report = {}
+        for mod in (pytz, spytz):
+            result = bench.describe(mod)
+            result['results'] = bench.run_suite(mod, number=number,
+                                                repeat=repeat,
+                                                all_zones=all_zones)
+            report[mod.__name__] = result
+
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(report, indent=4, sort_keys=True))
 
 app = webapp2.WSGIApplication([
     ('/', MainPage),
@@ -18,20 +18,57 @@ __all__ = [
     'country_timezones', 'country_names',
     'AmbiguousTimeError', 'InvalidTimeError',
     'NonExistentTimeError', 'UnknownTimeZoneError',
-    'all_timezones',
+    'all_timezones', 'all_timezones_set', 'stats',
+    'nearest_timezones', 'nearest_timezones_many',
+    'dumps_datetimes', 'loads_datetimes', 'convert_wallclock',
+    'zone_transitions_between', 'upcoming_transitions',
+    'zones_for_abbreviation', 'zones_for_offset',
+    'fixed_offset_from_string', 'parse_iso_datetime', 'parse_iso_datetimes',
     ]
 
+import sys
+import time
 import datetime
 
-from cStringIO import StringIO
-from spytz import gaetz
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+try:
+    # A precompiled bundle generated by 'utils/spkg.py compile' replaces the
+    # datastore as the source of timezone data. No tzfile parsing or storage
+    # RPCs are needed when it is present.
+    from spytz import zonebundle
+except ImportError:
+    zonebundle = None
+    try:
+        from spytz import gaetz
+    except ImportError:
+        # Neither a bundle nor App Engine, timezones are only available
+        # through an async backend, see spytz.aio.
+        gaetz = None
+else:
+    gaetz = None
 
 from spytz.exceptions import AmbiguousTimeError
 from spytz.exceptions import InvalidTimeError
 from spytz.exceptions import NonExistentTimeError
 from spytz.exceptions import UnknownTimeZoneError
 from spytz.tzinfo import unpickler
-from spytz.tzfile import build_tzinfo
+from spytz.counters import stats
+from spytz import counters
+from spytz import geo
+from spytz import transitions
+from spytz import reverse
+from spytz.tzinfo import _to_utc, _to_seconds, _epoch
+from spytz.tzinfo import _day_bounds, _start_of, _transitions_cache
+from spytz.tzfile import build_tzinfo_from_table
+from spytz.serialize import dumps_datetimes, loads_datetimes
+from spytz import conversion
+from spytz.conversion import convert_wallclock
+from spytz.iso import parse_datetime as parse_iso_datetime
+from spytz.iso import parse_datetimes as parse_iso_datetimes
 
 """
 Methods to add:
@@ -46,12 +83,35 @@ from struct import unpack, calcsize # required for is_tzdata()
 
 
 all_timezones = []
+all_timezones_set = frozenset()
 _tzinfo_cache = {}
 
+# Names listed in all_timezones whose data turned out not to exist, mapped to
+# the time the entry expires. Bounded, as the names come from client input.
+_unknown_cache = {}
+UNKNOWN_CACHE_SIZE = 1000
+UNKNOWN_CACHE_TIME = 300 # 5 minutes
+_country_index = None
+_geo_index = None
+_transition_index = None
+_reverse_index = None
+# Mapped timezone tables, see spytz.shared.install().
+_shared_tables = None
+# True while all_timezones is a stale copy served during a memcache refill,
+# so it is fetched again on the next timezone() miss.
+_all_timezones_stale = False
+
 
 def set_all_timezones_cache():
-    global all_timezones
-    all_timezones = gaetz.get_all_timezones()
+    global all_timezones, all_timezones_set, _all_timezones_stale
+    if _shared_tables is not None:
+        all_timezones = list(_shared_tables.zones)
+    elif zonebundle is not None:
+        all_timezones = list(zonebundle.ALL_TIMEZONES)
+    elif gaetz is not None:
+        all_timezones, _all_timezones_stale = gaetz.get_all_timezones(
+            with_stale=True)
+    all_timezones_set = frozenset(all_timezones)
 
 
 # Build all_timezones first time the module is imported.
@@ -64,36 +124,343 @@ def timezone(tz):
         return utc
 
     try:
-        return _tzinfo_cache[tz.encode('US-ASCII')]
-    except UnicodeEncodeError:
-        # All valid timezones are ASCII.
-        raise UnknownTimeZoneError(tz)
+        tzinfo = _tzinfo_cache[tz]
     except KeyError:
         # Not in _tzinfo_cache, so fetch and build the timezone.
-        if tz in all_timezones:
-            # Get from memcache.
-            _tzinfo_cache[tz] = build_tzinfo(tz, gaetz.get_tzdata(tz))
-        else:
+        counters.incr('process_cache.misses')
+        try:
+            # All valid timezones are ASCII.
+            tz = str(tz)
+        except UnicodeError:
             raise UnknownTimeZoneError(tz)
 
+        if _all_timezones_stale:
+            set_all_timezones_cache()
+        if tz not in all_timezones_set or _is_unknown(tz):
+            raise UnknownTimeZoneError(tz)
+
+        if _shared_tables is not None:
+            _tzinfo_cache[tz] = _shared_tables.build_tzinfo(tz)
+            return _tzinfo_cache[tz]
+        elif zonebundle is not None:
+            table = zonebundle.ZONES[tz]
+        else:
+            try:
+                # Get from memcache.
+                table, stale = gaetz.get_tzdata(tz, with_stale=True)
+            except UnknownTimeZoneError:
+                _add_unknown(tz)
+                raise UnknownTimeZoneError(tz)
+            if stale:
+                # A stale copy served during a refill is only used once.
+                if table is None:
+                    raise UnknownTimeZoneError(tz)
+                return build_tzinfo_from_table(tz, table)
+        _tzinfo_cache[tz] = build_tzinfo_from_table(tz, table)
+
         return _tzinfo_cache[tz]
+    else:
+        counters.incr('process_cache.hits')
+        return tzinfo
 
 def timezones(*tzs):
     return [timezone(tz) for tz in tzs]
 
+
+def _is_unknown(tz):
+    """ True if tz was recently confirmed not to exist. """
+    expires = _unknown_cache.get(tz)
+    if expires is None:
+        return False
+    if expires < time.time():
+        _unknown_cache.pop(tz, None)
+        return False
+    counters.incr('unknown_cache.hits')
+    return True
+
+
+def _add_unknown(tz):
+    """ Remember tz doesn't exist for UNKNOWN_CACHE_TIME seconds. """
+    if len(_unknown_cache) >= UNKNOWN_CACHE_SIZE:
+        _unknown_cache.clear()
+    _unknown_cache[tz] = time.time() + UNKNOWN_CACHE_TIME
+
+
+if gaetz is not None:
+    @gaetz.ndb.tasklet
+    def timezone_async(tz):
+        """ Returns an ndb Future for timezone(tz), so a cold timezone fetch
+        can overlap with the caller's own datastore and memcache I/O.
+        """
+        if tz.upper() == 'UTC':
+            raise gaetz.ndb.Return(utc)
+
+        try:
+            tzinfo = _tzinfo_cache[tz]
+        except KeyError:
+            counters.incr('process_cache.misses')
+            try:
+                # All valid timezones are ASCII.
+                tz = str(tz)
+            except UnicodeError:
+                raise UnknownTimeZoneError(tz)
+            if _all_timezones_stale:
+                set_all_timezones_cache()
+            if tz not in all_timezones_set or _is_unknown(tz):
+                raise UnknownTimeZoneError(tz)
+
+            try:
+                table, stale = yield gaetz.get_tzdata_async(tz,
+                                                            with_stale=True)
+            except UnknownTimeZoneError:
+                _add_unknown(tz)
+                raise UnknownTimeZoneError(tz)
+            if stale:
+                if table is None:
+                    raise UnknownTimeZoneError(tz)
+                raise gaetz.ndb.Return(build_tzinfo_from_table(tz, table))
+            # Another tasklet may have built the timezone in the meantime.
+            tzinfo = _tzinfo_cache.setdefault(
+                tz, build_tzinfo_from_table(tz, table))
+        else:
+            counters.incr('process_cache.hits')
+
+        raise gaetz.ndb.Return(tzinfo)
+
+
+    @gaetz.ndb.tasklet
+    def timezones_async(*tzs):
+        """ Returns an ndb Future for timezones(*tzs). The memcache reads
+        of all cold timezones are batched together.
+        """
+        result = yield [timezone_async(tz) for tz in tzs]
+        raise gaetz.ndb.Return(result)
+
+
+def _get_country_index():
+    """ Loads the country index once per process, from the bundle or from
+    gaetz. Cleared by flush_local_cache().
+    """
+    global _country_index
+    if _country_index is None:
+        if zonebundle is not None:
+            _country_index = {'names': zonebundle.COUNTRY_NAMES,
+                              'zones': zonebundle.COUNTRY_ZONES}
+        elif gaetz is not None:
+            index, stale = gaetz.get_country_index(with_stale=True)
+            if stale:
+                # Served during a memcache refill, fetched again next time.
+                return index
+            _country_index = index
+        else:
+            _country_index = {'names': {}, 'zones': {}}
+    return _country_index
+
+
+class _CountryIndexDict(Mapping):
+    '''Read only, case insensitive view of one part of the country index'''
+    _part = None
+
+    def __getitem__(self, iso3166_code):
+        return _get_country_index()[self._part][iso3166_code.upper()]
+
+    def __iter__(self):
+        return iter(_get_country_index()[self._part])
+
+    def __len__(self):
+        return len(_get_country_index()[self._part])
+
+
+class _CountryTimezoneDict(_CountryIndexDict):
+    '''Map ISO 3166 country code to a list of timezone names commonly used
+    in that country.
+
+    iso3166_code is the two letter code used to identify the country.
+
+    >>> country_timezones['nz'] == ['Pacific/Auckland', 'Pacific/Chatham']
+    True
+    >>> country_timezones('ch') == ['Europe/Zurich']
+    True
+    '''
+    _part = 'zones'
+
+    def __call__(self, iso3166_code):
+        '''Backwards compatibility.'''
+        return self[iso3166_code]
+
+country_timezones = _CountryTimezoneDict()
+
+
+class _CountryNameDict(_CountryIndexDict):
+    '''Dictionary proving ISO3166 code -> English name.
+
+    >>> print(country_names['au'])
+    Australia
+    '''
+    _part = 'names'
+
+country_names = _CountryNameDict()
+
+
+def _get_geo_index():
+    """ Loads the nearest timezone index once per process, from the bundle
+    or from gaetz. Cleared by flush_local_cache().
+    """
+    global _geo_index
+    if _geo_index is None:
+        if zonebundle is not None:
+            _geo_index = zonebundle.GEO_INDEX
+        elif gaetz is not None:
+            index, stale = gaetz.get_geo_index(with_stale=True)
+            if stale:
+                return index
+            _geo_index = index
+        else:
+            _geo_index = []
+    return _geo_index
+
+
+def nearest_timezones(lat, lon, k=1):
+    """ Returns the names of the k timezones whose zone.tab locations are
+    nearest to the latitude and longitude given in degrees, nearest first.
+    Only timezones listed in zone.tab are candidates.
+    """
+    return geo.nearest(_get_geo_index(), lat, lon, k)
+
+
+def nearest_timezones_many(points, k=1):
+    """ nearest_timezones() for each of a sequence of (lat, lon) pairs,
+    returned as a list in the same order as points.
+    """
+    return geo.nearest_many(_get_geo_index(), points, k)
+
+
+
+def _get_transition_index():
+    """ Loads the upcoming transition index once per process, from the
+    bundle or from gaetz. Cleared by flush_local_cache().
+    """
+    global _transition_index
+    if _transition_index is None:
+        if zonebundle is not None:
+            _transition_index = getattr(zonebundle, 'TRANSITION_INDEX', [])
+        elif gaetz is not None:
+            index, stale = gaetz.get_transition_index(with_stale=True)
+            if stale:
+                return index
+            _transition_index = index
+        else:
+            _transition_index = []
+    return _transition_index
+
+
+def zone_transitions_between(start, end):
+    """ Returns a list of spytz.transitions.ZoneTransition records, sorted
+    by time, for every timezone with a transition from start up to but not
+    including end. start and end are aware datetimes, or naive datetimes in
+    UTC. Transitions from the year the timezone data was installed are
+    indexed. Earlier ones are found by loading every timezone, which is
+    much slower.
+    """
+    index = _get_transition_index()
+    start = _to_utc(start)
+    end = _to_utc(end)
+    found = []
+
+    since = transitions.indexed_from(index)
+    if since is None:
+        since = end
+    else:
+        since = _epoch + datetime.timedelta(seconds=since)
+    if start < since:
+        for zone in all_timezones:
+            for transition in timezone(zone).transitions_between(
+                    start, min(end, since)):
+                found.append(transitions.ZoneTransition(transition.utc, zone))
+        found.sort()
+        start = since
+
+    if start < end:
+        found.extend(transitions.between(index,
+                                         _to_seconds(start - _epoch),
+                                         _to_seconds(end - _epoch)))
+    return found
+
+
+def upcoming_transitions(days=7, now=None):
+    """ Returns zone_transitions_between() for the 'days' days from now,
+    or from the aware or naive UTC datetime 'now' if given.
+    """
+    if now is None:
+        now = datetime.datetime.utcnow()
+    return zone_transitions_between(now, _to_utc(now) +
+                                    datetime.timedelta(days=days))
+
+
+def _get_reverse_index():
+    """ Loads the abbreviation and offset index once per process, from the
+    bundle or from gaetz. Cleared by flush_local_cache().
+    """
+    global _reverse_index
+    if _reverse_index is None:
+        if zonebundle is not None:
+            _reverse_index = getattr(zonebundle, 'REVERSE_INDEX', None)
+        elif gaetz is not None:
+            index, stale = gaetz.get_reverse_index(with_stale=True)
+            if stale:
+                return index
+            _reverse_index = index
+        if _reverse_index is None:
+            _reverse_index = {'abbreviations': {}, 'offsets': {}}
+    return _reverse_index
+
+
+def zones_for_abbreviation(abbreviation, historic=False):
+    """ Returns a list of the timezones using an abbreviation such as
+    'EST' or 'CEST', in any case. Only timezones currently using it are
+    returned, unless 'historic' is True.
+    """
+    return reverse.zones_for_abbreviation(_get_reverse_index(), abbreviation,
+                                          historic)
+
+
+def zones_for_offset(offset):
+    """ Returns a list of the timezones currently using a UTC offset, as
+    either standard or daylight saving time. 'offset' is a timedelta, or a
+    number of minutes as for FixedOffset().
+    """
+    if isinstance(offset, datetime.timedelta):
+        seconds = offset.days * 86400 + offset.seconds
+    else:
+        seconds = offset * 60
+    return reverse.zones_for_offset(_get_reverse_index(), seconds)
+
 def flush_app_cache():
     """ Flushes the appengine cache stores, primarily memcache. Required after
     any timezone data updates to ensure the new timezone is picked up.
     """
-    gaetz.flush_cache()
+    if gaetz is not None:
+        gaetz.flush_cache()
     
     
 def flush_local_cache():
     """ Flushes the local module cache stores. Required after any timezone 
     data updates to ensure the new timezone is picked up. Also used for 
     """
+    global _country_index, _geo_index, _transition_index, _reverse_index
     _tzinfo_cache.clear()
-    all_timezones = None
+    _unknown_cache.clear()
+    conversion._table_cache.clear()
+    _transitions_cache.clear()
+    # spytz.batch imports multiprocessing, so it's only cleared once used.
+    batch = sys.modules.get('spytz.batch')
+    if batch is not None:
+        batch._tables.clear()
+    _country_index = None
+    _geo_index = None
+    _transition_index = None
+    _reverse_index = None
+    set_all_timezones_cache()
 
 
 def flush_cache():
@@ -167,6 +534,36 @@ class UTC(datetime.tzinfo):
             raise ValueError('Naive time - no tzinfo set')
         return dt.astimezone(self)
 
+    def next_transition(self, dt):
+        '''UTC has no transitions, returns None'''
+        return None
+
+    def prev_transition(self, dt):
+        '''UTC has no transitions, returns None'''
+        return None
+
+    def transitions_between(self, start, end):
+        '''UTC has no transitions, returns []'''
+        return []
+
+    def now(self):
+        '''Return the current time in this timezone'''
+        return self.fromutc(datetime.datetime.utcnow().replace(tzinfo=self))
+
+    def day_bounds(self, date=None):
+        '''Return the aware datetimes starting date and the day after, for
+        today if date is None'''
+        if date is None:
+            date = self.now()
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        return _day_bounds(self, date)
+
+    def start_of(self, period, dt=None):
+        '''Return the aware datetime starting the day, week, month or year
+        containing dt'''
+        return _start_of(self, period, dt)
+
     def __repr__(self):
         return "<UTC>"
 
@@ -244,6 +641,36 @@ class _FixedOffset(datetime.tzinfo):
     def tzname(self, dt):
         return None
 
+    def next_transition(self, dt):
+        '''Fixed offsets have no transitions, returns None'''
+        return None
+
+    def prev_transition(self, dt):
+        '''Fixed offsets have no transitions, returns None'''
+        return None
+
+    def transitions_between(self, start, end):
+        '''Fixed offsets have no transitions, returns []'''
+        return []
+
+    def now(self):
+        '''Return the current time in this timezone'''
+        return self.fromutc(datetime.datetime.utcnow().replace(tzinfo=self))
+
+    def day_bounds(self, date=None):
+        '''Return the aware datetimes starting date and the day after, for
+        today if date is None'''
+        if date is None:
+            date = self.now()
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        return _day_bounds(self, date)
+
+    def start_of(self, period, dt=None):
+        '''Return the aware datetime starting the day, week, month or year
+        containing dt'''
+        return _start_of(self, period, dt)
+
     def __repr__(self):
         return 'pytz.FixedOffset(%d)' % self._minutes
 
@@ -327,3 +754,61 @@ def FixedOffset(offset, _tzinfos = {}):
     return info
 
 FixedOffset.__safe_for_unpickling__ = True
+
+
+def fixed_offset_from_string(offset, _tzinfos={}):
+    """return a fixed-offset timezone from an ISO 8601 UTC offset string.
+
+        >>> fixed_offset_from_string('+05:30')
+        pytz.FixedOffset(330)
+        >>> fixed_offset_from_string('-0800')
+        pytz.FixedOffset(-480)
+        >>> fixed_offset_from_string('+10')
+        pytz.FixedOffset(600)
+
+    'Z' and zero offsets return UTC.
+
+        >>> fixed_offset_from_string('Z') is UTC
+        True
+        >>> fixed_offset_from_string('-00:00') is UTC
+        True
+
+    The result for each string is kept, so each distinct string is only
+    parsed once, and the timezone is the same instance FixedOffset() returns.
+
+        >>> fixed_offset_from_string('+0530') is FixedOffset(330)
+        True
+    """
+    info = _tzinfos.get(offset)
+    if info is not None:
+        return info
+
+    if offset in ('Z', 'z'):
+        return _tzinfos.setdefault(offset, UTC)
+
+    # +HH, +HHMM or +HH:MM
+    size = len(offset)
+    digits = offset[1:3] + offset[size - 2:] if size > 3 else offset[1:]
+    if (offset[:1] not in ('+', '-') or size not in (3, 5, 6)
+            or (size == 6 and offset[3] != ':') or not digits.isdigit()
+            or digits[2:] >= '60'):
+        raise ValueError('Invalid UTC offset %r' % (offset,))
+
+    minutes = int(digits[:2]) * 60 + int(digits[2:] or 0)
+    if offset[0] == '-':
+        minutes = -minutes
+    return _tzinfos.setdefault(offset, FixedOffset(minutes))
+
+
+if sys.version_info >= (3, 5):
+    # asyncio API, see spytz.aio. It is imported on first use, so importing
+    # spytz doesn't import asyncio.
+    def atimezone(tz):
+        '''Async timezone(), returning an awaitable'''
+        from spytz import aio
+        return aio.atimezone(tz)
+
+    def atimezones(*tzs):
+        '''Async timezones(), returning an awaitable'''
+        from spytz import aio
+        return aio.atimezones(*tzs)
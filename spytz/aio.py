@@ -0,0 +1,375 @@
+'''
+asyncio support for spytz, for services running outside App Engine.
+Requires Python 3.5 or later.
+
+Timezones are fetched through an async storage backend and built into the
+same module cache spytz.timezone() uses, so once a timezone has been
+awaited it is also available synchronously. Concurrent requests for a
+timezone that is still being fetched share a single fetch.
+
+    from spytz import aio
+    aio.set_backend(aio.FileBackend('/srv/spytz-zoneinfo-2014.4'))
+
+Any backend can be wrapped in a DiskCacheBackend to keep the timezones it
+returns in a local spytz.diskcache.DiskCache.
+
+    tz = await spytz.atimezone('Australia/Melbourne')
+
+The module is written with futures and callbacks rather than async and
+await, so it still compiles with the rest of the package on Python 2 and
+in the App Engine deploy step, where it is never imported. Backends return
+awaitables, and may be written as coroutines on Python 3.
+'''
+
+import asyncio
+import inspect
+import os
+import weakref
+
+import spytz
+from spytz import codec
+from spytz import counters
+from spytz.exceptions import UnknownTimeZoneError
+from spytz.tzfile import parse_tzfile, build_tzinfo_from_table
+
+__all__ = ['atimezone', 'atimezones', 'set_backend', 'AsyncBackend',
+           'BundleBackend', 'FileBackend', 'CacheClientBackend',
+           'DiskCacheBackend']
+
+
+def _completed(value):
+    '''Return a future already holding value'''
+    future = asyncio.get_event_loop().create_future()
+    future.set_result(value)
+    return future
+
+
+def _failed(exc):
+    '''Return a future already holding the exception exc'''
+    future = asyncio.get_event_loop().create_future()
+    future.set_exception(exc)
+    return future
+
+
+def _copy(source, future):
+    '''Give future the outcome of the done future source'''
+    if future.done():
+        return
+    if source.cancelled():
+        future.cancel()
+    elif source.exception() is not None:
+        future.set_exception(source.exception())
+    else:
+        future.set_result(source.result())
+
+
+def _then(awaitable, func):
+    '''Return a future for func(result of awaitable). func may return
+    another awaitable, whose result is used in turn.'''
+    source = asyncio.ensure_future(awaitable)
+    future = asyncio.get_event_loop().create_future()
+
+    def done(source):
+        if future.done():
+            return
+        if source.cancelled() or source.exception() is not None:
+            return _copy(source, future)
+        try:
+            value = func(source.result())
+        except Exception as e:
+            return future.set_exception(e)
+        if inspect.isawaitable(value):
+            asyncio.ensure_future(value).add_done_callback(
+                lambda result: _copy(result, future))
+        else:
+            future.set_result(value)
+
+    source.add_done_callback(done)
+    return future
+
+
+class AsyncBackend(object):
+    '''Protocol for async timezone storage backends'''
+
+    def get_all_timezones(self):
+        '''Return an awaitable for a list of every timezone name the backend
+        holds'''
+        raise NotImplementedError
+
+    def get_table(self, zone):
+        '''Return an awaitable for the parse_tzfile() table for zone, or None
+        if it doesn't exist'''
+        raise NotImplementedError
+
+    def get_version(self):
+        '''Return an awaitable for the version of the timezone data, or None
+        if unknown'''
+        return _completed(None)
+
+
+class BundleBackend(AsyncBackend):
+    '''Timezones from the compiled spytz.zonebundle. No I/O is done.'''
+
+    def __init__(self, bundle=None):
+        if bundle is None:
+            bundle = spytz.zonebundle
+        self.bundle = bundle
+
+    def get_all_timezones(self):
+        return _completed(list(self.bundle.ALL_TIMEZONES))
+
+    def get_table(self, zone):
+        return _completed(self.bundle.ZONES.get(zone))
+
+    def get_version(self):
+        return _completed(self.bundle.VERSION)
+
+
+class FileBackend(AsyncBackend):
+    '''Timezones from a directory of tzfile(5) files, such as an extracted
+    spytz release package or /usr/share/zoneinfo. Files are read in a thread
+    pool so the event loop never blocks on disk.
+    '''
+
+    def __init__(self, path, executor=None):
+        self.path = os.path.abspath(path)
+        self.executor = executor
+
+    def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, func, *args)
+
+    def _read_all_timezones(self):
+        # Release packages list their timezones, otherwise look for them.
+        alltzs = os.path.join(self.path, 'alltzs')
+        if os.path.exists(alltzs):
+            with open(alltzs) as fo:
+                return [l.strip() for l in fo if l.strip()]
+
+        zones = []
+        for dirname, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                path = os.path.join(dirname, filename)
+                with open(path, 'rb') as fo:
+                    if spytz.is_tzdata(fo):
+                        zones.append(os.path.relpath(path, self.path)
+                                     .replace(os.path.sep, '/'))
+        return sorted(zones)
+
+    def _read_table(self, zone):
+        path = os.path.normpath(os.path.join(self.path, *zone.split('/')))
+        if not path.startswith(self.path + os.path.sep):
+            return None
+        try:
+            with open(path, 'rb') as fo:
+                return parse_tzfile(fo)
+        except (IOError, OSError):
+            return None
+
+    def get_all_timezones(self):
+        return self._run(self._read_all_timezones)
+
+    def _read_version(self):
+        # Only release packages are versioned.
+        try:
+            with open(os.path.join(self.path, 'VERSION')) as fo:
+                return fo.read().strip() or None
+        except (IOError, OSError):
+            return None
+
+    def get_table(self, zone):
+        return self._run(self._read_table, zone)
+
+    def get_version(self):
+        return self._run(self._read_version)
+
+
+class CacheClientBackend(AsyncBackend):
+    '''Timezones from an async memcached or Redis compatible client.
+
+    client must have a coroutine get(key) returning bytes or None, as
+    aiomcache and aioredis clients do. Each timezone is stored under
+    prefix + name, encoded with any spytz.codec, and the list of all
+    timezones is stored comma separated under prefix + alltzs_key. version
+    is the version of the stored data, if known.
+    '''
+
+    def __init__(self, client, prefix='spytz:', alltzs_key='_alltzs_',
+                 version=None):
+        self.client = client
+        self.prefix = prefix
+        self.alltzs_key = alltzs_key
+        self.version = version
+
+    def _key(self, name):
+        return (self.prefix + name).encode('US-ASCII')
+
+    def get_all_timezones(self):
+        def split(value):
+            if not value:
+                return []
+            return value.decode('US-ASCII').split(',')
+        return _then(self.client.get(self._key(self.alltzs_key)), split)
+
+    def get_table(self, zone):
+        def decode(blob):
+            if blob is None:
+                counters.incr('memcache.misses')
+                return None
+            counters.incr('memcache.hits')
+            counters.incr('bytes_fetched', len(blob))
+            return codec.decode(blob)
+        return _then(self.client.get(self._key(zone)), decode)
+
+    def get_version(self):
+        return _completed(self.version)
+
+
+class DiskCacheBackend(AsyncBackend):
+    '''Caches the timezones of another backend in a spytz.diskcache.DiskCache,
+    so they survive restarts and are shared between processes. Entries are
+    keyed by the backend's data version, and nothing is cached for backends
+    with an unknown version.
+    '''
+
+    def __init__(self, backend, cache, alltzs_key='_alltzs_', executor=None):
+        self.backend = backend
+        self.cache = cache
+        self.alltzs_key = alltzs_key
+        self.executor = executor
+        self._version = None
+
+    def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, func, *args)
+
+    def _cached(self, key, fetch, *args):
+        def lookup(version):
+            if version is None:
+                return fetch(*args)
+            return _then(self._run(self.cache.get, version, key),
+                         lambda value: found(version, value))
+
+        def found(version, value):
+            if value is not None:
+                counters.incr('disk_cache.hits')
+                return value
+            counters.incr('disk_cache.misses')
+            return _then(fetch(*args), lambda value: store(version, value))
+
+        def store(version, value):
+            if not value:
+                return value
+            return _then(self._run(self.cache.set, version, key, value),
+                         lambda _: value)
+
+        return _then(self.get_version(), lookup)
+
+    def get_all_timezones(self):
+        return self._cached(self.alltzs_key, self.backend.get_all_timezones)
+
+    def get_table(self, zone):
+        return self._cached(zone, self.backend.get_table, zone)
+
+    def get_version(self):
+        if self._version is not None:
+            return _completed(self._version)
+
+        def remember(version):
+            self._version = version
+            return version
+        return _then(self.backend.get_version(), remember)
+
+
+_backend = None
+_all_timezones = None
+
+# Fetches in flight, per event loop, keyed by timezone name.
+_inflight = weakref.WeakKeyDictionary()
+
+
+def set_backend(backend):
+    '''Use backend for atimezone() and atimezones()'''
+    global _backend, _all_timezones
+    _backend = backend
+    _all_timezones = None
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        if spytz.zonebundle is None:
+            raise RuntimeError('No async timezone backend, see '
+                               'spytz.aio.set_backend()')
+        _backend = BundleBackend()
+    return _backend
+
+
+def _coalesce(key, func, *args):
+    '''Run func(*args), which returns an awaitable, once for all concurrent
+    callers using key'''
+    loop = asyncio.get_event_loop()
+    inflight = _inflight.setdefault(loop, {})
+    future = inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(func(*args))
+        inflight[key] = future
+        future.add_done_callback(lambda f: inflight.pop(key, None))
+    # Shield the shared fetch from cancellation of any single caller.
+    return asyncio.shield(future)
+
+
+def _load_all_timezones(backend):
+    def remember(all_timezones):
+        global _all_timezones
+        _all_timezones = frozenset(all_timezones)
+        return _all_timezones
+    return _then(backend.get_all_timezones(), remember)
+
+
+def _load(tz):
+    backend = _get_backend()
+
+    def check(all_timezones):
+        if tz not in all_timezones:
+            raise UnknownTimeZoneError(tz)
+        return _then(backend.get_table(tz), build)
+
+    def build(table):
+        if table is None:
+            spytz._add_unknown(tz)
+            raise UnknownTimeZoneError(tz)
+        return spytz._tzinfo_cache.setdefault(
+            tz, build_tzinfo_from_table(tz, table))
+
+    if _all_timezones is None:
+        return _then(_coalesce(None, _load_all_timezones, backend), check)
+    return _then(_completed(_all_timezones), check)
+
+
+def atimezone(tz):
+    '''Async spytz.timezone(), returning an awaitable'''
+    if tz.upper() == 'UTC':
+        return _completed(spytz.utc)
+
+    try:
+        tzinfo = spytz._tzinfo_cache[tz]
+    except KeyError:
+        counters.incr('process_cache.misses')
+        try:
+            # All valid timezones are ASCII.
+            tz.encode('US-ASCII')
+        except UnicodeError:
+            return _failed(UnknownTimeZoneError(tz))
+        if spytz._is_unknown(tz):
+            return _failed(UnknownTimeZoneError(tz))
+        return _coalesce(tz, _load, tz)
+    else:
+        counters.incr('process_cache.hits')
+        return _completed(tzinfo)
+
+
+def atimezones(*tzs):
+    '''Async spytz.timezones(), returning an awaitable. Timezones are
+    fetched concurrently.'''
+    return _then(asyncio.gather(*[atimezone(tz) for tz in tzs]), list)
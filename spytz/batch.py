@@ -0,0 +1,251 @@
+'''
+Conversion of large batches of UTC timestamps to local time across a pool
+of processes, for offline reprocessing outside App Engine.
+
+Records are read a chunk at a time. Each chunk's zone names are sent once,
+with an array of small integer ids referring to them and an array of UTC
+seconds. The worker groups the timestamps by zone, finds the ttinfo in
+effect at each and answers with an array of UTC offsets and an array of
+indexes into the few (tzinfo, offset) pairs the chunk uses, so the parent
+does no lookups of its own.
+
+    for dt in batch.convert(rows, zone_column='tz', time_column='ts'):
+        ...
+
+utcoffsets() yields the offsets arrays as they are, so it scales with the
+number of workers. convert() still builds every datetime in the parent, at
+a timedelta, an addition and a replace() per record, and that bounds its
+throughput however many workers search.
+
+Results are produced in input order while later chunks are being
+converted, and at most a few chunks per worker are held in memory at once.
+Workers load timezones as spytz.timezone() does in their own process.
+Forked workers share a compiled bundle or spytz.shared tables with the
+parent, and spawned workers install the parent's shared tables themselves.
+'''
+
+from array import array
+from bisect import bisect_right
+from collections import deque, OrderedDict
+from datetime import timedelta
+from itertools import islice
+import multiprocessing
+
+import spytz
+from spytz.tzinfo import DstTzInfo, _epoch, _to_seconds
+
+__all__ = ['convert', 'utcoffsets']
+
+CHUNK_SIZE = 50000
+
+# Chunks sent to the pool ahead of the one being returned, per worker.
+PENDING_CHUNKS = 2
+
+_INF = float('inf')
+
+# Per process zone tables, keyed by zone name, least recently used first.
+# See _zone_table(). Cleared by spytz.flush_local_cache().
+_tables = OrderedDict()
+TABLE_CACHE_SIZE = 1000
+
+
+def _build_table(tz):
+    '''Return (starts, indexes, ttinfos) for a tzinfo. starts are the UTC
+    seconds each interval starts, the first -inf, and indexes the position
+    in ttinfos of its (offset seconds, offset timedelta, tzinfo).'''
+    if isinstance(tz, DstTzInfo):
+        starts = []
+        indexes = []
+        ttinfos = []
+        positions = {}
+        for when, inf in zip(tz._utc_transition_times, tz._transition_info):
+            if not starts:
+                starts.append(-_INF)
+            else:
+                starts.append(_to_seconds(when - _epoch))
+            if inf not in positions:
+                positions[inf] = len(ttinfos)
+                ttinfos.append((_to_seconds(inf[0]), inf[0],
+                                tz._tzinfos[inf]))
+            indexes.append(positions[inf])
+        return starts, indexes, ttinfos
+
+    offset = tz.utcoffset(None)
+    return [-_INF], [0], [(_to_seconds(offset), offset, tz)]
+
+
+def _zone_table(zone):
+    '''Return the _build_table() table of a zone name'''
+    try:
+        table = _tables.pop(zone)
+    except KeyError:
+        table = _build_table(spytz.timezone(zone))
+        while len(_tables) >= TABLE_CACHE_SIZE:
+            try:
+                _tables.popitem(last=False)
+            except KeyError:
+                break
+    # Reinserted as the most recently used.
+    return _tables.setdefault(zone, table)
+
+
+def _search(table, timestamps):
+    '''Return the index into the ttinfos of table in effect at each
+    timestamp as bytes'''
+    starts, indexes, ttinfos = table
+    result = bytearray(len(timestamps))
+    start = end = 0
+    current = 0
+    for n, ts in enumerate(timestamps):
+        if not start <= ts < end:
+            i = bisect_right(starts, ts) - 1
+            start = starts[i]
+            end = starts[i + 1] if i + 1 < len(starts) else _INF
+            current = indexes[i]
+        result[n] = current
+    return bytes(result)
+
+
+def _convert_chunk(names, zone_ids, timestamps):
+    '''Return (keys, tzinfos, offsets) for a chunk of records, given the
+    zone names it uses, each record's position in names and its UTC
+    seconds. tzinfos lists the (tzinfo, UTC offset) pairs the chunk uses,
+    keys holds the position in tzinfos of each record's pair and offsets
+    each record's UTC offset in seconds, in input order.'''
+    groups = {}
+    for n, zone_id in enumerate(zone_ids):
+        try:
+            groups[zone_id].append(n)
+        except KeyError:
+            groups[zone_id] = [n]
+
+    count = len(timestamps)
+    keys = array('H' if count <= 0x10000 else 'I', [0]) * count
+    offsets = array('i', [0]) * count
+    tzinfos = []
+    for zone_id, positions in groups.items():
+        table = _zone_table(names[zone_id])
+        if len(positions) == count:
+            found = _search(table, timestamps)
+        else:
+            found = _search(table, array('d', map(timestamps.__getitem__,
+                                                  positions)))
+        found = bytearray(found)
+        ttinfos = table[2]
+        slots = {}
+        for i in set(found):
+            slots[i] = len(tzinfos)
+            tzinfos.append((ttinfos[i][2], ttinfos[i][1]))
+        for n, i in zip(positions, found):
+            keys[n] = slots[i]
+            offsets[n] = ttinfos[i][0]
+    return keys, tzinfos, offsets
+
+
+def _chunks(records, zone_column, time_column, chunk_size):
+    '''Yield the (names, zone_ids, timestamps) _convert_chunk() arguments
+    of each chunk of records'''
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        # Each zone name is sent once, and records refer to it by position.
+        ids = {}
+        zone_ids = [ids.setdefault(record[zone_column], len(ids))
+                    for record in chunk]
+        yield (sorted(ids, key=ids.get),
+               array('H' if len(ids) <= 0x10000 else 'I', zone_ids),
+               array('d', [record[time_column] for record in chunk]))
+
+
+def _pack(values):
+    '''Return an array as (typecode, bytes), which unlike the array itself
+    pickles compactly on Python 2'''
+    if hasattr(values, 'tobytes'):
+        return values.typecode, values.tobytes()
+    return values.typecode, values.tostring()
+
+
+def _unpack(packed):
+    '''Return the array of a _pack() result'''
+    typecode, data = packed
+    return array(typecode, data)
+
+
+def _convert_packed(names, zone_ids, timestamps):
+    '''_convert_chunk() for a pool worker, with _pack()ed arrays'''
+    keys, tzinfos, offsets = _convert_chunk(names, _unpack(zone_ids),
+                                            _unpack(timestamps))
+    return _pack(keys), tzinfos, _pack(offsets)
+
+
+def _init_worker(path):
+    '''Install the parent's spytz.shared tables in a pool worker, which
+    forked workers inherit but spawned ones don't'''
+    if path and getattr(spytz._shared_tables, 'path', None) != path:
+        from spytz import shared
+        shared.install(path)
+
+
+def _results(records, zone_column, time_column, processes, chunk_size):
+    '''Yield the timestamps and _convert_chunk() result of each chunk of
+    records, in input order'''
+    chunks = _chunks(records, zone_column, time_column, chunk_size)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if processes <= 1:
+        for chunk in chunks:
+            yield chunk[2], _convert_chunk(*chunk)
+        return
+
+    pool = multiprocessing.Pool(
+        processes, _init_worker,
+        (getattr(spytz._shared_tables, 'path', None),))
+    try:
+        pending = deque()
+        for names, zone_ids, timestamps in chunks:
+            pending.append((timestamps, pool.apply_async(
+                _convert_packed,
+                (names, _pack(zone_ids), _pack(timestamps)))))
+            if len(pending) >= processes * PENDING_CHUNKS:
+                timestamps, result = pending.popleft()
+                keys, tzinfos, offsets = result.get()
+                yield timestamps, (_unpack(keys), tzinfos, _unpack(offsets))
+
+        while pending:
+            timestamps, result = pending.popleft()
+            keys, tzinfos, offsets = result.get()
+            yield timestamps, (_unpack(keys), tzinfos, _unpack(offsets))
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def convert(records, zone_column, time_column, processes=None,
+            chunk_size=CHUNK_SIZE):
+    '''Yield an aware local datetime for each record, in input order
+
+    Each record is a sequence or mapping holding a timezone name at
+    zone_column and UTC seconds since the epoch at time_column. processes
+    defaults to the number of CPUs, and 1 converts in this process.
+    '''
+    for timestamps, (keys, tzinfos, offsets) in _results(
+            records, zone_column, time_column, processes, chunk_size):
+        # The wall clock time of the epoch in each tzinfo of the chunk.
+        epochs = [_epoch + offset for tzinfo, offset in tzinfos]
+        tzinfos = [tzinfo for tzinfo, offset in tzinfos]
+        for ts, key in zip(timestamps, keys):
+            yield (epochs[key] + timedelta(seconds=ts)).replace(
+                tzinfo=tzinfos[key])
+
+
+def utcoffsets(records, zone_column, time_column, processes=None,
+               chunk_size=CHUNK_SIZE):
+    '''Yield the UTC offset in seconds at each record's timestamp, in input
+    order, as convert()'''
+    for timestamps, (keys, tzinfos, offsets) in _results(
+            records, zone_column, time_column, processes, chunk_size):
+        for seconds in offsets:
+            yield seconds
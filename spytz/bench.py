@@ -0,0 +1,211 @@
+'''
+Benchmark suite for spytz and pytz compatible timezone modules.
+
+The suite runs against whichever storage backend the module was imported
+with. utils/spbench.py runs it offline against a compiled timezone bundle,
+and the example app runs it against a deployed datastore.
+'''
+
+import gc
+import sys
+import time
+import timeit
+
+from datetime import datetime
+
+__all__ = ['run_suite', 'run_codecs', 'compare', 'describe', 'SAMPLE_TZS']
+
+# Timezones used for the per-operation benchmarks.
+SAMPLE_TZS = ('Australia/Perth', 'Australia/Melbourne', 'Europe/London',
+              'America/Indiana/Indianapolis')
+
+# Target zone of the astimezone() chain.
+CHAIN_TZ = 'Australia/Melbourne'
+
+_dt = datetime(2009, 4, 15)
+
+
+def _rss():
+    """ Returns the current resident set size in bytes, or None if it can't
+    be determined on this platform.
+    """
+    try:
+        with open('/proc/self/statm') as fo:
+            pages = int(fo.read().split()[1])
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+
+    import resource
+    return pages * resource.getpagesize()
+
+
+def _clear(mod):
+    """ Empties the module level timezone cache, and the memorized
+    timedeltas, datetimes and transition tables timezones are built from, so
+    the next timezone() call goes back to the backend and builds from
+    scratch. Works for both spytz and pytz.
+    """
+    mod._tzinfo_cache.clear()
+    tzinfo = sys.modules.get(mod.__name__ + '.tzinfo')
+    for name in ('_timedelta_cache', '_datetime_cache', '_ttinfo_cache',
+                 '_transitions_cache'):
+        cache = getattr(tzinfo, name, None)
+        if cache is not None:
+            cache.clear()
+    if hasattr(tzinfo, '_datetime_cache'):
+        tzinfo._datetime_cache[0] = tzinfo._epoch
+
+
+def _per_call(func, number, repeat):
+    """ Best of 'repeat' runs of 'number' calls, in seconds per call. """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def _cold_timezone(mod, tzs, repeat):
+    best = None
+    for _ in range(repeat):
+        _clear(mod)
+        _ts = time.time()
+        for tz in tzs:
+            mod.timezone(tz)
+        elapsed = (time.time() - _ts) / len(tzs)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _all_zones(mod):
+    """ Builds every timezone from a cold cache. Returns the total build time
+    in seconds and the resident memory per zone in bytes.
+    """
+    _clear(mod)
+    gc.collect()
+    rss_st = _rss()
+    _ts = time.time()
+    for tz in mod.all_timezones:
+        mod.timezone(tz)
+    elapsed = time.time() - _ts
+    gc.collect()
+    rss_end = _rss()
+
+    if rss_st is None or rss_end is None:
+        per_zone = None
+    else:
+        per_zone = float(rss_end - rss_st) / len(mod.all_timezones)
+
+    return elapsed, per_zone
+
+
+def run_suite(mod, number=10000, repeat=3, tzs=SAMPLE_TZS, all_zones=True):
+    """ Runs the benchmark suite against 'mod', a pytz compatible module.
+
+    Returns a dictionary of metric name to value. Times are in seconds per
+    operation, except 'all_zones_build' which is the total for every zone.
+    'memory_per_zone' is in bytes and is None if resident memory can't be
+    measured. Both are left out if 'all_zones' is false. Cold timings start
+    from empty timezone and memorized value caches.
+    """
+    results = {}
+
+    if all_zones:
+        # Measure the full build first, while nothing is cached, so memory
+        # freed by earlier runs doesn't hide the cost of the zones.
+        (results['all_zones_build'],
+         results['memory_per_zone']) = _all_zones(mod)
+
+    timezone = mod.timezone
+    chain_tz = timezone(CHAIN_TZ)
+    zones = [timezone(tz) for tz in tzs]
+    localized = [tz.localize(_dt) for tz in zones]
+
+    def warm_timezone():
+        for tz in tzs:
+            timezone(tz)
+
+    def localize():
+        for tz in zones:
+            tz.localize(_dt)
+
+    def normalize():
+        for tz, dt in zip(zones, localized):
+            tz.normalize(dt)
+
+    def fromutc():
+        for tz in zones:
+            tz.fromutc(_dt)
+
+    def astimezone_chain():
+        for tz in zones:
+            tz.normalize(tz.localize(_dt)).astimezone(chain_tz)
+
+    ops = len(tzs)
+    results['timezone_warm'] = _per_call(warm_timezone, number, repeat) / ops
+    results['localize'] = _per_call(localize, number, repeat) / ops
+    results['normalize'] = _per_call(normalize, number, repeat) / ops
+    results['fromutc'] = _per_call(fromutc, number, repeat) / ops
+    results['astimezone_chain'] = _per_call(astimezone_chain,
+                                            number, repeat) / ops
+    if hasattr(mod, 'convert_wallclock'):
+        convert_wallclock = mod.convert_wallclock
+
+        def convert_chain():
+            for tz in zones:
+                convert_wallclock(_dt, tz, chain_tz)
+
+        results['convert_wallclock'] = _per_call(convert_chain,
+                                                 number, repeat) / ops
+    results['timezone_cold'] = _cold_timezone(mod, tzs, repeat)
+
+    return results
+
+
+def run_codecs(tzdata, codecs=('none', 'zlib:1', 'zlib:6', 'zlib:9', 'delta'),
+               repeat=3):
+    """ Measures stored size against decode time for each of 'codecs'.
+    'tzdata' is a dictionary of timezone name to raw tzfile(5) data.
+
+    Returns a dictionary of codec name to results: 'bytes' is the total
+    stored size, 'max_bytes' the largest single blob and 'decode' the mean
+    time in seconds to decode one timezone into its transition table.
+    """
+    from spytz import codec
+
+    results = {}
+    for name in codecs:
+        blobs = [codec.encode(data, name) for data in tzdata.values()]
+
+        def decode():
+            for blob in blobs:
+                codec.decode(blob)
+
+        sizes = [len(blob) for blob in blobs]
+        results[name] = {'bytes': sum(sizes),
+                         'max_bytes': max(sizes),
+                         'decode': _per_call(decode, 1, repeat) / len(blobs)}
+
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    """ Compares 'results' against 'baseline', both as returned by
+    run_suite(). Returns a list of (metric, baseline, result, ratio) tuples
+    for every metric that is more than 'threshold' worse than the baseline.
+    """
+    regressions = []
+    for metric, base in sorted(baseline.items()):
+        value = results.get(metric)
+        if not base or value is None:
+            continue
+
+        ratio = float(value) / base
+        if ratio > 1 + threshold:
+            regressions.append((metric, base, value, ratio))
+
+    return regressions
+
+
+def describe(mod):
+    """ Returns identifying information for a benchmarked module. """
+    return {'module': mod.__name__,
+            'version': getattr(mod, '__version__', None),
+            'python': sys.version.split()[0]}
@@ -0,0 +1,162 @@
+'''
+Codecs for timezone data stored in the datastore and memcache.
+
+Stored blobs are one of:
+
+    none            raw tzfile(5) data, as shipped in the release package
+    zlib[:level]    zlib compressed tzfile(5) data, level 1-9 (default 6)
+    delta           a compact encoding of the parsed transition table, with
+                    transition times stored as variable length deltas
+
+Every format is recognisable from its first bytes, so decode() needs no
+codec name and memcache values need no wrapping. The codec used is still
+recorded against each TimeZoneData entity.
+'''
+
+import zlib
+from struct import pack, unpack_from, calcsize
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import BytesIO as StringIO
+
+from spytz.tzfile import parse_tzfile
+
+__all__ = ['encode', 'decode', 'CODECS']
+
+NONE = 'none'
+ZLIB = 'zlib'
+DELTA = 'delta'
+CODECS = (NONE, ZLIB, DELTA)
+
+_TZIF_MAGIC = 'TZif'.encode('US-ASCII')
+_DELTA_MAGIC = 'SPZD'.encode('US-ASCII')
+
+# magic, flags, transition count, ttinfo count
+_DELTA_HEAD = '>4sBHB'
+_DELTA_HEAD_SIZE = calcsize(_DELTA_HEAD)
+_DELTA_TTINFO = '>llB'
+_DELTA_TTINFO_SIZE = calcsize(_DELTA_TTINFO)
+
+# Flags
+_FIRST_IS_MIN = 1   # First transition is datetime.min (None in the table)
+_MINUTES = 2        # Transition times are stored in minutes, not seconds
+
+
+def _split(codec):
+    '''Split a codec name such as 'zlib:9' into its name and level'''
+    name, _, level = codec.partition(':')
+    if name not in CODECS:
+        raise ValueError('Unknown codec %r' % (codec,))
+    if level:
+        return name, int(level)
+    return name, 6
+
+
+def encode(data, codec=NONE):
+    '''Encode raw tzfile(5) data for storage using codec'''
+    name, level = _split(codec)
+    if name == ZLIB:
+        return zlib.compress(data, level)
+    elif name == DELTA:
+        return _encode_delta(parse_tzfile(StringIO(data)))
+    return data
+
+
+def decode(blob):
+    '''Decode a stored blob into a parse_tzfile() table'''
+    if blob.startswith(_TZIF_MAGIC):
+        return parse_tzfile(StringIO(blob))
+    elif blob.startswith(_DELTA_MAGIC):
+        return _decode_delta(blob)
+    return parse_tzfile(StringIO(zlib.decompress(blob)))
+
+
+def codec_of(blob):
+    '''Return the name of the codec used to encode blob'''
+    if blob.startswith(_TZIF_MAGIC):
+        return NONE
+    elif blob.startswith(_DELTA_MAGIC):
+        return DELTA
+    return ZLIB
+
+
+def _encode_delta(table):
+    transitions, lindexes, ttinfos = table
+
+    flags = 0
+    times = list(transitions)
+    if times and times[0] is None:
+        flags |= _FIRST_IS_MIN
+        times = times[1:]
+    if all(t % 60 == 0 for t in times):
+        flags |= _MINUTES
+        times = [t // 60 for t in times]
+
+    out = [pack(_DELTA_HEAD, _DELTA_MAGIC, flags, len(transitions),
+                len(ttinfos))]
+    for utcoffset, dst, tzname in ttinfos:
+        tzname = tzname.encode('US-ASCII')
+        out.append(pack(_DELTA_TTINFO, utcoffset, dst, len(tzname)))
+        out.append(tzname)
+    out.append(pack('>%dB' % len(lindexes), *lindexes))
+
+    # The first time is absolute, every other time is an unsigned varint
+    # delta from its predecessor.
+    if times:
+        out.append(pack('>l', times[0]))
+        varints = bytearray()
+        prev = times[0]
+        for t in times[1:]:
+            delta = t - prev
+            prev = t
+            while delta > 0x7f:
+                varints.append((delta & 0x7f) | 0x80)
+                delta >>= 7
+            varints.append(delta)
+        out.append(bytes(varints))
+
+    return ''.encode('US-ASCII').join(out)
+
+
+def _decode_delta(blob):
+    magic, flags, ntrans, nttinfo = unpack_from(_DELTA_HEAD, blob)
+    pos = _DELTA_HEAD_SIZE
+
+    ttinfos = []
+    for i in range(nttinfo):
+        utcoffset, dst, size = unpack_from(_DELTA_TTINFO, blob, pos)
+        pos += _DELTA_TTINFO_SIZE
+        ttinfos.append((utcoffset, dst,
+                        str(blob[pos:pos + size].decode('US-ASCII'))))
+        pos += size
+
+    lindexes = unpack_from('>%dB' % ntrans, blob, pos)
+    pos += ntrans
+
+    times = []
+    count = ntrans
+    if flags & _FIRST_IS_MIN:
+        count -= 1
+    if count:
+        t = unpack_from('>l', blob, pos)[0]
+        pos += 4
+        times.append(t)
+        data = bytearray(blob[pos:])
+        delta = shift = 0
+        for byte in data:
+            delta |= (byte & 0x7f) << shift
+            if byte & 0x80:
+                shift += 7
+            else:
+                t += delta
+                times.append(t)
+                delta = shift = 0
+
+    if flags & _MINUTES:
+        times = [t * 60 for t in times]
+    if flags & _FIRST_IS_MIN:
+        times.insert(0, None)
+
+    return tuple(times), lindexes, tuple(ttinfos)
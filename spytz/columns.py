@@ -0,0 +1,77 @@
+'''
+Column oriented lookups of a zone's UTC offset, DST flag and abbreviation
+for a batch of timestamps, without building a datetime for each.
+
+    cols = columns.zone_columns('Europe/London', epochs)
+    cols.offsets          array('i') of UTC offsets in seconds
+    cols.dst              bytearray of 1 for DST and 0 for standard time
+    cols.abbreviations    array('B') of indexes into cols.names
+    cols.names            list of the abbreviations used
+
+The arrays support the buffer protocol, so pandas, NumPy and Arrow can wrap
+them without copying. With numpy=True they are returned as NumPy arrays
+sharing the same memory.
+
+Timestamps are UTC seconds since the epoch, and are resolved with the same
+transition search as spytz.batch, so runs of nearby timestamps are cheap.
+'''
+
+from array import array
+from collections import namedtuple
+from datetime import tzinfo
+
+import spytz
+from spytz.batch import _build_table, _search, _zone_table
+from spytz.tzinfo import DstTzInfo
+
+__all__ = ['ZoneColumns', 'zone_columns']
+
+ZoneColumns = namedtuple('ZoneColumns',
+                         ('offsets', 'dst', 'abbreviations', 'names'))
+
+
+def _table(tz):
+    if not isinstance(tz, tzinfo):
+        return _zone_table(tz)
+    zone = getattr(tz, 'zone', None)
+    if zone in spytz.all_timezones_set:
+        return _zone_table(zone)
+    return _build_table(tz)
+
+
+def zone_columns(tz, timestamps, numpy=False):
+    '''Return the ZoneColumns of a timezone, a name or tzinfo, at each of
+    timestamps'''
+    table = _table(tz)
+    ttinfos = table[2]
+
+    offsets = []
+    flags = []
+    positions = []
+    names = []
+    for seconds, offset, info in ttinfos:
+        offsets.append(seconds)
+        # DstTzInfo only knows its DST offset and name given a datetime.
+        if isinstance(info, DstTzInfo):
+            flags.append(1 if info._dst else 0)
+            name = info._tzname
+        else:
+            flags.append(1 if info.dst(None) else 0)
+            name = info.tzname(None)
+        if name not in names:
+            names.append(name)
+        positions.append(names.index(name))
+
+    found = bytearray(_search(table, timestamps))
+    columns = ZoneColumns(array('i', map(offsets.__getitem__, found)),
+                          bytearray(map(flags.__getitem__, found)),
+                          array('B', map(positions.__getitem__, found)),
+                          names)
+    if numpy:
+        import numpy as np
+        columns = columns._replace(
+            offsets=np.frombuffer(columns.offsets, dtype=np.int32),
+            dst=np.frombuffer(columns.dst, dtype=np.bool_),
+            abbreviations=np.frombuffer(columns.abbreviations,
+                                        dtype=np.uint8))
+    return columns
@@ -0,0 +1,181 @@
+'''
+Wall clock conversions between a fixed pair of timezones.
+
+Converting a naive wall clock time in one zone to another is normally
+tz.normalize(tz.localize(dt)).astimezone(other), which bisects the
+transitions of the source zone two or more times and those of the target
+zone once. A ConversionTable merges the transitions of both zones into a
+single sorted list of source wall clock times, each starting an interval
+with a constant difference between the two zones' offsets and a constant
+target tzinfo. A conversion is then one bisect and one addition.
+
+Wall clock times that are ambiguous or don't exist in the source zone, at
+the end and start of DST, fall back to localize() so is_dst is honoured.
+'''
+
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, tzinfo
+import time
+
+import spytz
+from spytz import counters
+from spytz.tzinfo import BaseTzInfo, DstTzInfo, _epoch, _to_seconds
+
+__all__ = ['ConversionTable', 'convert_wallclock']
+
+_INF = float('inf')
+
+# Tables for recently used zone pairs, keyed by (from, to) zone, least
+# recently used first.
+_table_cache = OrderedDict()
+TABLE_CACHE_SIZE = 100
+
+
+def _states(tz):
+    '''Return a list of (utc start seconds, utcoffset seconds, tzinfo)
+    tuples for each period of tz, the first starting at -inf'''
+    if isinstance(tz, DstTzInfo):
+        states = []
+        for when, inf in zip(tz._utc_transition_times, tz._transition_info):
+            if when == datetime.min:
+                start = -_INF
+            else:
+                start = _to_seconds(when - _epoch)
+            states.append((start, _to_seconds(inf[0]), tz._tzinfos[inf]))
+        return states
+    return [(-_INF, _to_seconds(tz.utcoffset(None)), tz)]
+
+
+def _to_datetime(seconds):
+    if seconds == -_INF:
+        return datetime.min
+    return _epoch + timedelta(seconds=seconds)
+
+
+class ConversionTable(object):
+    '''Converts naive wall clock times in from_tz to aware datetimes in
+    to_tz'''
+
+    def __init__(self, from_tz, to_tz):
+        self.from_tz = from_tz
+        self.to_tz = to_tz
+
+        _ts = time.time()
+        self._starts, self._entries = self._build(_states(from_tz),
+                                                  _states(to_tz))
+        counters.timing('conversion', time.time() - _ts)
+
+    def _build(self, src, dst):
+        # Each source period covers a range of wall clock times. Where the
+        # ranges of neighbouring periods overlap or leave a gap, the wall
+        # clock time is ambiguous or doesn't exist.
+        events = []
+        for i, (start, offset, tz) in enumerate(src):
+            if i + 1 < len(src):
+                end = src[i + 1][0] + offset
+            else:
+                end = _INF
+            events.append((start + offset, 1, i))
+            events.append((end, -1, i))
+        events.sort()
+
+        dst_starts = [start for start, offset, tz in dst]
+        bounds = []
+        active = set()
+        for n, (when, change, i) in enumerate(events):
+            if change > 0:
+                active.add(i)
+            else:
+                active.discard(i)
+            # Emit each segment once all the events at its start are in.
+            if n + 1 < len(events) and events[n + 1][0] == when:
+                continue
+            end = events[n + 1][0] if n + 1 < len(events) else _INF
+            if when == end:
+                continue
+            if len(active) != 1:
+                bounds.append((when, None))
+                continue
+
+            # A single source period, split by the target's transitions.
+            offset = src[list(active)[0]][1]
+            k = max(0, bisect_right(dst_starts, when - offset) - 1)
+            while True:
+                bounds.append((max(when, dst_starts[k] + offset),
+                               (dst[k][1] - offset, dst[k][2])))
+                k += 1
+                if k == len(dst) or dst_starts[k] + offset >= end:
+                    break
+
+        # Merge neighbouring intervals with the same conversion.
+        starts = []
+        entries = []
+        for when, entry in bounds:
+            if entries and entries[-1] == entry:
+                continue
+            starts.append(when)
+            entries.append(entry)
+
+        starts = [_to_datetime(when) for when in starts]
+        entries = [entry and (timedelta(seconds=entry[0]), entry[1])
+                   for entry in entries]
+
+        if not starts or starts[0] != datetime.min:
+            starts.insert(0, datetime.min)
+            entries.insert(0, None)
+        return starts, entries
+
+    def convert(self, dt, is_dst=False):
+        '''Convert naive wall clock dt in from_tz to an aware datetime in
+        to_tz. is_dst is used as in localize() for ambiguous and
+        non-existent times.'''
+        if dt.tzinfo is not None:
+            raise ValueError('Not naive datetime (tzinfo is already set)')
+        entry = self._entries[bisect_right(self._starts, dt) - 1]
+        if entry is None:
+            return self.from_tz.localize(dt, is_dst).astimezone(self.to_tz)
+        return (dt + entry[0]).replace(tzinfo=entry[1])
+
+
+def _zone_key(tz):
+    # Every zone has its own generated class, shared by its DST and
+    # standard time instances.
+    if isinstance(tz, BaseTzInfo):
+        return tz.__class__
+    return tz
+
+
+def _resolve(tz):
+    if isinstance(tz, tzinfo):
+        return tz
+    return spytz.timezone(tz)
+
+
+def get_table(from_tz, to_tz):
+    '''Return the ConversionTable for a pair of timezones, tzinfos or zone
+    names, building it the first time the pair is used'''
+    from_tz = _resolve(from_tz)
+    to_tz = _resolve(to_tz)
+    key = (_zone_key(from_tz), _zone_key(to_tz))
+    try:
+        table = _table_cache.pop(key)
+    except KeyError:
+        table = ConversionTable(from_tz, to_tz)
+        while len(_table_cache) >= TABLE_CACHE_SIZE:
+            try:
+                _table_cache.popitem(last=False)
+            except KeyError:
+                break
+    # Reinserted as the most recently used.
+    return _table_cache.setdefault(key, table)
+
+
+def convert_wallclock(dt, from_tz, to_tz, is_dst=False):
+    '''Convert naive wall clock dt in from_tz to an aware datetime in to_tz.
+    Either zone may be a tzinfo or a zone name.
+
+    Equivalent to from_tz.localize(dt, is_dst).astimezone(to_tz), using a
+    cached ConversionTable for the pair.
+    '''
+    return get_table(from_tz, to_tz).convert(dt, is_dst)
@@ -0,0 +1,271 @@
+'''
+Command line conversion of a timestamp column in CSV or JSON lines between
+timezones, outside App Engine.
+
+    python -m spytz.convert --column created --from Australia/Melbourne events.csv > utc.csv
+    python -m spytz.convert --column ts --epoch --to-column tz events.jsonl
+
+Records are streamed one at a time, so files of any size convert in
+constant memory. Timestamps are ISO 8601 strings, as spytz.iso parses them,
+or UTC seconds since the epoch with --epoch. Naive timestamps are in the
+--from zone, or the zone named by each record's --from-column, and are
+converted through cached spytz.conversion tables for each pair of zones.
+Timestamps with an offset or zone are converted from that. Results are
+written back as ISO 8601 in the --to zone or each record's --to-column.
+
+Timezones come from whatever spytz loads, usually a compiled bundle, or
+from a spytz.shared table file with --tables.
+'''
+
+from datetime import timedelta
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+
+import spytz
+from spytz import conversion
+from spytz import iso
+from spytz.exceptions import AmbiguousTimeError, NonExistentTimeError
+from spytz.tzinfo import _epoch
+
+__all__ = ['Converter', 'main']
+
+# What to do with naive times that are ambiguous or don't exist in their
+# zone. dst and std are passed to localize() as is_dst.
+POLICIES = ('std', 'dst', 'error', 'blank')
+
+# Errors reported with the number of the record that caused them.
+_RECORD_ERRORS = (spytz.UnknownTimeZoneError, spytz.InvalidTimeError,
+                  ValueError, KeyError, IndexError)
+
+
+class Converter(object):
+    '''Converts timestamp strings between timezones, as the command line'''
+
+    def __init__(self, from_zone='UTC', to_zone='UTC', epoch=False,
+                 ambiguous='std', nonexistent='std'):
+        self._zones = {}
+        self.from_tz = self.get_zone(from_zone)
+        self.to_tz = self.get_zone(to_zone)
+        self.epoch = epoch
+        self.ambiguous = ambiguous
+        self.nonexistent = nonexistent
+        # Zone suffixes seen in timestamps, see spytz.iso.
+        self._suffixes = {}
+
+    def get_zone(self, name):
+        '''Return the tzinfo for a zone name, resolving each name once'''
+        try:
+            return self._zones[name]
+        except KeyError:
+            return self._zones.setdefault(name, spytz.timezone(name))
+
+    def _localize(self, dt, from_tz, to_tz):
+        table = conversion.get_table(from_tz, to_tz)
+        try:
+            return table.convert(dt, is_dst=None)
+        except AmbiguousTimeError:
+            policy = self.ambiguous
+        except NonExistentTimeError:
+            policy = self.nonexistent
+
+        if policy == 'error':
+            # Raise with both candidates checked, as localize() does.
+            from_tz.localize(dt, is_dst=None)
+        elif policy == 'blank':
+            return None
+        return table.convert(dt, is_dst=policy == 'dst')
+
+    def convert(self, value, from_zone=None, to_zone=None):
+        '''Convert a timestamp string, returning an ISO 8601 string or None
+        for times left blank by the policies'''
+        from_tz = from_zone and self.get_zone(from_zone) or self.from_tz
+        to_tz = to_zone and self.get_zone(to_zone) or self.to_tz
+
+        if self.epoch:
+            dt = _epoch + timedelta(seconds=float(value))
+            dt = to_tz.fromutc(dt.replace(tzinfo=to_tz))
+        else:
+            dt = iso._parse(value.strip(), None, False, self._suffixes)
+            if dt.tzinfo is None:
+                dt = self._localize(dt, from_tz, to_tz)
+                if dt is None:
+                    return None
+            else:
+                dt = dt.astimezone(to_tz)
+        return dt.isoformat()
+
+
+if sys.version_info[0] < 3:
+    def _open_input(path):
+        return sys.stdin if path == '-' else open(path, 'rb')
+
+    def _open_output(path):
+        return sys.stdout if path == '-' else open(path, 'wb')
+else:
+    def _open_input(path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8',
+                                    newline='')
+        return open(path, encoding='utf-8', newline='')
+
+    def _open_output(path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8',
+                                    newline='')
+        return open(path, 'w', encoding='utf-8', newline='')
+
+
+def _convert_csv(converter, args, fi, fo):
+    reader = csv.reader(fi)
+    writer = csv.writer(fo)
+    try:
+        header = next(reader)
+    except StopIteration:
+        return 0
+
+    def column(name):
+        if name is None:
+            return None
+        try:
+            return header.index(name)
+        except ValueError:
+            raise ValueError('Column %r not found' % (name,))
+
+    value_col = column(args.column)
+    from_col = column(args.from_column)
+    to_col = column(args.to_column)
+    if args.output_column is None or args.output_column == args.column:
+        output_col = value_col
+    elif args.output_column in header:
+        output_col = header.index(args.output_column)
+    else:
+        output_col = len(header)
+        header.append(args.output_column)
+    writer.writerow(header)
+
+    count = 0
+    for row in reader:
+        count += 1
+        try:
+            value = converter.convert(row[value_col],
+                                      from_col is not None and row[from_col],
+                                      to_col is not None and row[to_col])
+        except _RECORD_ERRORS as e:
+            raise ValueError('record %d: %s: %s'
+                             % (count, e.__class__.__name__, e))
+        if output_col == len(row):
+            row.append('')
+        row[output_col] = value or ''
+        writer.writerow(row)
+    return count
+
+
+def _convert_jsonl(converter, args, fi, fo):
+    output = args.output_column or args.column
+    count = 0
+    for line in fi:
+        if not line.strip():
+            continue
+        count += 1
+        try:
+            record = json.loads(line)
+            value = record[args.column]
+            # str() keeps only 12 digits of a float on Python 2.
+            value = repr(value) if isinstance(value, float) else str(value)
+            record[output] = converter.convert(
+                value,
+                args.from_column and record.get(args.from_column),
+                args.to_column and record.get(args.to_column))
+        except _RECORD_ERRORS as e:
+            raise ValueError('record %d: %s: %s'
+                             % (count, e.__class__.__name__, e))
+        fo.write(json.dumps(record) + '\n')
+    return count
+
+
+def _parser():
+    ap = argparse.ArgumentParser(
+        prog='python -m spytz.convert',
+        description='Convert a timestamp column of CSV or JSON lines records '
+                    'between timezones.')
+    ap.add_argument('input', nargs='?', default='-',
+                    help='Input file, standard input by default.')
+    ap.add_argument('-o', '--output', default='-',
+                    help='Output file, standard output by default.')
+    ap.add_argument('--format', choices=('csv', 'jsonl'),
+                    help='Input and output format. Defaults to jsonl for '
+                         '.jsonl and .json files, otherwise csv.')
+    ap.add_argument('--column', required=True,
+                    help='Column or key of the timestamps.')
+    ap.add_argument('--output-column',
+                    help='Column or key to write the results to, replacing '
+                         'the timestamps by default.')
+    ap.add_argument('--from', dest='from_zone', default='UTC',
+                    help='Timezone of naive timestamps, UTC by default.')
+    ap.add_argument('--from-column',
+                    help='Column or key holding each timestamp\'s timezone.')
+    ap.add_argument('--to', dest='to_zone', default='UTC',
+                    help='Timezone to convert to, UTC by default.')
+    ap.add_argument('--to-column',
+                    help='Column or key holding the timezone to convert each '
+                         'timestamp to.')
+    ap.add_argument('--epoch', action='store_true',
+                    help='Timestamps are UTC seconds since the epoch.')
+    ap.add_argument('--ambiguous', choices=POLICIES, default='std',
+                    help='Ambiguous naive times, at the end of DST, are '
+                         'taken as standard or DST time, fail or are left '
+                         'blank. std by default.')
+    ap.add_argument('--nonexistent', choices=POLICIES, default='std',
+                    help='Non-existent naive times, at the start of DST, '
+                         'are handled as --ambiguous. std by default.')
+    ap.add_argument('--tables',
+                    help='Load timezones from a spytz.shared table file.')
+    ap.add_argument('-q', '--quiet', action='store_true',
+                    help='Don\'t report throughput on standard error.')
+    return ap
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    fmt = args.format
+    if fmt is None:
+        fmt = 'jsonl' if args.input.endswith(('.jsonl', '.json')) else 'csv'
+
+    try:
+        if args.tables:
+            from spytz import shared
+            shared.install(args.tables)
+        converter = Converter(args.from_zone, args.to_zone, args.epoch,
+                              args.ambiguous, args.nonexistent)
+
+        _ts = time.time()
+        fi = _open_input(args.input)
+        fo = _open_output(args.output)
+        try:
+            if fmt == 'csv':
+                count = _convert_csv(converter, args, fi, fo)
+            else:
+                count = _convert_jsonl(converter, args, fi, fo)
+        finally:
+            fo.flush()
+            if args.input != '-':
+                fi.close()
+            if args.output != '-':
+                fo.close()
+    except _RECORD_ERRORS + (IOError,) as e:
+        sys.stderr.write('spytz.convert: error: %s\n' % (e,))
+        return 1
+
+    if not args.quiet:
+        seconds = time.time() - _ts
+        sys.stderr.write('Converted %d records in %.2f seconds (%d/s)\n'
+                         % (count, seconds, count / max(seconds, 1e-6)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
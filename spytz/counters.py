@@ -0,0 +1,106 @@
+'''
+Counters and timers for spytz cache tiers, timezone builds and updates.
+
+Counters are plain per-process totals, keyed by dotted names:
+
+    process_cache.hits / .misses    spytz.timezone() module cache
+    unknown_cache.hits              names recently confirmed not to exist
+    memcache.hits / .misses         gaetz memcache reads
+    memcache.lease_waits            misses refilled by another caller
+    memcache.stale_hits             lease waits served a stale copy
+    datastore.hits / .misses        gaetz datastore reads
+    disk_cache.hits / .misses       aio.DiskCacheBackend reads
+    bytes_fetched                   timezone data read from memcache/datastore
+    build.count / .time             tzinfo builds and seconds spent
+    conversion.count / .time        ConversionTable builds and seconds spent
+    localize.samples / .time        sampled localize() calls, see set_sampling()
+    fromutc.samples / .time         sampled fromutc() calls, see set_sampling()
+    update.count / .time            spud.update() runs and seconds spent
+
+Hooks registered with add_hook() are called as hook(name, value) for every
+increment, to forward counters to an external monitoring system.
+'''
+
+import time
+
+__all__ = ['stats', 'reset', 'add_hook', 'remove_hook', 'set_sampling']
+
+_counters = {}
+_hooks = []
+
+
+def incr(name, value=1):
+    '''Add value to the counter name'''
+    _counters[name] = _counters.get(name, 0) + value
+    if _hooks:
+        for hook in _hooks:
+            hook(name, value)
+
+
+def timing(name, seconds):
+    '''Record one timed event against the name.count and name.time counters'''
+    incr(name + '.count')
+    incr(name + '.time', seconds)
+
+
+def stats():
+    '''Return a snapshot of all counters as a dictionary'''
+    return dict(_counters)
+
+
+def reset():
+    '''Set all counters back to zero'''
+    _counters.clear()
+
+
+def add_hook(hook):
+    '''Call hook(name, value) on every counter increment'''
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    '''Stop calling a hook registered with add_hook()'''
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+# Methods timed when sampling is enabled, and the unwrapped originals.
+_SAMPLED = ('localize', 'fromutc')
+_originals = {}
+
+
+def _sampled(name, func, rate):
+    '''Wrap func so one in every rate calls is timed'''
+    calls = [0]
+    def wrapper(self, *args, **kwargs):
+        calls[0] += 1
+        if calls[0] % rate:
+            return func(self, *args, **kwargs)
+        _ts = time.time()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            incr(name + '.samples')
+            incr(name + '.time', time.time() - _ts)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def set_sampling(rate):
+    '''Time one in every rate localize() and fromutc() calls
+
+    Sampling is disabled with a rate of 0, which is the default. The methods
+    are only wrapped while sampling is enabled, so there is no cost to the
+    timezone classes otherwise.
+    '''
+    from spytz.tzinfo import StaticTzInfo, DstTzInfo
+
+    for cls in (StaticTzInfo, DstTzInfo):
+        for name in _SAMPLED:
+            func = _originals.setdefault((cls, name), cls.__dict__[name])
+            if rate:
+                setattr(cls, name, _sampled(name, func, rate))
+            else:
+                setattr(cls, name, func)
@@ -0,0 +1,141 @@
+'''
+Persistent on-disk cache of timezone data for deployments outside App
+Engine, so restarted workers don't refetch every timezone from the backing
+store.
+
+Values are kept in an SQLite database keyed by (data version, key), where
+the key is usually a timezone name. They are marshalled parse_tzfile()
+tables or lists of timezone names, so reading one back is a single
+indexed select and marshal.loads(). Entries are evicted least recently used
+first once max_entries or max_bytes is exceeded, which also removes the
+entries of old data versions. A hit only records its use if the last one
+recorded is over touch_interval seconds old, so reads of hot entries stay
+reads rather than serialised write transactions.
+
+Any number of processes can share a cache file. SQLite serialises the
+writers, and readers are never blocked in WAL mode. The cache is a tier of
+spytz.aio only; spytz.timezone() never reads it.
+
+    from spytz import aio
+    from spytz.diskcache import DiskCache
+
+    aio.set_backend(aio.DiskCacheBackend(aio.CacheClientBackend(client,
+                                                                version='2014.4'),
+                                         DiskCache('/var/cache/spytz.db')))
+'''
+
+import marshal
+import os
+import sqlite3
+import threading
+import time
+
+__all__ = ['DiskCache']
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS spytz_cache (
+    version TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (version, key)
+)'''
+
+_USED_INDEX = '''
+CREATE INDEX IF NOT EXISTS spytz_cache_used ON spytz_cache (used)'''
+
+
+class DiskCache(object):
+    '''An SQLite backed cache of marshallable timezone data'''
+
+    def __init__(self, path, max_entries=5000, max_bytes=50 * 1024 * 1024,
+                 timeout=30, touch_interval=3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        # Connections can't be shared with a forked child, so each process
+        # opens its own.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(_SCHEMA)
+            conn.execute(_USED_INDEX)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, version, key):
+        '''Return the value stored for key in data version, or None'''
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT value, used FROM spytz_cache '
+                               'WHERE version = ? AND key = ?',
+                               (version, key)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] >= self.touch_interval:
+                conn.execute('UPDATE spytz_cache SET used = ? '
+                             'WHERE version = ? AND key = ?',
+                             (now, version, key))
+        return marshal.loads(bytes(row[0]))
+
+    def set(self, version, key, value):
+        '''Store value for key in data version, evicting the least recently
+        used entries if the cache is over its limits'''
+        data = marshal.dumps(value, 2)
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('INSERT OR REPLACE INTO spytz_cache '
+                             '(version, key, value, size, used) '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             (version, key, sqlite3.Binary(data), len(data),
+                              time.time()))
+                self._evict(conn)
+            except:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def _evict(self, conn):
+        entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                                     'FROM spytz_cache').fetchone()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+
+        # Walk the entries from least recently used until both limits are
+        # met, then delete everything up to that point.
+        cutoff = None
+        for used, entry_size in conn.execute('SELECT used, size FROM '
+                                             'spytz_cache ORDER BY used'):
+            if entries <= self.max_entries and size <= self.max_bytes:
+                break
+            cutoff = used
+            entries -= 1
+            size -= entry_size
+        if cutoff is not None:
+            conn.execute('DELETE FROM spytz_cache WHERE used <= ?', (cutoff,))
+
+    def clear(self):
+        '''Remove every entry'''
+        with self._lock:
+            self._connect().execute('DELETE FROM spytz_cache')
+
+    def close(self):
+        '''Close this process's connection to the database'''
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
@@ -12,9 +12,17 @@ from cStringIO import StringIO
 #from pytz.exceptions import InvalidTimeError
 #from pytz.exceptions import NonExistentTimeError
 from spytz.exceptions import UnknownTimeZoneError
+from spytz import counters
+from spytz import codec
+from spytz import geo
+from spytz import transitions
+from spytz import reverse
 
 from datetime import datetime
 import logging
+import marshal
+import random
+import time
 
 # For debugging exceptions
 import sys
@@ -25,12 +33,47 @@ _all_tz_cache = []
 MC_NAMESPACE = '--spytz--'
 MC_STORE_TIME = 86400 # 1 day
 MC_ALLTZS = '_alltzs_'
+# The timezone list is read by every cold instance, so it is kept under
+# MC_ALLTZS + ':0' to ':<replicas - 1>' and each read picks a replica at
+# random. Stored as a marshalled list, so it needs no splitting.
+MC_ALLTZS_REPLICAS = 4
+MC_COUNTRIES = '_countries_'
+MC_GEO = '_geo_'
+MC_TRANSITIONS = '_transitions_'
+MC_REVERSE = '_reverse_'
+
+# Stored under a timezone's key when it has no datastore entity, so bad names
+# don't cost a datastore read on every request. flush_cache() removes it with
+# the timezone keys when the data changes.
+MC_NOT_FOUND = '-'
+MC_NOT_FOUND_TIME = 300 # 5 minutes
+
+# Refill leases. After a miss, the caller that wins memcache.add() on the
+# lease key reloads from the datastore, while the others serve the stale copy
+# kept under MC_STALE_PREFIX or wait for the refill. flush_cache() leaves the
+# stale copies, so an update doesn't send every instance to the datastore.
+# Stale copies are only used for the current call, never kept in the process.
+# Waiters take the lease over once it expires, so a single caller reloads
+# even if the holder died, and give up after MC_LEASE_TIMEOUT.
+MC_LEASE_PREFIX = '~lease~'
+MC_LEASE_TIME = 10 # seconds
+MC_LEASE_WAIT = 0.05 # seconds between memcache reads while waiting
+MC_LEASE_TIMEOUT = 2 * MC_LEASE_TIME
+MC_STALE_PREFIX = '~stale~'
+MC_STALE_TIME = 604800 # 1 week
+
+# Codec used to store timezone data, see spytz.codec. Applied by spud.update.
+STORE_CODEC = codec.NONE
 
 class SpytzData(ndb.Model):
     version = ndb.StringProperty() # Olson DB version.
     checked_on = ndb.DateTimeProperty() # Date last checked for an update.
     updated_on = ndb.DateTimeProperty() # Date last updated.
     all_tz = ndb.TextProperty(repeated=True) # comma separated list of all timezones
+    countries = ndb.JsonProperty() # country index, see get_country_index()
+    geo_index = ndb.JsonProperty() # nearest timezone index, see spytz.geo
+    transition_index = ndb.JsonProperty() # see spytz.transitions
+    reverse_index = ndb.JsonProperty() # see spytz.reverse
 
     datastore_id = 1 # only store one entry, keep the id here.
 
@@ -57,8 +100,8 @@ class SpytzData(ndb.Model):
         return data 
 
 class TimeZoneData(ndb.Model):
-    # TODO: test this the CPU impact of compressed vs uncompressed
-    data = ndb.BlobProperty(required=True) #,compressed=True) # Binary TZ data
+    data = ndb.BlobProperty(required=True) # Binary TZ data, encoded by codec
+    codec = ndb.StringProperty(default=codec.NONE) # spytz.codec name
     country_code = ndb.StringProperty() # Olson DB version
     country = ndb.StringProperty() # country code for the TZ
     coords = ndb.StringProperty()
@@ -96,7 +139,9 @@ class TimeZoneData(ndb.Model):
         tz_data = memcache.get(timezone,
                                namespace=MC_NAMESPACE)
         
-        if tz_data is not None:
+        if tz_data == MC_NOT_FOUND:
+            raise UnknownTimeZoneError(timezone)
+        elif tz_data is not None:
             # Return the memcache data
             return tz_data
         else:
@@ -104,7 +149,9 @@ class TimeZoneData(ndb.Model):
             tz_obj = cls.fetch(timezone)
             if tz_obj is None:
                 logging.error("SPYTZ: timezone '{}' does not exist!".format(timezone))
-                raise UnknownTimeZoneError
+                memcache.set(timezone, MC_NOT_FOUND, MC_NOT_FOUND_TIME,
+                             namespace=MC_NAMESPACE)
+                raise UnknownTimeZoneError(timezone)
             tz_data = tz_obj.data
             # Add the keys / data to memcache.
             memcache.set(timezone, tz_data, MC_STORE_TIME, namespace=MC_NAMESPACE)
@@ -125,13 +172,64 @@ class TimeZoneData(ndb.Model):
             # Return the Region object
             return result
 
+    @classmethod
+    @ndb.tasklet
+    def fetch_async(cls, timezone):
+        """Async fetch(). Returns a future for the entity, or None."""
+        try:
+            result = yield ndb.Key(cls, timezone).get_async(use_memcache=False,
+                                                            use_cache=False)
+        except:
+            # Key is of an invalid type
+            logging.error('Error while trying to fetch timezone "{}"'.format(timezone))
+            result = None
+        raise ndb.Return(result)
+
     @classmethod
     def update_cache(cls, timezones):
         pass
         
     @classmethod
-    def _get_country_codes(cls):
-        TimeZone.all().order('country')
+    def _get_country_index(cls):
+        """Builds the country index from the stored timezones. Only needed
+        for data stored before the index was kept in SpytzData, as it lacks
+        countries without timezones and the zone.tab ordering.
+        """
+        names = {}
+        zones = {}
+        for tz in cls.query():
+            if tz.country:
+                # 'country' holds the ISO 3166 code, 'country_code' the name.
+                names[tz.country] = tz.country_code
+                zones.setdefault(tz.country, []).append(tz.key.id())
+
+        return {'names': names,
+                'zones': dict((cc, sorted(tzs)) for cc, tzs in zones.items())}
+
+    @classmethod
+    def _get_geo_index(cls):
+        """Builds the nearest timezone index from the stored timezones. Only
+        needed for data stored before the index was kept in SpytzData.
+        """
+        return geo.build_index(dict((tz.key.id(), tz.coords)
+                                    for tz in cls.query()))
+
+    @classmethod
+    def _get_transition_index(cls):
+        """Builds the upcoming transition index from the stored timezones.
+        Only needed for data stored before the index was kept in SpytzData.
+        """
+        return transitions.build_index(dict((tz.key.id(), codec.decode(tz.data))
+                                            for tz in cls.query()))
+
+    @classmethod
+    def _get_reverse_index(cls):
+        """Builds the abbreviation and offset index from the stored
+        timezones. Only needed for data stored before the index was kept in
+        SpytzData.
+        """
+        return reverse.build_index(dict((tz.key.id(), codec.decode(tz.data))
+                                        for tz in cls.query()))
 
     #def __str__(self):
     #    return "{} timezones".format(self._number_timezones())
@@ -146,10 +244,15 @@ def get_installed_version(update=False):
     return spytz_data.version
 
 
-def update_metadata(new_version, all_tzs=None):
+def update_metadata(new_version, all_tzs=None, countries=None,
+                    geo_index=None, transition_index=None,
+                    reverse_index=None):
     """ Applies the new version and current date/time to the 'updated_on'
     timestamp property. If a list passed in for all_tzs, this will be used to
-    update the all_tzs property,
+    update the all_tzs property. If a country index is passed in for
+    countries, a spytz.geo index for geo_index, a spytz.transitions index for
+    transition_index or a spytz.reverse index for reverse_index, it replaces
+    the stored index.
     """
     spytz_data = SpytzData.get_spytz_data()
     spytz_data.version = new_version
@@ -158,6 +261,18 @@ def update_metadata(new_version, all_tzs=None):
     if all_tzs:
         spytz_data.all_tz = all_tzs
 
+    if countries:
+        spytz_data.countries = countries
+
+    if geo_index:
+        spytz_data.geo_index = geo_index
+
+    if transition_index:
+        spytz_data.transition_index = transition_index
+
+    if reverse_index:
+        spytz_data.reverse_index = reverse_index
+
     spytz_data.put(use_memcache=False, use_cache=False)
     
 def flush_cache():
@@ -168,34 +283,222 @@ def flush_cache():
     memcache.delete_multi(all_tzs, namespace=MC_NAMESPACE)
 
     # And then delete and reload all_tzs again.
-    memcache.delete(MC_ALLTZS, namespace=MC_NAMESPACE)
+    memcache.delete_multi([MC_COUNTRIES, MC_GEO, MC_TRANSITIONS, MC_REVERSE]
+                          + _all_timezones_keys(), namespace=MC_NAMESPACE)
     all_tzs = get_all_timezones()
 
-def get_all_timezones():
+def _store(key, value, store_time=MC_STORE_TIME):
+    """Sets 'key' and its stale copy in memcache."""
+    memcache.set(key, value, store_time, namespace=MC_NAMESPACE)
+    memcache.set(MC_STALE_PREFIX + key, value, MC_STALE_TIME,
+                 namespace=MC_NAMESPACE)
+
+def _refill(key, load, poll_key=None):
+    """Returns (value, stale) for 'key' after a memcache miss. Only the
+    holder of the key's lease calls 'load' to reload and store it. Other
+    callers get the stale copy, with 'stale' True as it must not be kept, or
+    the refilled value of 'poll_key' (default 'key') if there is no stale
+    copy. Returns (None, True) if nothing turns up within MC_LEASE_TIMEOUT.
+    """
+    lease = MC_LEASE_PREFIX + key
+    if memcache.add(lease, 1, MC_LEASE_TIME, namespace=MC_NAMESPACE):
+        try:
+            return load(), False
+        finally:
+            memcache.delete(lease, namespace=MC_NAMESPACE)
+
+    counters.incr('memcache.lease_waits')
+    value = memcache.get(MC_STALE_PREFIX + key, namespace=MC_NAMESPACE)
+    if value is not None:
+        counters.incr('memcache.stale_hits')
+        return value, True
+
+    start = time.time()
+    retake = start + MC_LEASE_TIME
+    while time.time() < start + MC_LEASE_TIMEOUT:
+        time.sleep(MC_LEASE_WAIT)
+        value = memcache.get(poll_key or key, namespace=MC_NAMESPACE)
+        if value is not None:
+            return value, False
+        # The holder didn't refill in time, so one waiter takes over.
+        if time.time() >= retake:
+            retake += MC_LEASE_TIME
+            if memcache.add(lease, 1, MC_LEASE_TIME, namespace=MC_NAMESPACE):
+                try:
+                    return load(), False
+                finally:
+                    memcache.delete(lease, namespace=MC_NAMESPACE)
+
+    logging.warning("SPYTZ: Timed out waiting for '{}' refill.".format(key))
+    return None, True
+
+@ndb.tasklet
+def _refill_async(key, load_async):
+    """Async _refill(). 'load_async' returns a future."""
+    ctx = ndb.get_context()
+    lease = MC_LEASE_PREFIX + key
+
+    @ndb.tasklet
+    def take_lease():
+        leased = yield ctx.memcache_add(lease, 1, MC_LEASE_TIME,
+                                        namespace=MC_NAMESPACE)
+        if not leased:
+            raise ndb.Return(False)
+        try:
+            value = yield load_async()
+        finally:
+            yield ctx.memcache_delete(lease, namespace=MC_NAMESPACE)
+        raise ndb.Return((True, value))
+
+    result = yield take_lease()
+    if result:
+        raise ndb.Return((result[1], False))
+
+    counters.incr('memcache.lease_waits')
+    value = yield ctx.memcache_get(MC_STALE_PREFIX + key,
+                                   namespace=MC_NAMESPACE, use_cache=False)
+    if value is not None:
+        counters.incr('memcache.stale_hits')
+        raise ndb.Return((value, True))
+
+    start = time.time()
+    retake = start + MC_LEASE_TIME
+    while time.time() < start + MC_LEASE_TIMEOUT:
+        yield ndb.sleep(MC_LEASE_WAIT)
+        value = yield ctx.memcache_get(key, namespace=MC_NAMESPACE,
+                                       use_cache=False)
+        if value is not None:
+            raise ndb.Return((value, False))
+        if time.time() >= retake:
+            retake += MC_LEASE_TIME
+            result = yield take_lease()
+            if result:
+                raise ndb.Return((result[1], False))
+
+    logging.warning("SPYTZ: Timed out waiting for '{}' refill.".format(key))
+    raise ndb.Return((None, True))
+
+def _all_timezones_keys():
+    """Returns the memcache keys of every timezone list replica."""
+    return [MC_ALLTZS + ':' + str(i) for i in range(MC_ALLTZS_REPLICAS)]
+
+def _load_all_timezones():
+    """Reloads the marshalled timezone list from the datastore into every
+    memcache replica. Returns None on error."""
+    try:
+        # Fetch the object from the datastore.
+        obj = SpytzData.get_spytz_data()
+        tz_list = obj.all_tz
+    except:
+        # Key is of an invalid type
+        counters.incr('datastore.misses')
+        logging.error('SPYTZ: Error while trying to fetch SpytzData.all_timezones property')
+        return None
+    counters.incr('datastore.hits')
+
+    # Update memcache.
+    tz_list = marshal.dumps(list(tz_list), 2)
+    memcache.set_multi(dict.fromkeys(_all_timezones_keys(), tz_list),
+                       namespace=MC_NAMESPACE)
+    memcache.set(MC_STALE_PREFIX + MC_ALLTZS, tz_list, MC_STALE_TIME,
+                 namespace=MC_NAMESPACE)
+    return tz_list
+
+def get_all_timezones(with_stale=False):
     """Returns a list of all the timezones in the datastore. Checks
-    Memcache first, datastore second.
+    Memcache first, datastore second. With 'with_stale', returns (list,
+    stale), where 'stale' is True if the list is an outdated copy or empty
+    after an error, and must not be kept.
     """
-    # Get the memcache data first.
-    tz_list = memcache.get(MC_ALLTZS, namespace=MC_NAMESPACE)
+    # Get the memcache data first, from any replica.
+    key = MC_ALLTZS + ':' + str(random.randrange(MC_ALLTZS_REPLICAS))
+    tz_list = memcache.get(key, namespace=MC_NAMESPACE)
+    stale = False
 
     if tz_list:
-        # Make the string a list before returning it.
-        return tz_list.split(',')
+        counters.incr('memcache.hits')
     else:
         # Memcache key not found, so reload the data.
+        counters.incr('memcache.misses')
+        tz_list, stale = _refill(MC_ALLTZS, _load_all_timezones, key)
+
+    if tz_list:
+        counters.incr('bytes_fetched', len(tz_list))
+        tz_list = marshal.loads(tz_list)
+    else:
+        tz_list, stale = [], True
+    return (tz_list, stale) if with_stale else tz_list
+
+def _get_index(mc_key, prop, build, empty, with_stale):
+    """Returns a precomputed index kept in the SpytzData 'prop' property.
+    Checks Memcache first, datastore second. Indexes missing from data
+    stored before they existed are built with 'build' and kept. With
+    'with_stale', returns (index, stale) as get_all_timezones() does.
+    """
+    index = memcache.get(mc_key, namespace=MC_NAMESPACE)
+
+    if index is not None:
+        counters.incr('memcache.hits')
+        return (index, False) if with_stale else index
+
+    # Memcache key not found, so reload the data.
+    counters.incr('memcache.misses')
+
+    def load():
         try:
-            # Fetch the object from the datastore.
-            obj = SpytzData.get_spytz_data()
-            tz_list = obj.all_tz
+            spytz_data = SpytzData.get_spytz_data()
+            index = getattr(spytz_data, prop)
         except:
-            # Key is of an invalid type
-            logging.error('SPYTZ: Error while trying to fetch SpytzData.all_timezones property')
-            return []
+            counters.incr('datastore.misses')
+            logging.error('SPYTZ: Error while trying to fetch SpytzData.{} property'.format(prop))
+            return None
 
-        # Update memcache.
-        memcache.set(MC_ALLTZS, ','.join(tz_list), namespace=MC_NAMESPACE)
-        # Return all timezones.
-        return tz_list
+        counters.incr('datastore.hits')
+        if not index:
+            # Data stored before the index existed, build and keep it now.
+            logging.warning('SPYTZ: Building missing {} index.'.format(prop))
+            index = build()
+            setattr(spytz_data, prop, index)
+            spytz_data.put(use_memcache=False, use_cache=False)
+
+        _store(mc_key, index)
+        return index
+
+    index, stale = _refill(mc_key, load)
+    if index is None:
+        index, stale = empty, True
+    return (index, stale) if with_stale else index
+
+def get_country_index(with_stale=False):
+    """Returns the country index as a dictionary. 'names' maps ISO 3166
+    country codes to country names, 'zones' maps them to lists of timezones.
+    The index is built once per data update and kept as a single value.
+    """
+    return _get_index(MC_COUNTRIES, 'countries',
+                      TimeZoneData._get_country_index,
+                      {'names': {}, 'zones': {}}, with_stale)
+
+def get_geo_index(with_stale=False):
+    """Returns the spytz.geo nearest timezone index over the zone.tab
+    coordinates. Built once per data update and kept as a single value.
+    """
+    return _get_index(MC_GEO, 'geo_index', TimeZoneData._get_geo_index, [],
+                      with_stale)
+
+def get_transition_index(with_stale=False):
+    """Returns the spytz.transitions index of upcoming transitions in all
+    timezones. Built once per data update and kept as a single value.
+    """
+    return _get_index(MC_TRANSITIONS, 'transition_index',
+                      TimeZoneData._get_transition_index, [], with_stale)
+
+def get_reverse_index(with_stale=False):
+    """Returns the spytz.reverse index of timezone abbreviations and UTC
+    offsets. Built once per data update and kept as a single value.
+    """
+    return _get_index(MC_REVERSE, 'reverse_index',
+                      TimeZoneData._get_reverse_index,
+                      {'abbreviations': {}, 'offsets': {}}, with_stale)
 
 def delete_all_data():
     """Deletes all timezones from datastore.
@@ -207,17 +510,25 @@ def delete_all_data():
                                       for x in tz_all],
                                      use_memcache=False, use_cache=False)
 
-    TimeZoneData.remove_from_cache(tz_all)
-
     # Delete the SpytzData timezone information.
     spytz_data = SpytzData.get_spytz_data()
     
     if spytz_data:
         spytz_data.all_tz = []
+        spytz_data.countries = None
+        spytz_data.geo_index = None
+        spytz_data.transition_index = None
+        spytz_data.reverse_index = None
         spytz_data.put(use_memcache=False, use_cache=False)
 
-    # And delete the SpytzData memcache object.
-    memcache.delete(MC_ALLTZS, namespace=MC_NAMESPACE)
+    # And delete the SpytzData memcache objects, and every stale copy as
+    # there is nothing to refill them from.
+    keys = [MC_ALLTZS, MC_COUNTRIES, MC_GEO, MC_TRANSITIONS,
+            MC_REVERSE] + tz_all
+    memcache.delete_multi(keys, key_prefix=MC_STALE_PREFIX,
+                          namespace=MC_NAMESPACE)
+    memcache.delete_multi(keys + _all_timezones_keys(),
+                          namespace=MC_NAMESPACE)
 
     ndb.Future.wait_all(futures)
 
@@ -228,19 +539,98 @@ def get_tz_obj(timezone):
     tz_obj = TimeZoneData.fetch(timezone)
     return tz_obj
 
-def get_tzdata(timezone):
+def _load_tzdata(timezone):
+    """Reloads a timezone's stored data from the datastore into memcache.
+    Returns MC_NOT_FOUND, also kept in memcache for a short time, if the
+    timezone doesn't exist.
+    """
+    tz_obj = TimeZoneData.fetch(timezone)
+    if tz_obj is None:
+        counters.incr('datastore.misses')
+        logging.error("SPYTZ: timezone '{}' does not exist!".format(timezone))
+        memcache.set(timezone, MC_NOT_FOUND, MC_NOT_FOUND_TIME,
+                     namespace=MC_NAMESPACE)
+        return MC_NOT_FOUND
+
+    counters.incr('datastore.hits')
+    # Add the keys / data to memcache.
+    _store(timezone, tz_obj.data)
+    return tz_obj.data
+
+@ndb.tasklet
+def _load_tzdata_async(timezone):
+    """Async _load_tzdata()."""
+    ctx = ndb.get_context()
+    tz_obj = yield TimeZoneData.fetch_async(timezone)
+    if tz_obj is None:
+        counters.incr('datastore.misses')
+        logging.error("SPYTZ: timezone '{}' does not exist!".format(timezone))
+        yield ctx.memcache_set(timezone, MC_NOT_FOUND, MC_NOT_FOUND_TIME,
+                               namespace=MC_NAMESPACE, use_cache=False)
+        raise ndb.Return(MC_NOT_FOUND)
+
+    counters.incr('datastore.hits')
+    # Add the keys / data to memcache.
+    yield [ctx.memcache_set(timezone, tz_obj.data, MC_STORE_TIME,
+                            namespace=MC_NAMESPACE, use_cache=False),
+           ctx.memcache_set(MC_STALE_PREFIX + timezone, tz_obj.data,
+                            MC_STALE_TIME, namespace=MC_NAMESPACE,
+                            use_cache=False)]
+    raise ndb.Return(tz_obj.data)
+
+def get_tzdata(timezone, with_stale=False):
+    """Returns the parsed transition table for a timezone, as used by
+    tzfile.build_tzinfo_from_table(). Checks Memcache first, datastore second.
+    With 'with_stale', returns (table, stale), where 'stale' is True if the
+    table is an outdated copy that must not be kept, or None if the refill
+    timed out.
+    """
     tz_data = memcache.get(timezone, namespace=MC_NAMESPACE)
-    
+    stale = False
+
     if not tz_data:
         # Memcache key not found, so force a reload.
-        tz_obj = TimeZoneData.fetch(timezone)
-        if tz_obj is None:
-            logging.error("SPYTZ: timezone '{}' does not exist!".format(timezone))
-            raise UnknownTimeZoneError
+        counters.incr('memcache.misses')
+        tz_data, stale = _refill(timezone, lambda: _load_tzdata(timezone))
+    else:
+        counters.incr('memcache.hits')
+
+    return _decode_tzdata(timezone, tz_data, stale, with_stale)
+
+def _decode_tzdata(timezone, tz_data, stale, with_stale):
+    if tz_data == MC_NOT_FOUND:
+        raise UnknownTimeZoneError(timezone)
+
+    if tz_data is None:
+        if with_stale:
+            return None, True
+        raise UnknownTimeZoneError(timezone)
+
+    counters.incr('bytes_fetched', len(tz_data))
 
-        tz_data = tz_obj.data
-        # Add the keys / data to memcache.
-        memcache.set(timezone, tz_data, MC_STORE_TIME, namespace=MC_NAMESPACE)
+    # Decode the memcache data
+    table = codec.decode(tz_data)
+    return (table, stale) if with_stale else table
+
+@ndb.tasklet
+def get_tzdata_async(timezone, with_stale=False):
+    """Async get_tzdata(). Returns a future for the parsed transition table,
+    or (table, stale) with 'with_stale'.
+
+    Memcache reads go through the ndb context, which batches the reads of
+    concurrently running tasklets into a single get_multi RPC.
+    """
+    ctx = ndb.get_context()
+    tz_data = yield ctx.memcache_get(timezone, namespace=MC_NAMESPACE,
+                                     use_cache=False)
+    stale = False
+
+    if not tz_data:
+        # Memcache key not found, so force a reload.
+        counters.incr('memcache.misses')
+        tz_data, stale = yield _refill_async(
+            timezone, lambda: _load_tzdata_async(timezone))
+    else:
+        counters.incr('memcache.hits')
 
-    # Return the memcache data
-    return StringIO(tz_data)
+    raise ndb.Return(_decode_tzdata(timezone, tz_data, stale, with_stale))
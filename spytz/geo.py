@@ -0,0 +1,109 @@
+'''
+Nearest timezone lookups over the zone.tab coordinates.
+
+The index is a k-d tree over the zone locations as points on the unit
+sphere, stored as a flat list so it can be kept as a single JSON or memcache
+value. Each entry is [x, y, z, zone]. The tree is implicit: the node for the
+range [lo, hi) is at (lo + hi) // 2 and splits on axis depth % 3. The chord
+distance between unit vectors orders points the same way as the great
+circle distance, so a query does trigonometry once for the query point and
+plain arithmetic for the candidates.
+'''
+
+from math import radians, sin, cos
+import heapq
+
+__all__ = ['parse_coords', 'build_index', 'nearest', 'nearest_many']
+
+
+def parse_coords(coords):
+    '''Parse ISO 6709 coordinates from zone.tab into degrees
+
+    >>> parse_coords('-3749+14458')
+    (-37.81666666666667, 144.96666666666667)
+    >>> parse_coords('+404251-0740023')
+    (40.71416666666667, -74.00638888888889)
+    '''
+    # The longitude sign is the first sign after the latitude sign.
+    i = max(coords.rfind('+'), coords.rfind('-'))
+    return _parse_degrees(coords[:i], 2), _parse_degrees(coords[i:], 3)
+
+
+def _parse_degrees(value, width):
+    sign = -1 if value[0] == '-' else 1
+    digits = value[1:]
+    degrees = int(digits[:width])
+    minutes = int(digits[width:width + 2])
+    seconds = int(digits[width + 2:] or 0)
+    return sign * (degrees + minutes / 60.0 + seconds / 3600.0)
+
+
+def _to_vector(lat, lon):
+    lat = radians(lat)
+    lon = radians(lon)
+    return cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat)
+
+
+def build_index(zone_coords):
+    '''Build the k-d tree index from a dictionary of zone to zone.tab coords'''
+    points = []
+    for zone, coords in sorted(zone_coords.items()):
+        if coords:
+            points.append([round(v, 6) for v in
+                           _to_vector(*parse_coords(coords))] + [zone])
+    _build(points, 0, len(points), 0)
+    return points
+
+
+def _build(points, lo, hi, depth):
+    if hi - lo <= 1:
+        return
+    axis = depth % 3
+    points[lo:hi] = sorted(points[lo:hi], key=lambda p: p[axis])
+    mid = (lo + hi) // 2
+    _build(points, lo, mid, depth + 1)
+    _build(points, mid + 1, hi, depth + 1)
+
+
+def _search(index, q, k, best, lo, hi, depth):
+    '''Collect the k nearest points in index[lo:hi] into the best heap of
+    (-distance squared, zone) pairs.'''
+    if lo >= hi:
+        return
+    mid = (lo + hi) // 2
+    point = index[mid]
+    dx = point[0] - q[0]
+    dy = point[1] - q[1]
+    dz = point[2] - q[2]
+    dist = dx * dx + dy * dy + dz * dz
+    if len(best) < k:
+        heapq.heappush(best, (-dist, point[3]))
+    elif dist < -best[0][0]:
+        heapq.heapreplace(best, (-dist, point[3]))
+
+    axis = depth % 3
+    diff = q[axis] - point[axis]
+    if diff < 0:
+        near, far = (lo, mid), (mid + 1, hi)
+    else:
+        near, far = (mid + 1, hi), (lo, mid)
+
+    _search(index, q, k, best, near[0], near[1], depth + 1)
+    # Only cross the splitting plane if it is closer than the worst match.
+    if len(best) < k or diff * diff < -best[0][0]:
+        _search(index, q, k, best, far[0], far[1], depth + 1)
+
+
+def nearest(index, lat, lon, k=1):
+    '''Return the k zones nearest to lat, lon in degrees, nearest first'''
+    if k < 1:
+        raise ValueError('k must be at least 1, got %r' % (k,))
+    best = []
+    _search(index, _to_vector(lat, lon), k, best, 0, len(index), 0)
+    return [zone for dist, zone in sorted(best, reverse=True)]
+
+
+def nearest_many(index, points, k=1):
+    '''Return nearest() for each (lat, lon) pair in points. This is a
+    convenience wrapper, each point is a separate search of the tree.'''
+    return [nearest(index, lat, lon, k) for lat, lon in points]
@@ -0,0 +1,108 @@
+'''
+Parsing of ISO 8601 date and time strings into aware datetimes.
+
+Accepted strings are a date, a 'T' or space, a time and an optional zone:
+
+    2014-04-15T10:00
+    2014-04-15T10:00:00.123456+10:00
+    2014-04-15 10:00:00Z
+    2014-04-15T10:00:00 Australia/Melbourne
+    2014-04-15T10:00:00+10:00[Australia/Melbourne]
+
+Offsets are resolved with spytz.fixed_offset_from_string() and zone names
+with spytz.timezone(). A zone name alone localizes the wall clock time, and
+an offset with a zone name converts the instant to that zone. Strings with
+neither are given the default timezone, or left naive with naive=True.
+
+The fields are sliced from fixed positions and checked to be digits, with
+no regular expression or strptime(), and each distinct zone suffix is
+resolved once per call to parse_datetimes().
+'''
+
+from datetime import datetime
+
+import spytz
+
+__all__ = ['parse_datetime', 'parse_datetimes']
+
+
+def _resolve(suffix):
+    '''Return the (offset tzinfo, zone tzinfo) pair for a zone suffix, either
+    of which may be None'''
+    suffix = suffix.strip()
+    zone = None
+    if suffix.endswith(']'):
+        pos = suffix.find('[')
+        if pos < 0:
+            raise ValueError('Invalid timezone %r' % (suffix,))
+        suffix, zone = suffix[:pos], suffix[pos + 1:-1]
+    elif suffix and suffix[0] not in '+-Zz':
+        suffix, zone = '', suffix
+
+    return (suffix and spytz.fixed_offset_from_string(suffix) or None,
+            zone and spytz.timezone(zone) or None)
+
+
+def _parse(value, default, is_dst, zones):
+    '''Parse value, localizing it to default if it has no offset or zone,
+    or leaving it naive if default is None'''
+    size = len(value)
+    if (size < 16 or value[4] != '-' or value[7] != '-'
+            or value[10] not in 'Tt ' or value[13] != ':'
+            or not (value[:4] + value[5:7] + value[8:10] + value[11:13] +
+                    value[14:16]).isdigit()):
+        raise ValueError('Invalid ISO 8601 datetime %r' % (value,))
+
+    second = microsecond = 0
+    pos = 16
+    if size > pos and value[pos] == ':':
+        second = value[17:19]
+        if len(second) != 2 or not second.isdigit():
+            raise ValueError('Invalid ISO 8601 datetime %r' % (value,))
+        second = int(second)
+        pos = 19
+    if size > pos and value[pos] in '.,':
+        end = pos + 1
+        while end < size and value[end].isdigit():
+            end += 1
+        fraction = value[pos + 1:end]
+        if not fraction:
+            raise ValueError('Invalid ISO 8601 datetime %r' % (value,))
+        microsecond = int((fraction + '00000')[:6])
+        pos = end
+
+    dt = datetime(int(value[:4]), int(value[5:7]), int(value[8:10]),
+                  int(value[11:13]), int(value[14:16]), second, microsecond)
+
+    suffix = value[pos:]
+    if not suffix:
+        if default is None:
+            return dt
+        return default.localize(dt, is_dst)
+    try:
+        offset, zone = zones[suffix]
+    except KeyError:
+        offset, zone = zones[suffix] = _resolve(suffix)
+
+    if zone is None:
+        return dt.replace(tzinfo=offset)
+    elif offset is None:
+        return zone.localize(dt, is_dst)
+    return dt.replace(tzinfo=offset).astimezone(zone)
+
+
+def parse_datetime(value, default=None, is_dst=False, naive=False):
+    '''Parse an ISO 8601 string into an aware datetime. Strings without an
+    offset or zone are localized to default, which defaults to UTC, or left
+    naive if naive is true. is_dst is passed to localize() for zone names
+    and default.'''
+    return _parse(value, None if naive else default or spytz.utc, is_dst,
+                  {})
+
+
+def parse_datetimes(values, default=None, is_dst=False, naive=False):
+    '''Parse a sequence of ISO 8601 strings into a list of datetimes, as
+    parse_datetime()'''
+    default = None if naive else default or spytz.utc
+    zones = {}
+    return [_parse(value, default, is_dst, zones) for value in values]
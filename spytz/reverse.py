@@ -0,0 +1,135 @@
+'''
+Reverse indexes from timezone abbreviations and UTC offsets to timezones.
+
+The index is a dictionary that can be kept as a single JSON or memcache
+value like the spytz.geo index:
+
+    'abbreviations'   upper case abbreviation to {'current': {...},
+                      'historic': [...]}, see below
+    'offsets'         UTC offset in seconds, as a string, to {...} current
+                      timezones
+
+It is built once per data update from the parse_tzfile() tables of every
+zone. An abbreviation or offset is current for a zone if the zone uses it
+at the time of the lookup or in the following year, so both the standard
+and daylight saving time entries of a zone are current however long ago
+the index was built. The current timezones only change at a few times from
+the build onward, so each 'current' entry holds those times as 'since', in
+UTC seconds, and the sorted timezone names current from each as 'zones',
+and a lookup is a bisect. Historic abbreviations include current ones.
+'''
+
+from bisect import bisect_right
+import time
+
+__all__ = ['build_index', 'zones_for_abbreviation', 'zones_for_offset']
+
+_YEAR = 366 * 24 * 60 * 60
+
+
+def _periods(transitions, lindexes, now):
+    '''Yield (start, end, ttinfo index) for each period of a zone in effect
+    from now, the first starting at now'''
+    if not transitions:
+        yield now, None, 0
+        return
+    # Skip the datetime.min entry, which sorts before everything.
+    times = transitions[1:]
+    for k in range(bisect_right(times, now), len(transitions)):
+        start = max(now, transitions[k] if k else now)
+        end = times[k] if k < len(times) else None
+        yield start, end, lindexes[k]
+
+
+def _add_period(periods, zone, start, end):
+    spans = periods.setdefault(zone, [])
+    if spans and spans[-1][1] is not None and start - spans[-1][1] < _YEAR:
+        spans[-1][1] = end
+    else:
+        spans.append([start, end])
+
+
+def _build_current(periods):
+    '''Return the 'current' entry for periods, a dictionary of timezone to
+    the [start, end] UTC seconds it uses an abbreviation or offset'''
+    changes = set()
+    for spans in periods.values():
+        for start, end in spans:
+            # Current from a year before it is used until it ends.
+            changes.add(start - _YEAR)
+            if end is not None:
+                changes.add(end)
+
+    since = []
+    zones = []
+    for when in sorted(changes):
+        current = sorted(zone for zone, spans in periods.items()
+                         if any(start - _YEAR <= when and
+                                (end is None or when < end)
+                                for start, end in spans))
+        if not zones or current != zones[-1]:
+            since.append(when)
+            zones.append(current)
+    return {'since': since, 'zones': zones}
+
+
+def build_index(tables, now=None):
+    '''Build the index from a dictionary of zone to parse_tzfile() table.
+    now is in UTC seconds since the epoch, and defaults to the current
+    time.'''
+    if now is None:
+        now = int(time.time())
+
+    abbreviations = {}
+    offsets = {}
+    for zone, (transitions, lindexes, ttinfos) in tables.items():
+        for i in set(lindexes) if transitions else [0]:
+            entry = abbreviations.setdefault(ttinfos[i][2].upper(),
+                                             {'periods': {},
+                                              'historic': set()})
+            entry['historic'].add(zone)
+
+        for start, end, i in _periods(transitions, lindexes, now):
+            utcoffset, dst, tzname = ttinfos[i]
+            _add_period(abbreviations[tzname.upper()]['periods'], zone,
+                        start, end)
+            _add_period(offsets.setdefault(str(utcoffset), {}), zone,
+                        start, end)
+
+    for abbreviation, entry in abbreviations.items():
+        abbreviations[abbreviation] = {
+            'current': _build_current(entry['periods']),
+            'historic': sorted(entry['historic'])}
+    for offset, periods in offsets.items():
+        offsets[offset] = _build_current(periods)
+
+    return {'abbreviations': abbreviations, 'offsets': offsets}
+
+
+def _current(current, now):
+    '''Return the sorted timezones of a 'current' entry at now'''
+    if now is None:
+        now = time.time()
+    i = bisect_right(current['since'], now)
+    return current['zones'][i - 1] if i else []
+
+
+def zones_for_abbreviation(index, abbreviation, historic=False, now=None):
+    '''Return the timezones using abbreviation, a list of names. now is in
+    UTC seconds since the epoch, and defaults to the current time.'''
+    entry = index['abbreviations'].get(abbreviation.upper())
+    if entry is None:
+        return []
+    if historic:
+        return entry['historic']
+    return _current(entry['current'], now)
+
+
+def zones_for_offset(index, seconds, now=None):
+    '''Return the timezones using a UTC offset of seconds at now or in the
+    following year, a list of names. now is in UTC seconds since the epoch,
+    and defaults to the current time.'''
+    current = index['offsets'].get(str(seconds))
+    if current is None:
+        return []
+    return _current(current, now)
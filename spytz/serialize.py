@@ -0,0 +1,121 @@
+'''
+Compact serialization of lists of datetimes, for memcache values and task
+queue payloads.
+
+Pickling a list of aware datetimes stores every datetime's full state, and
+unpickling resolves each DstTzInfo through spytz.timezone() and its _tzinfos
+lookup. dumps_datetimes() stores each distinct tzinfo once in a table and
+every datetime as its wall clock time plus an index into that table:
+
+    magic, flags, count, table size    header, see _HEAD
+    table                              pickled list of the distinct tzinfos
+    indexes                            an unsigned byte, short or int per
+                                       datetime
+    seconds                            wall clock seconds since the epoch
+    microseconds                       only present if any are non-zero
+
+loads_datetimes() resolves each tzinfo in the table once, however many
+datetimes reference it. Naive datetimes are stored against a None entry.
+'''
+
+import pickle
+from datetime import timedelta
+from struct import pack, unpack_from, calcsize
+
+from spytz.tzinfo import _epoch
+
+__all__ = ['dumps_datetimes', 'loads_datetimes']
+
+_MAGIC = 'SPDT'.encode('US-ASCII')
+
+# magic, flags, datetime count, table size
+_HEAD = '>4sBII'
+_HEAD_SIZE = calcsize(_HEAD)
+
+# Flags
+_WIDE_INDEX = 1     # Indexes are unsigned shorts, not bytes
+_WIDE_SECONDS = 2   # Seconds are 64 bit, not 32 bit
+_MICROSECONDS = 4   # Microseconds are stored
+_WIDER_INDEX = 8    # Indexes are unsigned ints, for over 65535 tzinfos
+
+# Protocol 2 is the highest both Python 2 and 3 read.
+_PROTOCOL = 2
+
+
+def _index_code(flags):
+    if flags & _WIDER_INDEX:
+        return 'I'
+    return 'H' if flags & _WIDE_INDEX else 'B'
+
+
+def dumps_datetimes(datetimes):
+    '''Serialize a sequence of naive or aware datetimes to a byte string'''
+    tzinfos = []
+    slots = {}
+    indexes = []
+    seconds = []
+    micros = []
+    for dt in datetimes:
+        tzinfo = dt.tzinfo
+        # tzinfo instances are singletons, so identity is enough to intern
+        # them.
+        try:
+            index = slots[id(tzinfo)]
+        except KeyError:
+            index = slots[id(tzinfo)] = len(tzinfos)
+            tzinfos.append(tzinfo)
+        indexes.append(index)
+        delta = dt.replace(tzinfo=None) - _epoch
+        seconds.append(delta.days * 86400 + delta.seconds)
+        micros.append(delta.microseconds)
+
+    flags = 0
+    if len(tzinfos) > 0xffff:
+        flags |= _WIDER_INDEX
+    elif len(tzinfos) > 0xff:
+        flags |= _WIDE_INDEX
+    if seconds and not -0x80000000 <= min(seconds) <= max(seconds) <= 0x7fffffff:
+        flags |= _WIDE_SECONDS
+    if any(micros):
+        flags |= _MICROSECONDS
+
+    table = pickle.dumps(tzinfos, _PROTOCOL)
+    count = len(indexes)
+    out = [pack(_HEAD, _MAGIC, flags, count, len(table)), table,
+           pack('>%d%s' % (count, _index_code(flags)), *indexes),
+           pack('>%d%s' % (count, 'q' if flags & _WIDE_SECONDS else 'l'),
+                *seconds)]
+    if flags & _MICROSECONDS:
+        out.append(pack('>%dl' % count, *micros))
+
+    return ''.encode('US-ASCII').join(out)
+
+
+def loads_datetimes(data):
+    '''Deserialize a byte string from dumps_datetimes() to a list of
+    datetimes'''
+    magic, flags, count, size = unpack_from(_HEAD, data)
+    if magic != _MAGIC:
+        raise ValueError('Not a dumps_datetimes() byte string')
+    pos = _HEAD_SIZE
+
+    tzinfos = pickle.loads(data[pos:pos + size])
+    pos += size
+
+    fmt = '>%d%s' % (count, _index_code(flags))
+    indexes = unpack_from(fmt, data, pos)
+    pos += calcsize(fmt)
+
+    fmt = '>%d%s' % (count, 'q' if flags & _WIDE_SECONDS else 'l')
+    seconds = unpack_from(fmt, data, pos)
+    pos += calcsize(fmt)
+
+    # Adding to an aware epoch keeps its tzinfo, saving a replace() call
+    # per datetime.
+    epochs = [_epoch.replace(tzinfo=tzinfo) for tzinfo in tzinfos]
+    if flags & _MICROSECONDS:
+        micros = unpack_from('>%dl' % count, data, pos)
+        return [epochs[i] + timedelta(0, s, us)
+                for i, s, us in zip(indexes, seconds, micros)]
+
+    return [epochs[i] + timedelta(0, s) for i, s in zip(indexes, seconds)]
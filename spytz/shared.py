@@ -0,0 +1,139 @@
+'''
+Raw timezone data shared between processes through a memory mapped file,
+for pre-fork servers outside App Engine.
+
+A compiled bundle holds every zone's table as Python objects in every
+process, and reference counting writes to the pages of any the master built
+before forking. A shared table file instead holds every zone's transitions
+as packed 32 bit seconds and ttinfo indexes. The master process maps it once
+before forking, and the packed data stays in the shared page cache however
+many workers use it.
+
+    # Deploy time, or in the master process.
+    python utils/spkg.py share zonefiles/spytz-zoneinfo-2014.4.tar.gz /srv/spytz.tables
+
+    # In the master process before forking.
+    from spytz import shared
+    shared.install('/srv/spytz.tables')
+
+Once installed, spytz.timezone() builds timezones from the mapped tables
+instead of the bundle or the datastore. Each process decodes a zone's table
+with a single unpack the first time the zone is used, into the same lists a
+bundle's tzinfo uses, so lookups run at bundle speed. Those lists are the
+process's own copy: only the raw data is shared, and a worker's memory grows
+with the zones it uses rather than holding every zone.
+'''
+
+from struct import Struct
+import json
+import mmap
+
+import spytz
+from spytz.tzfile import build_tzinfo_from_table
+
+__all__ = ['write_tables', 'SharedTables', 'install']
+
+MAGIC = b'SPZT'
+FORMAT_VERSION = 1
+
+# Magic, format version and directory length.
+_header = Struct('<4sII')
+
+
+def _align(size):
+    return (size + 3) & ~3
+
+
+def write_tables(path, tables, version=''):
+    '''Write a dictionary of zone to parse_tzfile() table to a shared table
+    file at path. Zones with identical tables share their data.'''
+    data = []
+    size = 0
+    shared = {}
+    zones = {}
+    for zone in sorted(tables):
+        transitions, lindexes, ttinfos = tables[zone]
+        key = (tuple(transitions), tuple(lindexes))
+        if key not in shared:
+            # The first transition is always None, for datetime.min.
+            times = Struct('<%di' % max(0, len(transitions) - 1))
+            times = times.pack(*transitions[1:])
+            indexes = bytearray(lindexes)
+            shared[key] = (size, size + _align(len(times)))
+            data.append(times + b'\0' * (_align(len(times)) - len(times)))
+            data.append(bytes(indexes) +
+                        b'\0' * (_align(len(indexes)) - len(indexes)))
+            size += _align(len(times)) + _align(len(indexes))
+        times_offset, lindexes_offset = shared[key]
+        zones[zone] = [times_offset, len(transitions), lindexes_offset,
+                       [list(inf) for inf in ttinfos]]
+
+    directory = json.dumps({'version': version, 'zones': zones},
+                           sort_keys=True).encode('US-ASCII')
+    header = _header.pack(MAGIC, FORMAT_VERSION, len(directory))
+    padding = _align(len(header) + len(directory)) - len(header) - \
+        len(directory)
+    with open(path, 'wb') as fo:
+        fo.write(header)
+        fo.write(directory)
+        fo.write(b'\0' * padding)
+        for chunk in data:
+            fo.write(chunk)
+
+
+class SharedTables(object):
+    '''A memory mapped shared table file written by write_tables()'''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fo:
+            self._buf = mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, format_version, size = _header.unpack_from(self._buf, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError('Not a spytz shared table file: %r' % (path,))
+        directory = json.loads(
+            self._buf[_header.size:_header.size + size].decode('US-ASCII'))
+        self._data = _align(_header.size + size)
+        # JSON strings load as unicode on Python 2.
+        self._zones = dict((str(zone), entry)
+                           for zone, entry in directory['zones'].items())
+        self.version = str(directory['version'])
+        self.zones = sorted(self._zones)
+
+    def __contains__(self, zone):
+        return zone in self._zones
+
+    def _table(self, zone):
+        '''Return the parse_tzfile() table of zone, decoded from the
+        mapping'''
+        times_offset, count, lindexes_offset, ttinfos = self._zones[zone]
+        ttinfos = tuple((utcoffset, dst, str(tzname))
+                        for utcoffset, dst, tzname in ttinfos)
+        if not count:
+            return (), (), ttinfos
+
+        # The first transition is always None, for datetime.min.
+        times = Struct('<%di' % (count - 1)).unpack_from(
+            self._buf, self._data + times_offset)
+        lindexes = tuple(bytearray(
+            self._buf[self._data + lindexes_offset:
+                      self._data + lindexes_offset + count]))
+        return (None,) + times, lindexes, ttinfos
+
+    def build_tzinfo(self, zone):
+        '''Build the tzinfo for zone, decoding its table from the
+        mapping'''
+        return build_tzinfo_from_table(zone, self._table(zone))
+
+    def close(self):
+        self._buf.close()
+
+
+def install(path):
+    '''Load timezones in this process and any forked from it from the
+    shared table file at path. None reverts to the bundle or datastore.'''
+    tables = path and SharedTables(path)
+    spytz._shared_tables = tables
+    spytz.flush_local_cache()
+    return tables
@@ -4,6 +4,12 @@ Auto-update.
 # Spytz module imports
 import spytz
 from spytz import gaetz
+from spytz import counters
+from spytz import codec as tzcodec
+from spytz import geo
+from spytz import transitions
+from spytz import reverse
+from spytz.tzfile import parse_tzfile
 
 # Google API imports
 try:
@@ -125,10 +131,17 @@ class SpytzUpdateFile():
                                            for l in fo
                                            if not l.startswith("#")]
                       }
+            # Country code to country name, for every country listed.
+            self.countries = cc
             
             with contextlib.closing(tar.extractfile('zone.tab')) as fo:
                 zones = [l.strip().split(None, 4)[:3]
                          for l in fo if not l.startswith("#")]
+
+            # Country code to timezones, in zone.tab order.
+            self.country_zones = {}
+            for z in zones:
+                self.country_zones.setdefault(z[0], []).append(z[2])
             
             self._tzmeta = {z[2]: {'country': z[0],
                                    'country_code': cc[z[0]],
@@ -158,6 +171,10 @@ class SpytzUpdateFile():
                           }
                     yield tz
 
+    def zone_coords(self):
+        """ Returns a dictionary of timezone to zone.tab coordinates. """
+        return {tz: d['coords'] for tz, d in self._tzmeta.items()}
+
     def _get_all_tzs(self, fileobj):
         return [l.rstrip() for l in fileobj]
     
@@ -195,7 +212,7 @@ def download_file(url):
         raise InvalidUrlError
 
 
-def update(install_version='latest', force_refresh=False):
+def update(install_version='latest', force_refresh=False, codec=None):
     """Updates the timezone data in the datastore. Process is:
             1. Check if the remote 'latest' version is different to 
                local 'current'.
@@ -208,7 +225,13 @@ def update(install_version='latest', force_refresh=False):
             6. Add or update the timezone records in the datastore.
             7. Update the Spytz Metadata.
             8. Delete deprecated timezones from the datastore.
+
+    Timezone data is stored encoded with 'codec', see spytz.codec. Defaults
+    to gaetz.STORE_CODEC. Changing the codec re-encodes every timezone.
     """
+    if codec is None:
+        codec = gaetz.STORE_CODEC
+
     # Start the timer.
     _ts = time.time()
     
@@ -232,6 +255,7 @@ def update(install_version='latest', force_refresh=False):
         logging.info("SPYTZ: No need to update timezones. Exiting.")
         logging.info("SPYTZ: Completed update process in {:4.4f}.".
                      format(time.time() - _ts))
+        counters.timing('update', time.time() - _ts)
         return False
 
     # Download the update file from the remote server.
@@ -246,6 +270,7 @@ def update(install_version='latest', force_refresh=False):
         logging.error('SPYTZ: Checksums do not match. Aborting.')
         logging.info("SPYTZ: Completed update process in {:4.4f}.".
                      format(time.time() - _ts))
+        counters.timing('update', time.time() - _ts)
         raise InvalidFileError
 
     all_tz_current = gaetz.get_all_timezones()
@@ -258,8 +283,14 @@ def update(install_version='latest', force_refresh=False):
     tz_upd = []
     tz_del = []
 
+    # Parsed tables of every timezone, for the transition and reverse
+    # indexes.
+    tables = {}
+
     # next_tz() is a generator, so we can loop through it.
     for tz in sf.next_tz():
+        tables[tz['name']] = parse_tzfile(StringIO(tz['data']))
+        tz['data'] = tzcodec.encode(tz['data'], codec)
         obj = None
         for item in all_tz_objs_current:
             if item.key.id() == tz['name']:
@@ -267,8 +298,10 @@ def update(install_version='latest', force_refresh=False):
                 all_tz_objs_current.remove(item)
 
         if obj:
-            if force_refresh is True or obj.data != tz['data']:
+            if (force_refresh is True or obj.data != tz['data']
+                    or obj.codec != codec):
                 obj.data = tz['data']
+                obj.codec = codec
                 obj.country = tz['country']
                 obj.country_code = tz['country_code']
                 obj.coords = tz['coords']
@@ -280,6 +313,7 @@ def update(install_version='latest', force_refresh=False):
             # Create a new timezone entity.
             obj = gaetz.TimeZoneData(id = tz['name'],
                                      data = tz['data'],
+                                     codec = codec,
                                      country = tz['country'],
                                      country_code = tz['country_code'],
                                      coords = tz['coords'])
@@ -311,7 +345,12 @@ def update(install_version='latest', force_refresh=False):
     logging.info("SPYTZ: Deleted {} timezones.".format(len(all_tz_deleted)))
     
     # Update the SpytzData model version, dates and lists.
-    gaetz.update_metadata(install_version, all_tzs)
+    gaetz.update_metadata(install_version, all_tzs,
+                          countries={'names': sf.countries,
+                                     'zones': sf.country_zones},
+                          geo_index=geo.build_index(sf.zone_coords()),
+                          transition_index=transitions.build_index(tables),
+                          reverse_index=reverse.build_index(tables))
 
     # Reset all memcache entries. 
     logging.info("SPYTZ: Flushing cache.".format(len(all_tz_not_updated)))
@@ -323,5 +362,6 @@ def update(install_version='latest', force_refresh=False):
 
     logging.info("SPYTZ: Successfully updated to version '{}'.".format(rel_info.version))
     logging.info("SPYTZ: Completed update process in {:4.4f}.".format(time.time() - _ts))
+    counters.timing('update', time.time() - _ts)
 
     return True
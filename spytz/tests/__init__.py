@@ -0,0 +1,63 @@
+'''
+Tests for spytz, run with either of:
+
+    python -m pytest spytz/tests
+    python -m unittest discover -s spytz/tests -t .
+
+Timezones are read from the release package in zonefiles/, so neither a
+compiled bundle nor the App Engine SDK is needed. install_zones() makes
+spytz.timezone() load them through a spytz.shared table file when no other
+source is available.
+'''
+
+import atexit
+import os
+import tarfile
+import tempfile
+from io import BytesIO
+
+import spytz
+from spytz.tzfile import parse_tzfile
+
+PACKAGE = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                       'zonefiles', 'spytz-zoneinfo-2014.4.tar.gz')
+
+_package = None
+
+
+def _read_package():
+    global _package
+    if _package is None:
+        files = {}
+        with tarfile.open(PACKAGE, 'r:gz') as tar:
+            for member in tar.getmembers():
+                if member.isfile():
+                    files[member.name] = tar.extractfile(member).read()
+        _package = files
+    return _package
+
+
+def load_file(name):
+    '''Return the raw contents of a file in the release package'''
+    return _read_package()[name]
+
+
+def load_tables():
+    '''Return a dictionary of zone to parse_tzfile() table for every zone
+    in the release package'''
+    alltzs = load_file('alltzs').decode('US-ASCII').split()
+    return dict((str(zone), parse_tzfile(BytesIO(load_file(zone))))
+                for zone in alltzs)
+
+
+def install_zones():
+    '''Make spytz.timezone() work, loading the release package through
+    spytz.shared if there is no bundle or shared table file'''
+    if spytz.zonebundle is not None or spytz._shared_tables is not None:
+        return
+    from spytz import shared
+    fd, path = tempfile.mkstemp(suffix='.tables')
+    os.close(fd)
+    atexit.register(os.remove, path)
+    shared.write_tables(path, load_tables(), '2014.4')
+    shared.install(path)
@@ -0,0 +1,134 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import spytz
+from spytz.tests import load_file, load_tables
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from spytz import aio
+
+
+class _Backend(object):
+    '''Serves the release package, counting table fetches'''
+
+    def __init__(self, zones):
+        self.tables = load_tables()
+        self.zones = zones
+        self.fetches = []
+        self.version = None
+
+    def get_all_timezones(self):
+        return aio._completed(self.zones)
+
+    def get_table(self, zone):
+        self.fetches.append(zone)
+        return aio._completed(self.tables.get(zone))
+
+    def get_version(self):
+        return aio._completed(self.version)
+
+
+class _Client(object):
+    '''Async cache client holding the release package zlib encoded'''
+
+    def __init__(self):
+        from spytz import codec
+        self.data = {b'spytz:_alltzs_': b'Europe/London,Asia/Tokyo'}
+        for zone in ('Europe/London', 'Asia/Tokyo'):
+            key = ('spytz:' + zone).encode('US-ASCII')
+            self.data[key] = codec.encode(load_file(zone), 'zlib')
+
+    def get(self, key):
+        return aio._completed(self.data.get(key))
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio requires Python 3.5')
+class AioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        spytz.flush_local_cache()
+
+    def tearDown(self):
+        aio.set_backend(None)
+        spytz.flush_local_cache()
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def wait(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def test_atimezones_share_fetches(self):
+        backend = _Backend(['Europe/London', 'Asia/Tokyo'])
+        aio.set_backend(backend)
+        london, tokyo, again = self.wait(aio.atimezones(
+            'Europe/London', 'Asia/Tokyo', 'Europe/London'))
+        self.assertEqual(london.zone, 'Europe/London')
+        self.assertEqual(tokyo.zone, 'Asia/Tokyo')
+        self.assertTrue(london is again)
+        self.assertEqual(sorted(backend.fetches),
+                         ['Asia/Tokyo', 'Europe/London'])
+
+    def test_spytz_api(self):
+        aio.set_backend(_Backend(['Europe/London', 'Asia/Tokyo']))
+        london = self.wait(spytz.atimezone('Europe/London'))
+        self.assertTrue(london is spytz.timezone('Europe/London'))
+        self.assertEqual(self.wait(spytz.atimezones('Asia/Tokyo', 'UTC')),
+                         [spytz.timezone('Asia/Tokyo'), spytz.utc])
+
+    def test_import_is_lazy(self):
+        root = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+        output = subprocess.check_output(
+            [sys.executable, '-c',
+             'import sys, spytz; print("asyncio" in sys.modules)'],
+            cwd=root)
+        self.assertEqual(output.strip(), b'False')
+
+    def test_unknown_cache(self):
+        # Listed, but the backend has no table for it.
+        backend = _Backend(['Europe/London', 'Nowhere/Land'])
+        aio.set_backend(backend)
+        for _ in range(2):
+            self.assertRaises(spytz.UnknownTimeZoneError, self.wait,
+                              aio.atimezone('Nowhere/Land'))
+        self.assertEqual(backend.fetches, ['Nowhere/Land'])
+        self.assertTrue(spytz._is_unknown('Nowhere/Land'))
+
+        self.assertRaises(spytz.UnknownTimeZoneError, self.wait,
+                          aio.atimezone('Not/Listed'))
+        self.assertEqual(backend.fetches, ['Nowhere/Land'])
+
+    def test_cache_client_backend(self):
+        aio.set_backend(aio.CacheClientBackend(_Client()))
+        tz = self.wait(aio.atimezone('Asia/Tokyo'))
+        self.assertEqual(tz.zone, 'Asia/Tokyo')
+        self.assertTrue(spytz._tzinfo_cache['Asia/Tokyo'] is tz)
+
+    def test_disk_cache_backend(self):
+        import os
+        import shutil
+        import tempfile
+        from spytz.diskcache import DiskCache
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        backend = _Backend(['Europe/London'])
+        backend.version = '2014.4'
+        cache = DiskCache(os.path.join(tmp, 'zones.db'))
+        self.addCleanup(cache.close)
+
+        for _ in range(2):
+            aio.set_backend(aio.DiskCacheBackend(backend, cache))
+            spytz.flush_local_cache()
+            tz = self.wait(aio.atimezone('Europe/London'))
+            self.assertEqual(tz.zone, 'Europe/London')
+        # The second load came from the disk cache.
+        self.assertEqual(backend.fetches, ['Europe/London'])
+
+
+if __name__ == '__main__':
+    unittest.main()
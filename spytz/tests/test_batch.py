@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+import multiprocessing
+import random
+import unittest
+
+import spytz
+from spytz import batch
+from spytz.tests import install_zones
+
+
+def _expected(zone, ts):
+    tz = spytz.timezone(zone)
+    utc = datetime(1970, 1, 1) + timedelta(seconds=ts)
+    return tz.fromutc(utc.replace(tzinfo=tz))
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+        rnd = random.Random(46)
+        zones = ['Europe/London', 'America/New_York', 'Australia/Lord_Howe',
+                 'Asia/Kolkata', 'Pacific/Apia', 'UTC']
+        self.records = [{'tz': rnd.choice(zones),
+                         'ts': rnd.randrange(-2 ** 31, 2 ** 31) +
+                         rnd.random()}
+                        for _ in range(3000)]
+        # Runs of nearby timestamps, as in real logs.
+        base = 1396000000
+        self.records += [{'tz': 'Europe/London', 'ts': base + n * 600}
+                         for n in range(2000)]
+
+    def check(self, processes):
+        result = list(batch.convert(self.records, 'tz', 'ts',
+                                    processes=processes, chunk_size=777))
+        self.assertEqual(len(result), len(self.records))
+        for record, dt in zip(self.records, result):
+            expected = _expected(record['tz'], record['ts'])
+            self.assertEqual(dt, expected)
+            self.assertTrue(dt.tzinfo is expected.tzinfo)
+
+        offsets = list(batch.utcoffsets(self.records, 'tz', 'ts',
+                                        processes=processes, chunk_size=777))
+        self.assertEqual(offsets, [_offset(dt) for dt in result])
+
+    def test_in_process(self):
+        self.check(1)
+
+    def test_pool(self):
+        self.check(2)
+
+    @unittest.skipUnless(hasattr(multiprocessing, 'get_context'),
+                         'start methods need Python 3.4')
+    def test_spawned_pool(self):
+        # Spawned workers don't inherit the installed shared tables.
+        pool = batch.multiprocessing.Pool
+        batch.multiprocessing.Pool = multiprocessing.get_context('spawn').Pool
+        try:
+            self.check(2)
+        finally:
+            batch.multiprocessing.Pool = pool
+
+    def test_sequences(self):
+        records = [(r['tz'], r['ts']) for r in self.records[:100]]
+        self.assertEqual(list(batch.convert(records, 0, 1, processes=1)),
+                         [_expected(zone, ts) for zone, ts in records])
+
+    def test_unknown_zone(self):
+        records = [{'tz': 'Europe/London', 'ts': 0},
+                   {'tz': 'Nowhere/Land', 'ts': 0}]
+        for processes in (1, 2):
+            self.assertRaises(spytz.UnknownTimeZoneError, list,
+                              batch.convert(records, 'tz', 'ts',
+                                            processes=processes))
+
+    def test_table_cache(self):
+        size = batch.TABLE_CACHE_SIZE
+        batch.TABLE_CACHE_SIZE = 5
+        try:
+            for zone in spytz.all_timezones[:20]:
+                batch._zone_table(zone)
+            self.assertEqual(list(batch._tables), spytz.all_timezones[15:20])
+        finally:
+            batch.TABLE_CACHE_SIZE = size
+        spytz.flush_local_cache()
+        self.assertEqual(len(batch._tables), 0)
+
+
+def _offset(dt):
+    offset = dt.utcoffset()
+    return offset.days * 86400 + offset.seconds
+
+
+if __name__ == '__main__':
+    unittest.main()
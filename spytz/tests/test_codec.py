@@ -0,0 +1,29 @@
+import unittest
+
+from spytz import codec
+from spytz.tests import load_file, load_tables
+
+
+class CodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tables = load_tables()
+
+    def test_round_trip_every_zone(self):
+        for name in ('none', 'zlib', 'zlib:9', 'delta'):
+            for zone, table in self.tables.items():
+                blob = codec.encode(load_file(zone), name)
+                self.assertEqual(codec.codec_of(blob), name.split(':')[0])
+                self.assertEqual(codec.decode(blob), table, (name, zone))
+
+    def test_delta_is_smaller(self):
+        data = load_file('Europe/London')
+        self.assertTrue(len(codec.encode(data, 'delta')) <
+                        len(codec.encode(data, 'zlib:9')))
+
+    def test_unknown_codec(self):
+        self.assertRaises(ValueError, codec.encode, b'', 'bz2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+import random
+import unittest
+
+import spytz
+from spytz import columns
+from spytz.tests import install_zones
+
+
+class ColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+        rnd = random.Random(48)
+        self.timestamps = sorted(rnd.randrange(-2 ** 31, 2 ** 31)
+                                 for _ in range(2000))
+
+    def check(self, tz, cols):
+        self.assertEqual(len(cols.offsets), len(self.timestamps))
+        for n, ts in enumerate(self.timestamps):
+            utc = datetime(1970, 1, 1) + timedelta(seconds=ts)
+            dt = tz.fromutc(utc.replace(tzinfo=tz))
+            offset = dt.utcoffset()
+            self.assertEqual(cols.offsets[n],
+                             offset.days * 86400 + offset.seconds)
+            self.assertEqual(cols.dst[n], 1 if dt.dst() else 0)
+            self.assertEqual(cols.names[cols.abbreviations[n]], dt.tzname())
+
+    def test_matches_fromutc(self):
+        for zone in ('Europe/London', 'Australia/Lord_Howe', 'Asia/Kolkata',
+                     'America/Sao_Paulo'):
+            tz = spytz.timezone(zone)
+            self.check(tz, columns.zone_columns(zone, self.timestamps))
+            self.check(tz, columns.zone_columns(tz, self.timestamps))
+
+    def test_static_zones(self):
+        for tz in (spytz.utc, spytz.FixedOffset(330)):
+            cols = columns.zone_columns(tz, self.timestamps)
+            self.check(tz, cols)
+            self.assertEqual(len(cols.names), 1)
+
+    def test_empty(self):
+        cols = columns.zone_columns('Europe/London', [])
+        self.assertEqual((len(cols.offsets), len(cols.dst),
+                          len(cols.abbreviations)), (0, 0, 0))
+
+    def test_types(self):
+        cols = columns.zone_columns('Europe/London', self.timestamps)
+        self.assertEqual((cols.offsets.typecode, cols.offsets.itemsize),
+                         ('i', 4))
+        self.assertEqual(cols.abbreviations.typecode, 'B')
+        self.assertTrue(isinstance(cols.dst, bytearray))
+
+if __name__ == '__main__':
+    unittest.main()
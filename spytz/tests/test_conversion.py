@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+import unittest
+
+import spytz
+from spytz import conversion
+from spytz.tests import install_zones
+
+PAIRS = [('Europe/London', 'America/New_York'),
+         ('America/New_York', 'Australia/Lord_Howe'),
+         ('Australia/Melbourne', 'UTC'),
+         ('UTC', 'Europe/Moscow'),
+         ('Asia/Kolkata', 'Pacific/Apia')]
+
+
+class ConversionTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+        conversion._table_cache.clear()
+
+    def test_matches_localize(self):
+        for from_zone, to_zone in PAIRS:
+            from_tz = spytz.timezone(from_zone)
+            to_tz = spytz.timezone(to_zone)
+            table = conversion.ConversionTable(from_tz, to_tz)
+            # An odd step from 1970 lands on most hours of the day,
+            # including both sides of transitions.
+            dt = datetime(1970, 1, 1)
+            while dt < datetime(2020, 1, 1):
+                for is_dst in (False, True):
+                    expected = from_tz.localize(dt, is_dst).astimezone(to_tz)
+                    result = table.convert(dt, is_dst)
+                    self.assertEqual(result, expected, (from_zone, dt))
+                    self.assertEqual(result.tzinfo, expected.tzinfo)
+                dt += timedelta(minutes=47 * 60 + 47)
+
+    def test_ambiguous_and_nonexistent(self):
+        london = spytz.timezone('Europe/London')
+        for dt in (datetime(2014, 3, 30, 1, 30),
+                   datetime(2014, 10, 26, 1, 30)):
+            for is_dst in (False, True):
+                self.assertEqual(
+                    spytz.convert_wallclock(dt, london, spytz.utc, is_dst),
+                    london.localize(dt, is_dst).astimezone(spytz.utc))
+            self.assertRaises(spytz.InvalidTimeError,
+                              spytz.convert_wallclock, dt, london, spytz.utc,
+                              None)
+
+    def test_zone_names(self):
+        dt = datetime(2014, 7, 1, 12)
+        self.assertEqual(
+            spytz.convert_wallclock(dt, 'Europe/London', 'Asia/Tokyo'),
+            spytz.timezone('Europe/London').localize(dt).astimezone(
+                spytz.timezone('Asia/Tokyo')))
+        self.assertRaises(spytz.UnknownTimeZoneError,
+                          spytz.convert_wallclock, dt, 'Nowhere/Land', 'UTC')
+
+    def test_least_recently_used_evicted(self):
+        zones = [zone for zone in spytz.all_timezones
+                 if zone != 'Europe/London']
+        first = conversion.get_table('Europe/London', 'UTC')
+        for zone in zones[:conversion.TABLE_CACHE_SIZE * 2]:
+            conversion.get_table(zone, 'UTC')
+            # Keep the first pair in use.
+            self.assertTrue(
+                conversion.get_table('Europe/London', 'UTC') is first)
+        self.assertEqual(len(conversion._table_cache),
+                         conversion.TABLE_CACHE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from spytz import convert
+from spytz.tests import install_zones
+
+# Europe/London skips 01:00-02:00 on 2014-03-30 and repeats it on
+# 2014-10-26.
+NONEXISTENT = '2014-03-30T01:30'
+AMBIGUOUS = '2014-10-26T01:30'
+
+EXPECTED = {
+    ('std', NONEXISTENT): '2014-03-30T01:30:00+00:00',
+    ('dst', NONEXISTENT): '2014-03-30T00:30:00+00:00',
+    ('std', AMBIGUOUS): '2014-10-26T01:30:00+00:00',
+    ('dst', AMBIGUOUS): '2014-10-26T00:30:00+00:00',
+    ('blank', NONEXISTENT): None,
+    ('blank', AMBIGUOUS): None,
+}
+
+
+class _Stderr(object):
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.append(text)
+
+
+class ConvertTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.stderr = _Stderr()
+        stderr = sys.stderr
+        sys.stderr = self.stderr
+        self.addCleanup(setattr, sys, 'stderr', stderr)
+
+    def run_main(self, name, text, *args):
+        src = os.path.join(self.tmp, name)
+        dst = os.path.join(self.tmp, 'out-' + name)
+        with open(src, 'wb') as fo:
+            fo.write(text.encode('utf-8'))
+        code = convert.main([src, '-o', dst, '-q'] + list(args))
+        with open(dst, 'rb') as fi:
+            return code, fi.read().decode('utf-8')
+
+    def test_csv(self):
+        code, output = self.run_main(
+            'events.csv',
+            'id,created,tz\r\n'
+            '1,2014-04-15T10:00,Australia/Melbourne\r\n'
+            '2,2014-07-01T12:00:00Z,Europe/London\r\n',
+            '--column', 'created', '--from-column', 'tz',
+            '--to', 'America/New_York', '--output-column', 'local')
+        self.assertEqual(code, 0)
+        self.assertEqual(output.splitlines(), [
+            'id,created,tz,local',
+            '1,2014-04-15T10:00,Australia/Melbourne,'
+            '2014-04-14T20:00:00-04:00',
+            '2,2014-07-01T12:00:00Z,Europe/London,'
+            '2014-07-01T08:00:00-04:00'])
+
+    def test_jsonl_epoch(self):
+        records = [{'ts': 1396000000.123456, 'tz': 'Asia/Tokyo'},
+                   {'ts': 0, 'tz': 'UTC'}]
+        code, output = self.run_main(
+            'events.jsonl', ''.join(json.dumps(r) + '\n' for r in records),
+            '--column', 'ts', '--epoch', '--to-column', 'tz')
+        self.assertEqual(code, 0)
+        self.assertEqual([json.loads(line)['ts']
+                          for line in output.splitlines()],
+                         ['2014-03-28T18:46:40.123456+09:00',
+                          '1970-01-01T00:00:00+00:00'])
+
+    def check_policy(self, option, value, policy, fmt):
+        if fmt == 'csv':
+            text = 'ts\r\n2014-01-01T00:00\r\n%s\r\n' % (value,)
+        else:
+            text = '{"ts": "2014-01-01T00:00"}\n{"ts": "%s"}\n' % (value,)
+        code, output = self.run_main(
+            'policy.' + fmt, text, '--column', 'ts',
+            '--from', 'Europe/London', option, policy)
+        if policy == 'error':
+            self.assertEqual(code, 1)
+            self.assertTrue('record 2:' in ''.join(self.stderr.lines),
+                            self.stderr.lines)
+            return
+        self.assertEqual(code, 0)
+        if fmt == 'csv':
+            result = list(csv.reader(output.splitlines()))[2][0] or None
+        else:
+            result = json.loads(output.splitlines()[1])['ts']
+        self.assertEqual(result, EXPECTED[policy, value],
+                         (option, policy, fmt))
+
+    def test_policies(self):
+        for option, value in (('--nonexistent', NONEXISTENT),
+                              ('--ambiguous', AMBIGUOUS)):
+            for policy in convert.POLICIES:
+                for fmt in ('csv', 'jsonl'):
+                    self.check_policy(option, value, policy, fmt)
+
+    def test_unknown_zone(self):
+        code, output = self.run_main(
+            'bad.csv', 'ts,tz\r\n2014-01-01T00:00,UTC\r\n'
+            '2014-01-01T00:00,Nowhere/Land\r\n',
+            '--column', 'ts', '--from-column', 'tz')
+        self.assertEqual(code, 1)
+        self.assertTrue('record 2: UnknownTimeZoneError'
+                        in ''.join(self.stderr.lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+from datetime import datetime
+import unittest
+
+import spytz
+from spytz import counters
+from spytz.tests import install_zones
+from spytz.tzinfo import DstTzInfo, StaticTzInfo
+
+
+class CountersTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+        counters.reset()
+        self.addCleanup(counters.reset)
+
+    def test_counting(self):
+        counters.incr('memcache.hits')
+        counters.incr('memcache.hits')
+        counters.incr('bytes_fetched', 100)
+        counters.timing('build', 0.5)
+        self.assertEqual(spytz.stats(), {'memcache.hits': 2,
+                                         'bytes_fetched': 100,
+                                         'build.count': 1,
+                                         'build.time': 0.5})
+        # stats() is a snapshot.
+        spytz.stats()['memcache.hits'] = 10
+        self.assertEqual(spytz.stats()['memcache.hits'], 2)
+
+    def test_process_cache(self):
+        spytz.flush_local_cache()
+        spytz.timezone('Europe/London')
+        spytz.timezone('Europe/London')
+        stats = spytz.stats()
+        self.assertEqual(stats['process_cache.misses'], 1)
+        self.assertEqual(stats['process_cache.hits'], 1)
+        self.assertEqual(stats['build.count'], 1)
+
+    def test_reset(self):
+        counters.incr('memcache.misses')
+        counters.reset()
+        self.assertEqual(spytz.stats(), {})
+
+    def test_hooks(self):
+        seen = []
+
+        def hook(name, value):
+            seen.append((name, value))
+
+        counters.add_hook(hook)
+        counters.add_hook(hook)
+        try:
+            counters.incr('datastore.hits')
+            counters.incr('bytes_fetched', 7)
+        finally:
+            counters.remove_hook(hook)
+        counters.incr('datastore.hits')
+        self.assertEqual(seen, [('datastore.hits', 1), ('bytes_fetched', 7)])
+
+    def test_sampling(self):
+        originals = dict(((cls, name), cls.__dict__[name])
+                         for cls in (StaticTzInfo, DstTzInfo)
+                         for name in ('localize', 'fromutc'))
+        london = spytz.timezone('Europe/London')
+        dt = datetime(2014, 7, 1, 12)
+        counters.set_sampling(2)
+        try:
+            for cls, name in originals:
+                self.assertFalse(cls.__dict__[name] is originals[cls, name])
+            for _ in range(4):
+                expected = london.localize(dt)
+            self.assertEqual(spytz.stats()['localize.samples'], 2)
+            self.assertEqual(expected.tzname(), 'BST')
+        finally:
+            counters.set_sampling(0)
+        for cls, name in originals:
+            self.assertTrue(cls.__dict__[name] is originals[cls, name])
+        london.localize(dt)
+        self.assertEqual(spytz.stats()['localize.samples'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
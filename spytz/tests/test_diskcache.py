@@ -0,0 +1,80 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from spytz.diskcache import DiskCache
+from spytz.tests import load_tables
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.path = os.path.join(tmp, 'zones.db')
+
+    def cache(self, **kwargs):
+        cache = DiskCache(self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def used(self, key):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute('SELECT used FROM spytz_cache WHERE key = ?',
+                                (key,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_round_trip(self):
+        tables = load_tables()
+        cache = self.cache()
+        for zone in ('Europe/London', 'Asia/Tokyo', 'UTC'):
+            cache.set('2014.4', zone, tables[zone])
+        cache.set('2014.4', '_alltzs_', sorted(tables))
+        for zone in ('Europe/London', 'Asia/Tokyo', 'UTC'):
+            self.assertEqual(cache.get('2014.4', zone), tables[zone])
+        self.assertEqual(cache.get('2014.4', '_alltzs_'), sorted(tables))
+        self.assertEqual(cache.get('2014.5', 'Europe/London'), None)
+        # Shared with another connection to the same file.
+        self.assertEqual(self.cache().get('2014.4', 'Asia/Tokyo'),
+                         tables['Asia/Tokyo'])
+
+    def test_hits_touch_rarely(self):
+        cache = self.cache()
+        cache.set('v', 'a', [1])
+        used = self.used('a')
+        self.assertEqual(cache.get('v', 'a'), [1])
+        self.assertEqual(self.used('a'), used)
+
+        cache.touch_interval = 0
+        cache.get('v', 'a')
+        self.assertTrue(self.used('a') > used)
+
+    def test_evicts_least_recently_used(self):
+        cache = self.cache(max_entries=3, touch_interval=0)
+        for key in 'abc':
+            cache.set('v', key, key)
+        cache.get('v', 'a')
+        cache.set('v', 'd', 'd')
+        self.assertEqual([cache.get('v', key) for key in 'abcd'],
+                         ['a', None, 'c', 'd'])
+
+    def test_max_bytes(self):
+        cache = self.cache(max_bytes=3000)
+        for n in range(10):
+            cache.set('v', str(n), 'x' * 1000)
+        self.assertEqual(cache.get('v', '0'), None)
+        self.assertEqual(cache.get('v', '9'), 'x' * 1000)
+
+    def test_clear(self):
+        cache = self.cache()
+        cache.set('v', 'a', 1)
+        cache.clear()
+        self.assertEqual(cache.get('v', 'a'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
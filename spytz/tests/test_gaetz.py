@@ -0,0 +1,52 @@
+import unittest
+
+from spytz import counters
+from spytz.exceptions import UnknownTimeZoneError
+
+try:
+    from google.appengine.ext import ndb
+    from google.appengine.ext import testbed
+    from google.appengine.api import memcache
+    from spytz import gaetz
+except ImportError:
+    testbed = None
+
+
+@unittest.skipIf(testbed is None, 'requires the App Engine SDK')
+class NotFoundCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1400000000.0
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.addCleanup(self.testbed.deactivate)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub(gettime=lambda: self.now)
+        ndb.get_context().clear_cache()
+        counters.reset()
+        self.addCleanup(counters.reset)
+
+    def lookup(self):
+        self.assertRaises(UnknownTimeZoneError, gaetz.get_tzdata,
+                          'Nowhere/Land')
+
+    def test_unknown_zone_is_cached(self):
+        self.lookup()
+        self.assertEqual(counters.stats()['datastore.misses'], 1)
+        self.assertEqual(memcache.get('Nowhere/Land',
+                                      namespace=gaetz.MC_NAMESPACE),
+                         gaetz.MC_NOT_FOUND)
+
+        # Served from memcache, without reading the datastore.
+        self.lookup()
+        self.assertEqual(counters.stats()['datastore.misses'], 1)
+        self.assertEqual(counters.stats()['memcache.hits'], 1)
+
+        # Read from the datastore again once the entry expires.
+        self.now += gaetz.MC_NOT_FOUND_TIME + 1
+        self.lookup()
+        self.assertEqual(counters.stats()['datastore.misses'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
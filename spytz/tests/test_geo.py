@@ -0,0 +1,56 @@
+import random
+import unittest
+
+from spytz import geo
+from spytz.tests import load_file
+
+
+def _zone_coords():
+    coords = {}
+    for line in load_file('zone.tab').decode('US-ASCII').splitlines():
+        if line and not line.startswith('#'):
+            fields = line.split('\t')
+            coords[fields[2]] = fields[1]
+    return coords
+
+
+class NearestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = geo.build_index(_zone_coords())
+
+    def brute_force(self, lat, lon, k):
+        q = geo._to_vector(lat, lon)
+        dists = sorted((sum((a - b) ** 2 for a, b in zip(p[:3], q)), p[3])
+                       for p in self.index)
+        return [zone for dist, zone in dists[:k]]
+
+    def test_matches_brute_force(self):
+        rnd = random.Random(32)
+        for i in range(500):
+            lat, lon = rnd.uniform(-90, 90), rnd.uniform(-180, 180)
+            for k in (1, 3):
+                self.assertEqual(geo.nearest(self.index, lat, lon, k),
+                                 self.brute_force(lat, lon, k))
+
+    def test_known_location(self):
+        self.assertEqual(geo.nearest(self.index, -37.8, 145.0),
+                         ['Australia/Melbourne'])
+
+    def test_k_larger_than_index(self):
+        self.assertEqual(len(geo.nearest(self.index, 0, 0, 10000)),
+                         len(self.index))
+
+    def test_k_zero(self):
+        self.assertRaises(ValueError, geo.nearest, self.index, 0, 0, 0)
+        self.assertRaises(ValueError, geo.nearest_many, self.index,
+                          [(0, 0)], 0)
+
+    def test_nearest_many(self):
+        points = [(-37.8, 145.0), (51.5, -0.1)]
+        self.assertEqual(geo.nearest_many(self.index, points),
+                         [['Australia/Melbourne'], ['Europe/London']])
+
+
+if __name__ == '__main__':
+    unittest.main()
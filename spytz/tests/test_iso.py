@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+import random
+import unittest
+
+import spytz
+from spytz.tests import install_zones
+
+
+class FixedOffsetFromStringTest(unittest.TestCase):
+
+    def test_forms(self):
+        for value, minutes in (('+05:30', 330), ('+0530', 330),
+                               ('-08:00', -480), ('-0800', -480),
+                               ('+10', 600), ('-03', -180)):
+            tz = spytz.fixed_offset_from_string(value)
+            self.assertTrue(tz is spytz.FixedOffset(minutes), value)
+
+    def test_utc(self):
+        for value in ('Z', 'z', '+00:00', '-0000', '+00'):
+            self.assertTrue(spytz.fixed_offset_from_string(value)
+                            is spytz.utc, value)
+
+    def test_invalid(self):
+        for value in ('', '05:30', '+5:30', '+05:3', '+0530x', 'UTC'):
+            self.assertRaises(ValueError, spytz.fixed_offset_from_string,
+                              value)
+
+
+class ParseTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+
+    def test_matches_strptime(self):
+        rnd = random.Random(41)
+        values = []
+        expected = []
+        for _ in range(2000):
+            dt = datetime(2000, 1, 1) + timedelta(
+                seconds=rnd.randrange(30 * 365 * 86400),
+                microseconds=rnd.choice((0, rnd.randrange(1000000))))
+            minutes = rnd.randrange(-14 * 60, 14 * 60 + 1, 15)
+            sign = '-' if minutes < 0 else '+'
+            offset = '%s%02d:%02d' % (sign, abs(minutes) // 60,
+                                      abs(minutes) % 60)
+            text = dt.strftime('%Y-%m-%dT%H:%M:%S')
+            if dt.microsecond:
+                text += '.%06d' % dt.microsecond
+            values.append(text + offset)
+            expected.append(dt.replace(tzinfo=spytz.FixedOffset(minutes)))
+        result = spytz.parse_iso_datetimes(values)
+        self.assertEqual(result, expected)
+        self.assertEqual([dt.utcoffset() for dt in result],
+                         [dt.utcoffset() for dt in expected])
+
+    def test_forms(self):
+        melbourne = spytz.timezone('Australia/Melbourne')
+        wall = datetime(2014, 4, 15, 10, 0)
+        cases = [
+            ('2014-04-15T10:00', spytz.utc.localize(wall)),
+            ('2014-04-15 10:00:00Z', spytz.utc.localize(wall)),
+            ('2014-04-15t10:00:00,5+10:00',
+             wall.replace(microsecond=500000,
+                          tzinfo=spytz.FixedOffset(600))),
+            ('2014-04-15T10:00:00 Australia/Melbourne',
+             melbourne.localize(wall)),
+            ('2014-04-15T10:00:00+00:00[Australia/Melbourne]',
+             spytz.utc.localize(wall).astimezone(melbourne)),
+        ]
+        for value, expected in cases:
+            result = spytz.parse_iso_datetime(value)
+            self.assertEqual(result, expected, value)
+            self.assertEqual(result.tzinfo, expected.tzinfo, value)
+
+    def test_default_and_is_dst(self):
+        london = spytz.timezone('Europe/London')
+        ambiguous = datetime(2014, 10, 26, 1, 30)
+        for is_dst in (False, True):
+            self.assertEqual(
+                spytz.parse_iso_datetime('2014-10-26T01:30', london, is_dst),
+                london.localize(ambiguous, is_dst))
+            self.assertEqual(
+                spytz.parse_iso_datetime('2014-10-26T01:30 Europe/London',
+                                         is_dst=is_dst),
+                london.localize(ambiguous, is_dst))
+
+    def test_naive(self):
+        values = ['2014-04-15T10:00', '2014-04-15T10:00Z']
+        self.assertEqual(
+            spytz.parse_iso_datetimes(values, naive=True),
+            [datetime(2014, 4, 15, 10, 0),
+             spytz.utc.localize(datetime(2014, 4, 15, 10, 0))])
+
+    def test_invalid(self):
+        for value in ('2014-04-15', '2014/04/15T10:00', '2014-04-15T10:00.',
+                      '2014-04-15T10:00+10:00]', '2014-04-15T10:00:5',
+                      '2014-04-15T10:00:5Z', '2014-04-15T10: 0',
+                      '2014-4-15T10:00:00', ' 014-04-15T10:00',
+                      '2014-04-15T+1:00', '2014-04-15T10:00:+5'):
+            self.assertRaises(ValueError, spytz.parse_iso_datetime, value)
+        self.assertRaises(spytz.UnknownTimeZoneError,
+                          spytz.parse_iso_datetime,
+                          '2014-04-15T10:00 Nowhere/Land')
+
+
+if __name__ == '__main__':
+    unittest.main()
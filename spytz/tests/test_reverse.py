@@ -0,0 +1,85 @@
+from bisect import bisect_right
+from datetime import datetime
+import calendar
+import unittest
+
+from spytz import reverse
+from spytz.tests import load_tables
+
+_YEAR = 366 * 24 * 60 * 60
+
+
+def _seconds(dt):
+    return calendar.timegm(dt.utctimetuple())
+
+
+class ReverseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tables = load_tables()
+        self.built = _seconds(datetime(2010, 6, 1))
+        self.index = reverse.build_index(self.tables, self.built)
+
+    def brute_force(self, now):
+        '''Return {abbreviation: zones} and {offset: zones} used from now
+        to a year later'''
+        abbreviations = {}
+        offsets = {}
+        for zone, (transitions, lindexes, ttinfos) in self.tables.items():
+            if transitions:
+                times = transitions[1:]
+                lo = bisect_right(times, now)
+                hi = bisect_right(times, now + _YEAR)
+                used = set(lindexes[lo:hi + 1])
+            else:
+                used = set([0])
+            for i in used:
+                utcoffset, dst, tzname = ttinfos[i]
+                abbreviations.setdefault(tzname.upper(), set()).add(zone)
+                offsets.setdefault(utcoffset, set()).add(zone)
+        return abbreviations, offsets
+
+    def test_current_matches_brute_force(self):
+        # Long after the index was built, the lookups still agree with the
+        # tables at the time of the lookup.
+        for when in (datetime(2010, 6, 1), datetime(2011, 11, 6, 6),
+                     datetime(2014, 3, 30, 1), datetime(2025, 1, 1)):
+            now = _seconds(when)
+            abbreviations, offsets = self.brute_force(now)
+            for abbreviation in self.index['abbreviations']:
+                self.assertEqual(
+                    reverse.zones_for_abbreviation(self.index, abbreviation,
+                                                   now=now),
+                    sorted(abbreviations.get(abbreviation, [])),
+                    (when, abbreviation))
+            for offset, zones in offsets.items():
+                self.assertEqual(
+                    reverse.zones_for_offset(self.index, offset, now=now),
+                    sorted(zones), (when, offset))
+
+    def test_stale_offset_dropped(self):
+        # Moscow stayed on +4 from March 2011, so +3 stops being current.
+        before = _seconds(datetime(2010, 6, 1))
+        after = _seconds(datetime(2012, 1, 1))
+        self.assertTrue('Europe/Moscow' in reverse.zones_for_offset(
+            self.index, 3 * 3600, now=before))
+        self.assertFalse('Europe/Moscow' in reverse.zones_for_offset(
+            self.index, 3 * 3600, now=after))
+        self.assertTrue('Europe/Moscow' in reverse.zones_for_offset(
+            self.index, 4 * 3600, now=after))
+
+    def test_historic(self):
+        zones = reverse.zones_for_abbreviation(self.index, 'lmt',
+                                               historic=True)
+        self.assertTrue('Europe/London' in zones)
+        self.assertEqual(reverse.zones_for_abbreviation(self.index, 'XYZT'),
+                         [])
+
+    def test_unknown(self):
+        self.assertEqual(reverse.zones_for_offset(self.index, 12345), [])
+        # Before the index was built nothing is known to be current.
+        self.assertEqual(reverse.zones_for_offset(self.index, 0, now=0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
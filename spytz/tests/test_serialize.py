@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, tzinfo
+import unittest
+
+import spytz
+from spytz import serialize
+from spytz.tests import install_zones
+
+
+class _Offset(tzinfo):
+    '''Picklable fixed offset tzinfo that isn't interned'''
+
+    def __init__(self, minutes):
+        self.minutes = minutes
+
+    def utcoffset(self, dt):
+        return timedelta(minutes=self.minutes)
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def __reduce__(self):
+        return _Offset, (self.minutes,)
+
+
+class SerializeTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+
+    def round_trip(self, datetimes):
+        result = serialize.loads_datetimes(
+            serialize.dumps_datetimes(datetimes))
+        self.assertEqual(result, datetimes)
+        return result
+
+    def test_round_trip(self):
+        datetimes = []
+        for zone in ('Europe/London', 'America/New_York', 'Asia/Kolkata'):
+            tz = spytz.timezone(zone)
+            for days in range(0, 3650, 7):
+                utc = datetime(2005, 1, 1) + timedelta(days=days, hours=days)
+                datetimes.append(tz.fromutc(utc.replace(tzinfo=tz)))
+        datetimes.append(spytz.utc.localize(datetime(2014, 6, 1)))
+        datetimes.append(datetime(2014, 6, 1, 12))
+
+        result = self.round_trip(datetimes)
+        for dt, loaded in zip(datetimes, result):
+            # Each DST or standard tzinfo comes back as the same instance.
+            self.assertTrue(dt.tzinfo is loaded.tzinfo)
+
+    def test_microseconds_and_wide_seconds(self):
+        tz = spytz.timezone('Australia/Melbourne')
+        self.round_trip([
+            tz.localize(datetime(1850, 1, 1, 0, 0, 0, 1)),
+            tz.localize(datetime(2100, 12, 31, 23, 59, 59, 999999)),
+            datetime.min, datetime.max])
+
+    def test_empty(self):
+        self.assertEqual(serialize.loads_datetimes(
+            serialize.dumps_datetimes([])), [])
+
+    def test_many_tzinfos(self):
+        for count in (0x101, 0x10001):
+            datetimes = [datetime(2014, 1, 1, tzinfo=_Offset(n % 1440))
+                         for n in range(count)]
+            result = serialize.loads_datetimes(
+                serialize.dumps_datetimes(datetimes))
+            self.assertEqual([dt.tzinfo.minutes for dt in result],
+                             [n % 1440 for n in range(count)])
+
+    def test_bad_magic(self):
+        self.assertRaises(ValueError, serialize.loads_datetimes,
+                          b'XXXX' + b'\0' * 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+import unittest
+
+from spytz import shared
+from spytz.tests import load_tables
+from spytz.tzfile import build_tzinfo_from_table
+
+
+def _fields(dt):
+    return (dt.replace(tzinfo=None), dt.utcoffset(), dt.dst(), dt.tzname())
+
+
+class SharedTablesTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.path = os.path.join(tmp, 'spytz.tables')
+        self.tables = load_tables()
+        shared.write_tables(self.path, self.tables, '2014.4')
+        self.shared = shared.SharedTables(self.path)
+        self.addCleanup(self.shared.close)
+
+    def test_directory(self):
+        self.assertEqual(self.shared.version, '2014.4')
+        self.assertEqual(self.shared.zones, sorted(self.tables))
+        self.assertTrue('Europe/London' in self.shared)
+        self.assertFalse('Nowhere/Land' in self.shared)
+
+    def test_tables_match(self):
+        for zone, table in self.tables.items():
+            self.assertEqual(self.shared._table(zone), table, zone)
+
+    def test_matches_bundle_build(self):
+        for zone in ('Europe/London', 'America/New_York', 'Asia/Kolkata',
+                     'Australia/Lord_Howe', 'Pacific/Apia', 'UTC'):
+            tz = self.shared.build_tzinfo(zone)
+            expected = build_tzinfo_from_table(zone, self.tables[zone])
+            dt = datetime(1900, 1, 1)
+            while dt < datetime(2040, 1, 1):
+                for is_dst in (False, True):
+                    self.assertEqual(_fields(tz.localize(dt, is_dst)),
+                                     _fields(expected.localize(dt, is_dst)),
+                                     (zone, dt))
+                self.assertEqual(
+                    _fields(tz.fromutc(dt.replace(tzinfo=tz))),
+                    _fields(expected.fromutc(dt.replace(tzinfo=expected))),
+                    (zone, dt))
+                dt += timedelta(days=13, hours=7)
+
+    def test_not_a_table_file(self):
+        path = self.path + '.bad'
+        with open(path, 'wb') as fo:
+            fo.write(b'\0' * 64)
+        self.assertRaises(ValueError, shared.SharedTables, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+import calendar
+import unittest
+
+import spytz
+from spytz import transitions
+from spytz.tests import install_zones, load_tables
+
+
+def _seconds(dt):
+    return calendar.timegm(dt.utctimetuple())
+
+
+class TransitionsTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+        self.tables = load_tables()
+
+    def tearDown(self):
+        spytz.flush_local_cache()
+
+    def brute_force(self, start, end):
+        start = _seconds(start)
+        end = _seconds(end)
+        found = []
+        for zone, (times, lindexes, ttinfos) in self.tables.items():
+            for when in times[1:]:
+                if start <= when < end:
+                    found.append(transitions.ZoneTransition(
+                        datetime(1970, 1, 1) + timedelta(seconds=when),
+                        zone))
+        return sorted(found)
+
+    def test_between(self):
+        since = _seconds(datetime(2010, 1, 1))
+        index = transitions.build_index(self.tables, since)
+        self.assertEqual(transitions.indexed_from(index), since)
+        for start, end in ((datetime(2010, 1, 1), datetime(2011, 1, 1)),
+                           (datetime(2014, 3, 9, 10), datetime(2014, 3, 31)),
+                           (datetime(2030, 1, 1), datetime(2030, 1, 2))):
+            self.assertEqual(
+                transitions.between(index, _seconds(start), _seconds(end)),
+                self.brute_force(start, end))
+
+    def test_before_index_falls_back(self):
+        start = datetime(2009, 11, 1)
+        end = datetime(2010, 4, 1)
+        spytz._transition_index = transitions.build_index(
+            self.tables, _seconds(datetime(2010, 1, 1)))
+        self.assertEqual(spytz.zone_transitions_between(start, end),
+                         self.brute_force(start, end))
+
+    def test_without_index(self):
+        start = datetime(2014, 3, 1)
+        end = datetime(2014, 4, 1)
+        spytz._transition_index = []
+        self.assertEqual(spytz.zone_transitions_between(start, end),
+                         self.brute_force(start, end))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from datetime import datetime
+
+import spytz
+from spytz import tzinfo
+from spytz.tests import install_zones, load_tables
+from spytz.tzfile import build_tzinfo_from_table
+from spytz.tzinfo import DstTzInfo
+
+
+class InternedTablesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tables = load_tables()
+
+    def test_links_share_tables(self):
+        eastern = build_tzinfo_from_table('US/Eastern',
+                                          self.tables['US/Eastern'])
+        new_york = build_tzinfo_from_table('America/New_York',
+                                           self.tables['America/New_York'])
+        self.assertIs(eastern._utc_transition_times,
+                      new_york._utc_transition_times)
+        self.assertIs(eastern._transition_info, new_york._transition_info)
+
+    def test_tables_are_immutable(self):
+        tz = build_tzinfo_from_table('Australia/Melbourne',
+                                     self.tables['Australia/Melbourne'])
+        self.assertTrue(isinstance(tz, DstTzInfo))
+        self.assertTrue(isinstance(tz._utc_transition_times, tuple))
+        self.assertEqual(tz._utc_transition_times[0], datetime.min)
+
+    def test_cache_is_bounded(self):
+        size = tzinfo.TRANSITIONS_CACHE_SIZE
+        tzinfo.TRANSITIONS_CACHE_SIZE = 2
+        tzinfo._transitions_cache.clear()
+        try:
+            zones = ['Europe/London', 'Asia/Tokyo', 'Europe/London',
+                     'Australia/Sydney']
+            tables = [build_tzinfo_from_table(zone, self.tables[zone])
+                      ._utc_transition_times for zone in zones]
+            self.assertIs(tables[0], tables[2])
+            # Asia/Tokyo was the least recently used.
+            self.assertEqual([table[0] for table in
+                              tzinfo._transitions_cache],
+                             [tables[0], tables[3]])
+        finally:
+            tzinfo.TRANSITIONS_CACHE_SIZE = size
+
+    def test_flushed_with_local_cache(self):
+        install_zones()
+        spytz.flush_local_cache()
+        spytz.timezone('Europe/London')
+        self.assertTrue(tzinfo._transitions_cache)
+        spytz.flush_local_cache()
+        self.assertEqual(len(tzinfo._transitions_cache), 0)
+
+    def test_every_zone_builds(self):
+        for zone, table in self.tables.items():
+            tz = build_tzinfo_from_table(zone, table)
+            self.assertEqual(tz.zone, zone)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+from datetime import date, datetime, timedelta
+import pickle
+import unittest
+
+import spytz
+from spytz import tzinfo
+from spytz.tests import install_zones
+
+ZONES = ['Europe/London', 'America/Sao_Paulo', 'Australia/Lord_Howe',
+         'Asia/Kolkata', 'Pacific/Apia', 'UTC']
+
+SKIPPED = date(2011, 12, 30)
+
+
+class DayBoundsTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+
+    def check_start(self, tz, day, start):
+        self.assertEqual(start.date(), day)
+        self.assertEqual(start, tz.normalize(start))
+        # The instant before belongs to an earlier day.
+        before = (start - timedelta(microseconds=1)).astimezone(tz)
+        self.assertTrue(before.date() < day, (tz.zone, day, before))
+
+    def test_matches_brute_force(self):
+        for zone in ZONES:
+            tz = spytz.timezone(zone)
+            day = date(2008, 1, 1)
+            while day < date(2016, 1, 1):
+                if (zone, day) != ('Pacific/Apia', SKIPPED):
+                    start, end = tz.day_bounds(day)
+                    self.check_start(tz, day, start)
+                    self.assertTrue(end > start)
+                    after = (end - timedelta(microseconds=1)).astimezone(tz)
+                    self.assertEqual(after.date(), day, (zone, day))
+                day += timedelta(days=1)
+
+    def test_skipped_day(self):
+        apia = spytz.timezone('Pacific/Apia')
+        self.assertRaises(spytz.NonExistentTimeError,
+                          apia.day_bounds, SKIPPED)
+        start, end = apia.day_bounds(SKIPPED - timedelta(days=1))
+        self.assertEqual(end, apia.day_bounds(date(2011, 12, 31))[0])
+        self.assertEqual(end - start, timedelta(days=1))
+        # 2011-12-30 12:00 UTC is on the 31st in Apia.
+        self.assertEqual(apia.start_of('day', datetime(2011, 12, 30, 12)),
+                         end)
+
+    def test_cache_evicts_least_recently_used(self):
+        tz = spytz.timezone('Europe/London')
+        size = tzinfo.DAY_CACHE_SIZE
+        tzinfo.DAY_CACHE_SIZE = 3
+        try:
+            tz.__class__._day_cache = None
+            days = [date(2014, 1, n) for n in range(1, 5)]
+            first = tz.day_bounds(days[0])
+            tz.day_bounds(days[1])
+            tz.day_bounds(days[2])
+            self.assertTrue(tz.day_bounds(days[0]) is first)
+            tz.day_bounds(days[3])
+            self.assertEqual(list(tz.__class__._day_cache),
+                             [days[2], days[0], days[3]])
+        finally:
+            tzinfo.DAY_CACHE_SIZE = size
+            tz.__class__._day_cache = None
+
+
+
+class SiblingTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+        spytz.flush_local_cache()
+        self.addCleanup(spytz.flush_local_cache)
+        self.tz = spytz.timezone('Europe/London')
+
+    def test_created_lazily(self):
+        tz = self.tz
+        self.assertFalse(hasattr(tz, '__dict__'))
+        self.assertEqual(list(tz._tzinfos.values()), [tz])
+        summer = tz.localize(datetime(2014, 7, 1, 12))
+        winter = tz.localize(datetime(2014, 1, 1, 12))
+        self.assertEqual(len(tz._tzinfos), 3)
+        self.assertTrue(len(tz._tzinfos) < len(set(tz._transition_info)))
+        self.assertFalse(hasattr(summer.tzinfo, '__dict__'))
+
+        # Every path answers with the same instances.
+        self.assertTrue(
+            tz.localize(datetime(2015, 7, 1)).tzinfo is summer.tzinfo)
+        self.assertTrue(
+            tz.normalize(summer + timedelta(days=184)).tzinfo
+            is winter.tzinfo)
+        self.assertTrue(
+            tz.normalize(winter + timedelta(days=181)).tzinfo
+            is summer.tzinfo)
+        self.assertTrue(summer.astimezone(spytz.utc).astimezone(tz).tzinfo
+                        is summer.tzinfo)
+        self.assertEqual(len(tz._tzinfos), 3)
+
+    def test_pickle(self):
+        tz = self.tz
+        summer = tz.localize(datetime(2014, 7, 1, 12))
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            result = pickle.loads(pickle.dumps(summer, protocol))
+            self.assertEqual(result, summer)
+            self.assertTrue(result.tzinfo is summer.tzinfo)
+
+        # Unpickling creates siblings that aren't in use yet.
+        data = pickle.dumps(summer)
+        spytz.flush_local_cache()
+        tz = spytz.timezone('Europe/London')
+        self.assertEqual(len(tz._tzinfos), 1)
+        result = pickle.loads(data)
+        self.assertEqual(result, summer)
+        self.assertTrue(result.tzinfo is tz.localize(
+            datetime(2014, 7, 1, 12)).tzinfo)
+
+
+if __name__ == '__main__':
+    unittest.main()
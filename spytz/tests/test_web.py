@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, tzinfo
+import unittest
+
+import spytz
+from spytz import conversion
+from spytz import web
+from spytz.tests import install_zones
+
+ZONES = ['Australia/Melbourne', 'America/New_York', 'Asia/Kolkata',
+         'Pacific/Apia', 'UTC']
+
+
+class _Summer(tzinfo):
+    '''A tzinfo without transition queries, an hour ahead from April to
+    September'''
+
+    def utcoffset(self, dt):
+        return self.dst(dt)
+
+    def dst(self, dt):
+        return timedelta(hours=4 <= dt.month <= 9)
+
+    def tzname(self, dt):
+        return 'SUM' if self.dst(dt) else 'WIN'
+
+
+class ZoneConverterTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+
+    def test_to_local_matches_astimezone(self):
+        paris = spytz.timezone('Europe/Paris')
+        for zone in ZONES:
+            tz = spytz.timezone(zone)
+            converter = web.ZoneConverter(zone)
+            # An odd step lands on both sides of transitions.
+            dt = datetime(2008, 1, 1)
+            while dt < datetime(2016, 1, 1):
+                expected = spytz.utc.localize(dt).astimezone(tz)
+                result = converter.to_local(dt)
+                self.assertEqual(result, expected, (zone, dt))
+                self.assertTrue(result.tzinfo is expected.tzinfo)
+                aware = converter.to_local(expected.astimezone(paris))
+                self.assertTrue(aware.tzinfo is expected.tzinfo)
+                dt += timedelta(minutes=23 * 60 + 47)
+
+    def test_format_matches_strftime(self):
+        tz = spytz.timezone('Australia/Melbourne')
+        converter = web.ZoneConverter(tz)
+        for fmt in (web.DEFAULT_FORMAT, '%H:%M %Z', '%%Z %Z%%', '%Z%Z'):
+            dt = datetime(2014, 1, 1)
+            while dt < datetime(2015, 1, 1):
+                expected = spytz.utc.localize(dt).astimezone(tz)
+                self.assertEqual(converter.format(dt, fmt),
+                                 expected.strftime(fmt), (fmt, dt))
+                dt += timedelta(hours=71)
+
+    def test_without_abbreviation(self):
+        converter = web.ZoneConverter(spytz.FixedOffset(330))
+        self.assertEqual(converter.format(datetime(2014, 1, 1)),
+                         '2014-01-01 05:30 ')
+
+    def test_without_transitions(self):
+        tz = _Summer()
+        converter = web.ZoneConverter(tz)
+        for month in (1, 6, 12, 7):
+            dt = datetime(2014, month, 1)
+            expected = spytz.utc.localize(dt).astimezone(tz)
+            self.assertEqual(converter.to_local(dt), expected)
+            self.assertEqual(converter.format(dt), expected.strftime(
+                web.DEFAULT_FORMAT))
+
+    def test_from_local(self):
+        tz = spytz.timezone('Australia/Melbourne')
+        converter = web.ZoneConverter(tz)
+        conversion._table_cache.clear()
+        for dt in (datetime(2014, 4, 6, 2, 30), datetime(2014, 10, 5, 2, 30),
+                   datetime(2014, 7, 1, 12)):
+            for is_dst in (False, True):
+                self.assertEqual(converter.from_local(dt, is_dst),
+                                 tz.localize(dt, is_dst))
+        self.assertEqual(len(conversion._table_cache), 0)
+
+
+class ResolveTest(unittest.TestCase):
+
+    def setUp(self):
+        install_zones()
+
+    def test_resolve_order(self):
+        def resolver(environ):
+            return environ.get('user_tz')
+
+        for environ, zone in [
+                ({}, 'UTC'),
+                ({'HTTP_COOKIE': 'a=b; tz=Australia/Melbourne'},
+                 'Australia/Melbourne'),
+                ({'HTTP_X_TIMEZONE': 'Europe/London'}, 'Europe/London'),
+                ({'HTTP_COOKIE': 'tz=Bogus/Zone',
+                  'HTTP_X_TIMEZONE': 'Asia/Tokyo'}, 'Asia/Tokyo'),
+                ({'user_tz': 'America/New_York',
+                  'HTTP_COOKIE': 'tz=Asia/Tokyo'}, 'America/New_York')]:
+            converter = web.resolve_converter(environ, resolver)
+            self.assertEqual(converter.zone, zone)
+
+    def test_middleware(self):
+        seen = []
+
+        def app(environ, start_response):
+            seen.append((environ[web.ENVIRON_ZONE],
+                         environ[web.ENVIRON_CONVERTER]))
+            return []
+
+        middleware = web.TimezoneMiddleware(app)
+        environ = {'HTTP_COOKIE': 'tz=Asia/Tokyo'}
+        middleware(environ, None)
+        self.assertEqual(seen[0][0], 'Asia/Tokyo')
+        self.assertTrue(web.get_converter(environ) is seen[0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
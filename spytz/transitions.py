@@ -0,0 +1,61 @@
+'''
+Cross-zone index of upcoming transitions.
+
+The index is a flat list of [seconds, zone] pairs sorted by UTC seconds
+since the epoch, so it can be kept as a single JSON or memcache value like
+the spytz.geo index. It is built once per data update from the
+parse_tzfile() tables of every zone, starting from the beginning of the year
+the update ran, as mostly upcoming transitions are queried. Indexing every
+transition would outgrow a single memcache value.
+
+The first entry, [seconds, ''], records where the index starts. Transitions
+before that have to be found from each zone's own transitions, see
+indexed_from().
+'''
+
+from bisect import bisect_left
+from collections import namedtuple
+import calendar
+import time
+
+from spytz.tzinfo import memorized_datetime
+
+__all__ = ['ZoneTransition', 'build_index', 'indexed_from', 'between']
+
+# A transition in any zone. utc is the naive UTC time it takes effect.
+ZoneTransition = namedtuple('ZoneTransition', ('utc', 'zone'))
+
+
+def build_index(tables, since=None):
+    '''Build the index from a dictionary of zone to parse_tzfile() table,
+    keeping transitions from since, in UTC seconds since the epoch. since
+    defaults to the start of the current year.'''
+    if since is None:
+        since = calendar.timegm((time.gmtime().tm_year, 1, 1, 0, 0, 0))
+
+    index = []
+    for zone, (transitions, lindexes, ttinfos) in tables.items():
+        for when in transitions:
+            if when is not None and when >= since:
+                index.append([when, zone])
+    index.sort()
+    # The empty zone name sorts before any transition at since.
+    return [[since, '']] + index
+
+
+def indexed_from(index):
+    '''Return the UTC seconds since the epoch from which the index holds
+    every transition, or None if it is empty'''
+    if not index:
+        return None
+    return index[0][0]
+
+
+def between(index, start, end):
+    '''Return a list of ZoneTransitions in the index from start up to but
+    not including end, in UTC seconds since the epoch'''
+    # [seconds] sorts before every [seconds, zone] pair with equal seconds.
+    lo = bisect_left(index, [start])
+    hi = bisect_left(index, [end])
+    return [ZoneTransition(memorized_datetime(when), zone)
+            for when, zone in index[lo:hi] if zone]
@@ -3,15 +3,15 @@
 $Id: tzfile.py,v 1.8 2004/06/03 00:15:24 zenzen Exp $
 '''
 
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from io import StringIO
 from datetime import datetime, timedelta
 from struct import unpack, calcsize
+import time
+
+from spytz import counters
 
 from spytz.tzinfo import StaticTzInfo, DstTzInfo, memorized_ttinfo
 from spytz.tzinfo import memorized_datetime, memorized_timedelta
+from spytz.tzinfo import memorized_transitions
 
 def _byte_string(s):
     """Cast a string or byte string to an ASCII byte string."""
@@ -23,7 +23,17 @@ def _std_string(s):
     """Cast a string or byte string to an ASCII string."""
     return str(s.decode('US-ASCII'))
 
-def build_tzinfo(zone, fp):
+def parse_tzfile(fp):
+    """Parse a tzfile(5) into a plain transition table.
+
+    Returns a (transitions, lindexes, ttinfos) tuple of tuples holding only
+    ints and strings, so the table can be marshalled, written out as a
+    Python literal or passed to build_tzinfo_from_table(). transitions are
+    UTC seconds since the epoch, with None standing in for datetime.min.
+    lindexes index into ttinfos, the distinct (utcoffset, dst, tzname)
+    entries used by the zone. A zone without transitions has a single
+    ttinfos entry.
+    """
     head_fmt = '>4s c 15x 6l'
     head_size = calcsize(head_fmt)
     (magic, format, ttisgmtcnt, ttisstdcnt,leapcnt, timecnt,
@@ -40,8 +50,7 @@ def build_tzinfo(zone, fp):
 
     # make sure we unpacked the right number of values
     assert len(data) == 2 * timecnt + 3 * typecnt + 1
-    transitions = [memorized_datetime(trans)
-                   for trans in data[:timecnt]]
+    transitions = list(data[:timecnt])
     lindexes = list(data[timecnt:2 * timecnt])
     ttinfo_raw = data[2 * timecnt:-1]
     tznames_raw = data[-1]
@@ -65,65 +74,101 @@ def build_tzinfo(zone, fp):
                        tznames[tzname_offset]))
         i += 3
 
+    if len(transitions) == 0:
+        return (), (), ((ttinfo[0][0], 0, ttinfo[0][2]),)
+
+    # Early dates use the first standard time ttinfo
+    i = 0
+    while ttinfo[i][1]:
+        i += 1
+    if ttinfo[i] == ttinfo[lindexes[0]]:
+        transitions[0] = None
+    else:
+        transitions.insert(0, None)
+        lindexes.insert(0, i)
+
+    # calculate transition info
+    transition_info = []
+    ttinfos = {}
+    for i in range(len(transitions)):
+        inf = ttinfo[lindexes[i]]
+        utcoffset = inf[0]
+        if not inf[1]:
+            dst = 0
+        else:
+            for j in range(i-1, -1, -1):
+                prev_inf = ttinfo[lindexes[j]]
+                if not prev_inf[1]:
+                    break
+            dst = inf[0] - prev_inf[0] # dst offset
+
+            # Bad dst? Look further. DST > 24 hours happens when
+            # a timzone has moved across the international dateline.
+            if dst <= 0 or dst > 3600*3:
+                for j in range(i+1, len(transitions)):
+                    stdinf = ttinfo[lindexes[j]]
+                    if not stdinf[1]:
+                        dst = inf[0] - stdinf[0]
+                        if dst > 0:
+                            break # Found a useful std time.
+
+        tzname = inf[2]
+
+        # Round utcoffset and dst to the nearest minute or the
+        # datetime library will complain. Conversions to these timezones
+        # might be up to plus or minus 30 seconds out, but it is
+        # the best we can do.
+        utcoffset = int((utcoffset + 30) // 60) * 60
+        dst = int((dst + 30) // 60) * 60
+        transition_info.append(
+            ttinfos.setdefault((utcoffset, dst, tzname), len(ttinfos)))
+
+    ttinfos = sorted(ttinfos, key=ttinfos.get)
+    return tuple(transitions), tuple(transition_info), tuple(ttinfos)
+
+
+def _build_tzinfo(zone, table):
+    transitions, lindexes, ttinfos = table
+
     # Now build the timezone object
     if len(transitions) == 0:
-        ttinfo[0][0], ttinfo[0][2]
         cls = type(zone, (StaticTzInfo,), dict(
+            __slots__=(),
             zone=zone,
-            _utcoffset=memorized_timedelta(ttinfo[0][0]),
-            _tzname=ttinfo[0][2]))
+            _utcoffset=memorized_timedelta(ttinfos[0][0]),
+            _tzname=ttinfos[0][2]))
     else:
-        # Early dates use the first standard time ttinfo
-        i = 0
-        while ttinfo[i][1]:
-            i += 1
-        if ttinfo[i] == ttinfo[lindexes[0]]:
-            transitions[0] = datetime.min
-        else:
-            transitions.insert(0, datetime.min)
-            lindexes.insert(0, i)
-
-        # calculate transition info
-        transition_info = []
-        for i in range(len(transitions)):
-            inf = ttinfo[lindexes[i]]
-            utcoffset = inf[0]
-            if not inf[1]:
-                dst = 0
-            else:
-                for j in range(i-1, -1, -1):
-                    prev_inf = ttinfo[lindexes[j]]
-                    if not prev_inf[1]:
-                        break
-                dst = inf[0] - prev_inf[0] # dst offset
-
-                # Bad dst? Look further. DST > 24 hours happens when
-                # a timzone has moved across the international dateline.
-                if dst <= 0 or dst > 3600*3:
-                    for j in range(i+1, len(transitions)):
-                        stdinf = ttinfo[lindexes[j]]
-                        if not stdinf[1]:
-                            dst = inf[0] - stdinf[0]
-                            if dst > 0:
-                                break # Found a useful std time.
-
-            tzname = inf[2]
-
-            # Round utcoffset and dst to the nearest minute or the
-            # datetime library will complain. Conversions to these timezones
-            # might be up to plus or minus 30 seconds out, but it is
-            # the best we can do.
-            utcoffset = int((utcoffset + 30) // 60) * 60
-            dst = int((dst + 30) // 60) * 60
-            transition_info.append(memorized_ttinfo(utcoffset, dst, tzname))
+        transition_info = [memorized_ttinfo(*inf) for inf in ttinfos]
+
+        # Share the table with any other zone that has an identical history.
+        transitions, transition_info = memorized_transitions(
+            [datetime.min if trans is None else memorized_datetime(trans)
+             for trans in transitions],
+            [transition_info[i] for i in lindexes])
 
         cls = type(zone, (DstTzInfo,), dict(
+            __slots__=(),
             zone=zone,
             _utc_transition_times=transitions,
             _transition_info=transition_info))
 
     return cls()
 
+
+def build_tzinfo_from_table(zone, table):
+    """Build a tzinfo instance from a table returned by parse_tzfile()."""
+    _ts = time.time()
+    tzinfo = _build_tzinfo(zone, table)
+    counters.timing('build', time.time() - _ts)
+    return tzinfo
+
+
+def build_tzinfo(zone, fp):
+    _ts = time.time()
+    tzinfo = _build_tzinfo(zone, parse_tzfile(fp))
+    counters.timing('build', time.time() - _ts)
+    return tzinfo
+
 if __name__ == '__main__':
     import os.path
     from pprint import pprint
@@ -1,7 +1,8 @@
 '''Base classes and helpers for building zone specific tzinfo classes'''
 
 from datetime import datetime, timedelta, tzinfo
-from bisect import bisect_right
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, OrderedDict
 try:
     set
 except NameError:
@@ -49,22 +50,188 @@ def memorized_ttinfo(*args):
         _ttinfo_cache[args] = ttinfo
         return ttinfo
 
+# Interned transition tables, least recently used first. Cleared by
+# spytz.flush_local_cache(), so tables of older data versions are dropped
+# after an update.
+_transitions_cache = OrderedDict()
+TRANSITIONS_CACHE_SIZE = 1000
+def memorized_transitions(transitions, transition_info):
+    '''Create only one instance of each distinct transition table
+
+    Zones sharing a history (links such as US/Eastern and America/New_York,
+    or zones that have followed the same rules since their LMT entry)
+    reference the same pair of immutable tuples instead of holding their own
+    lists.
+    '''
+    table = (tuple(transitions), tuple(transition_info))
+    try:
+        table = _transitions_cache.pop(table)
+    except KeyError:
+        while len(_transitions_cache) >= TRANSITIONS_CACHE_SIZE:
+            try:
+                _transitions_cache.popitem(last=False)
+            except KeyError:
+                break
+    # Reinserted as the most recently used.
+    return _transitions_cache.setdefault(table, table)
+
 _notime = memorized_timedelta(0)
 
 def _to_seconds(td):
     '''Convert a timedelta to seconds'''
     return td.seconds + td.days * 24 * 60 * 60
 
+def _to_utc(dt):
+    '''Convert an aware datetime to naive UTC. Naive datetimes are taken to
+    be in UTC already.'''
+    if dt.tzinfo is None:
+        return dt
+    return dt.replace(tzinfo=None) - dt.utcoffset()
+
+
+# A change of offset or abbreviation in a zone. utc is the naive UTC time it
+# takes effect, before and after are the zone's tzinfo instances either side.
+Transition = namedtuple('Transition', ('utc', 'before', 'after'))
+
+# Periods understood by start_of().
+PERIODS = ('day', 'week', 'month', 'year')
+
+# Most day_bounds() results kept per zone.
+DAY_CACHE_SIZE = 1000
+
+def _day_start(tz, day):
+    '''Return the first instant of date day in tz as an aware datetime.
+    Raises NonExistentTimeError if the whole day was skipped.'''
+    midnight = datetime(day.year, day.month, day.day)
+    try:
+        return tz.localize(midnight, is_dst=None)
+    except AmbiguousTimeError:
+        return min(tz.localize(midnight, is_dst=True),
+                   tz.localize(midnight, is_dst=False), key=_to_utc)
+    except NonExistentTimeError:
+        # Midnight was skipped, so the day starts at the transition.
+        earliest = min(tz.localize(midnight, is_dst=True),
+                       tz.localize(midnight, is_dst=False), key=_to_utc)
+        after = tz.next_transition(earliest)
+        if after is None:
+            start = tz.normalize(earliest)
+        else:
+            start = tz.fromutc(after.utc.replace(tzinfo=tz))
+        if start.date() != day:
+            # The transition jumped over the whole day, as when a zone
+            # crosses the date line.
+            raise NonExistentTimeError(day)
+        return start
+
+def _next_day_start(tz, day):
+    '''Return the first instant of the first date after day that exists in
+    tz'''
+    while True:
+        day += timedelta(days=1)
+        try:
+            return _day_start(tz, day)
+        except NonExistentTimeError:
+            pass
+
+def _day_bounds(tz, day):
+    '''Return the (start, end) aware datetimes of date day in tz. The end
+    is the start of the next day that exists.'''
+    return _day_start(tz, day), _next_day_start(tz, day)
+
+def _start_of(tz, period, dt):
+    '''Return the start of the period containing dt in tz, see
+    BaseTzInfo.start_of()'''
+    if dt is None:
+        local = tz.now()
+    elif dt.tzinfo is None:
+        local = tz.fromutc(dt.replace(tzinfo=tz))
+    else:
+        local = dt.astimezone(tz)
+
+    day = local.date()
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    elif period == 'month':
+        day = day.replace(day=1)
+    elif period == 'year':
+        day = day.replace(month=1, day=1)
+    elif period != 'day':
+        raise ValueError('Unknown period %r, expected one of %r'
+                         % (period, PERIODS))
+    try:
+        return tz.day_bounds(day)[0]
+    except NonExistentTimeError:
+        # The period's first day was skipped.
+        return _next_day_start(tz, day)
+
 
 class BaseTzInfo(tzinfo):
+    __slots__ = ()
+
     # Overridden in subclass
     _utcoffset = None
     _tzname = None
     zone = None
 
+    # Set on each zone's class, shared by its instances. _today is the
+    # (UTC start, UTC end, day_bounds()) of the current day, and
+    # _day_cache the day_bounds() of other dates, least recently used
+    # first.
+    _today = (datetime.max, datetime.min, None)
+    _day_cache = None
+
     def __str__(self):
         return self.zone
 
+    def now(self):
+        '''Return the current time in this timezone'''
+        return self.fromutc(datetime.utcnow().replace(tzinfo=self))
+
+    def day_bounds(self, date=None):
+        '''Return the aware datetimes starting date and the day after in
+        this timezone, for today if date is None
+
+        The bounds of the current day are kept until it ends, and those of
+        other dates are cached per zone. Raises NonExistentTimeError for a
+        date the zone skipped entirely, such as Pacific/Apia's 2011-12-30,
+        and the day before it ends at the start of the day after.
+        '''
+        cls = self.__class__
+        if date is None:
+            utc = datetime.utcnow()
+            start, end, bounds = cls._today
+            if start <= utc < end:
+                return bounds
+            bounds = self.day_bounds(
+                self.fromutc(utc.replace(tzinfo=self)).date())
+            cls._today = (_to_utc(bounds[0]), _to_utc(bounds[1]), bounds)
+            return bounds
+
+        if isinstance(date, datetime):
+            date = date.date()
+        cache = cls.__dict__.get('_day_cache')
+        if cache is None:
+            cache = cls._day_cache = OrderedDict()
+        try:
+            bounds = cache.pop(date)
+        except KeyError:
+            bounds = _day_bounds(self, date)
+            while len(cache) >= DAY_CACHE_SIZE:
+                try:
+                    cache.popitem(last=False)
+                except KeyError:
+                    break
+        # Reinserted as the most recently used.
+        return cache.setdefault(date, bounds)
+
+    def start_of(self, period, dt=None):
+        '''Return the aware datetime starting the day, week, month or year
+        containing dt in this timezone. Weeks start on Monday.
+
+        dt is an aware datetime, a naive datetime in UTC or None for now.
+        '''
+        return _start_of(self, period, dt)
+
 
 class StaticTzInfo(BaseTzInfo):
     '''A timezone that has a constant offset from UTC
@@ -72,6 +239,8 @@ class StaticTzInfo(BaseTzInfo):
     These timezones are rare, as most locations have changed their
     offset at some point in their history
     '''
+    __slots__ = ()
+
     def fromutc(self, dt):
         '''See datetime.tzinfo.fromutc'''
         if dt.tzinfo is not None and dt.tzinfo is not self:
@@ -137,6 +306,18 @@ class StaticTzInfo(BaseTzInfo):
             raise ValueError('Naive time - no tzinfo set')
         return dt.astimezone(self)
 
+    def next_transition(self, dt):
+        '''StaticTzInfo timezones have no transitions, returns None'''
+        return None
+
+    def prev_transition(self, dt):
+        '''StaticTzInfo timezones have no transitions, returns None'''
+        return None
+
+    def transitions_between(self, start, end):
+        '''StaticTzInfo timezones have no transitions, returns []'''
+        return []
+
     def __repr__(self):
         return '<StaticTzInfo %r>' % (self.zone,)
 
@@ -153,28 +334,45 @@ class DstTzInfo(BaseTzInfo):
     or at a point in history when the region decides to change their
     timezone definition.
     '''
+    # Set in __init__. _dst is the DST offset.
+    __slots__ = ('_tzinfos', '_utcoffset', '_dst', '_tzname')
+
     # Overridden in subclass
-    _utc_transition_times = None # Sorted list of DST transition times in UTC
+    _utc_transition_times = None # Sorted tuple of DST transition times in UTC
     _transition_info = None # [(utcoffset, dstoffset, tzname)] corresponding
                             # to _utc_transition_times entries
     zone = None
 
-    # Set in __init__
-    _tzinfos = None
-    _dst = None # DST offset
-
     def __init__(self, _inf=None, _tzinfos=None):
         if _inf:
             self._tzinfos = _tzinfos
             self._utcoffset, self._dst, self._tzname = _inf
         else:
-            _tzinfos = {}
+            # The instances for the zone's other ttinfos are created by
+            # _TzInfos the first time a datetime needs them.
+            _tzinfos = _TzInfos(self.__class__)
             self._tzinfos = _tzinfos
             self._utcoffset, self._dst, self._tzname = self._transition_info[0]
             _tzinfos[self._transition_info[0]] = self
-            for inf in self._transition_info[1:]:
-                if inf not in _tzinfos:
-                    _tzinfos[inf] = self.__class__(inf, _tzinfos)
+
+    # Set on each zone's class. The (UTC start, UTC end, utcoffset, tzinfo)
+    # of the transition interval now() last fell in.
+    _now_interval = (datetime.max, datetime.min, None, None)
+
+    def now(self):
+        '''Return the current time in this timezone'''
+        utc = datetime.utcnow()
+        start, end, offset, tzinfo = self.__class__._now_interval
+        if start <= utc < end:
+            return (utc + offset).replace(tzinfo=tzinfo)
+
+        local = self.fromutc(utc.replace(tzinfo=self))
+        prev = self.prev_transition(utc)
+        after = self.next_transition(utc)
+        self.__class__._now_interval = (prev.utc if prev else datetime.min,
+                                        after.utc if after else datetime.max,
+                                        local.utcoffset(), local.tzinfo)
+        return local
 
     def fromutc(self, dt):
         '''See datetime.tzinfo.fromutc'''
@@ -485,6 +683,54 @@ class DstTzInfo(BaseTzInfo):
         else:
             return self._tzname
 
+    def _transition(self, idx):
+        info = self._transition_info
+        return Transition(self._utc_transition_times[idx],
+                          self._tzinfos[info[idx - 1]],
+                          self._tzinfos[info[idx]])
+
+    def next_transition(self, dt):
+        '''Return the first Transition after dt, or None
+
+        dt is an aware datetime, or a naive datetime in UTC.
+
+        >>> from pytz import timezone
+        >>> tz = timezone('Australia/Melbourne')
+        >>> t = tz.next_transition(datetime(2014, 1, 1))
+        >>> t.utc
+        datetime.datetime(2014, 4, 5, 16, 0)
+        >>> t.before
+        <DstTzInfo 'Australia/Melbourne' EST+11:00:00 DST>
+        >>> t.after
+        <DstTzInfo 'Australia/Melbourne' EST+10:00:00 STD>
+        '''
+        idx = bisect_right(self._utc_transition_times, _to_utc(dt))
+        if idx >= len(self._utc_transition_times):
+            return None
+        return self._transition(idx)
+
+    def prev_transition(self, dt):
+        '''Return the last Transition at or before dt, or None
+
+        dt is an aware datetime, or a naive datetime in UTC.
+        '''
+        # The first entry is datetime.min, not a transition.
+        idx = bisect_right(self._utc_transition_times, _to_utc(dt)) - 1
+        if idx < 1:
+            return None
+        return self._transition(idx)
+
+    def transitions_between(self, start, end):
+        '''Return a list of the Transitions from start up to but not
+        including end
+
+        start and end are aware datetimes, or naive datetimes in UTC.
+        '''
+        times = self._utc_transition_times
+        lo = max(1, bisect_left(times, _to_utc(start)))
+        hi = bisect_left(times, _to_utc(end))
+        return [self._transition(idx) for idx in range(lo, hi)]
+
     def __repr__(self):
         if self._dst:
             dst = 'DST'
@@ -510,6 +756,21 @@ class DstTzInfo(BaseTzInfo):
                 )
 
 
+class _TzInfos(dict):
+    '''The DstTzInfo instances of a zone, keyed by (utcoffset, dst, tzname).
+
+    Instances are created on first lookup, as most of a zone's history is
+    never used.
+    '''
+    __slots__ = ('_cls',)
+
+    def __init__(self, cls):
+        dict.__init__(self)
+        self._cls = cls
+
+    def __missing__(self, inf):
+        return self.setdefault(inf, self._cls(inf, self))
+
 
 def unpickler(zone, utcoffset=None, dstoffset=None, tzname=None):
     """Factory function for unpickling pytz tzinfo instances.
@@ -533,22 +794,31 @@ def unpickler(zone, utcoffset=None, dstoffset=None, tzname=None):
     # it correctly.
     utcoffset = memorized_timedelta(utcoffset)
     dstoffset = memorized_timedelta(dstoffset)
-    try:
-        return tz._tzinfos[(utcoffset, dstoffset, tzname)]
-    except KeyError:
-        # The particular state requested in this timezone no longer exists.
-        # This indicates a corrupt pickle, or the timezone database has been
-        # corrected violently enough to make this particular
-        # (utcoffset,dstoffset) no longer exist in the zone, or the
-        # abbreviation has been changed.
-        pass
+    inf = (utcoffset, dstoffset, tzname)
+    # get() doesn't create missing instances, unlike indexing _tzinfos.
+    localized_tz = tz._tzinfos.get(inf)
+    if localized_tz is not None:
+        return localized_tz
+
+    # Not used yet, or the particular state requested in this timezone no
+    # longer exists. This indicates a corrupt pickle, or the timezone
+    # database has been corrected violently enough to make this particular
+    # (utcoffset,dstoffset) no longer exist in the zone, or the abbreviation
+    # has been changed.
+
+    infs = set(tz._transition_info)
+    if inf in infs:
+        return tz._tzinfos[inf]
 
     # See if we can find an entry differing only by tzname. Abbreviations
     # get changed from the initial guess by the database maintainers to
     # match reality when this information is discovered.
-    for localized_tz in tz._tzinfos.values():
-        if (localized_tz._utcoffset == utcoffset
-                and localized_tz._dst == dstoffset):
+    for other in infs:
+        if other[0] == utcoffset and other[1] == dstoffset:
+            # Remember the match, so later pickles with the old
+            # abbreviation don't scan again.
+            localized_tz = tz._tzinfos[other]
+            tz._tzinfos[inf] = localized_tz
             return localized_tz
 
     # This (utcoffset, dstoffset) information has been removed from the
@@ -557,7 +827,6 @@ def unpickler(zone, utcoffset=None, dstoffset=None, tzname=None):
     # incorrect information will continue to do so, exactly as they were
     # before being pickled. This is purely an overly paranoid safety net - I
     # doubt this will ever been needed in real life.
-    inf = (utcoffset, dstoffset, tzname)
     tz._tzinfos[inf] = tz.__class__(inf, tz._tzinfos)
     return tz._tzinfos[inf]
 
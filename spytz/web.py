@@ -0,0 +1,222 @@
+'''
+Request scoped timezone conversion for WSGI and webapp2 applications, with
+Jinja2 filters.
+
+TimezoneMiddleware resolves each request's timezone once, from a resolver
+function such as a user profile lookup, a cookie or a header, and stores a
+ZoneConverter for it in the WSGI environ:
+
+    app = spytz.web.TimezoneMiddleware(webapp2.WSGIApplication(routes),
+                                       resolver=profile_timezone)
+
+    class Handler(webapp2.RequestHandler):
+        def get(self):
+            converter = spytz.web.get_converter(self.request)
+            self.render('page.html', spytz_converter=converter, ...)
+
+A ZoneConverter remembers the UTC interval between the transitions around
+the last time it converted, and its abbreviation, so converting and
+formatting the many datetimes of a page is an addition and a replace() for
+each rather than a search of the zone's transitions. install_filters() adds
+localtime and tzformat filters to a Jinja2 environment that use the
+spytz_converter in the template context.
+'''
+
+from datetime import datetime
+
+try:
+    from http.cookies import SimpleCookie, CookieError
+except ImportError:
+    from Cookie import SimpleCookie, CookieError
+
+import spytz
+from spytz.exceptions import UnknownTimeZoneError
+
+__all__ = ['ZoneConverter', 'TimezoneMiddleware', 'resolve_converter',
+           'get_converter', 'install_filters']
+
+# WSGI environ keys set by TimezoneMiddleware.
+ENVIRON_ZONE = 'spytz.zone'
+ENVIRON_CONVERTER = 'spytz.converter'
+
+# Template context variable used by the Jinja2 filters.
+CONTEXT_CONVERTER = 'spytz_converter'
+
+DEFAULT_FORMAT = '%Y-%m-%d %H:%M %Z'
+
+
+class ZoneConverter(object):
+    '''Converts datetimes to one timezone, remembering the transition
+    interval of the last conversion'''
+
+    def __init__(self, tz):
+        if not hasattr(tz, 'utcoffset'):
+            tz = spytz.timezone(tz)
+        self.tz = tz
+        # (UTC start, UTC end, utcoffset, tzinfo, abbreviation) of the last
+        # interval used.
+        self._interval = (datetime.max, datetime.min, None, None, None)
+        # (format, abbreviation, format with the abbreviation filled in) of
+        # the last format() call.
+        self._format = (None, None, None)
+
+    @property
+    def zone(self):
+        return getattr(self.tz, 'zone', None) or str(self.tz)
+
+    def _find_interval(self, utc):
+        local = self.tz.fromutc(utc.replace(tzinfo=self.tz))
+        # The abbreviation is None for some tzinfos, such as FixedOffset.
+        abbreviation = local.tzname() or ''
+        if not hasattr(self.tz, 'next_transition'):
+            # Without its transitions, a tzinfo's offset can't be reused
+            # for other times. Only the abbreviation is kept, for format().
+            self._interval = (datetime.max, datetime.min, None, None,
+                              abbreviation)
+            return local
+        prev = self.tz.prev_transition(utc)
+        after = self.tz.next_transition(utc)
+        self._interval = (prev.utc if prev else datetime.min,
+                          after.utc if after else datetime.max,
+                          local.utcoffset(), local.tzinfo, abbreviation)
+        return local
+
+    def to_local(self, dt):
+        '''Convert an aware datetime, or a naive datetime in UTC, to this
+        timezone'''
+        if dt.tzinfo is not None:
+            utc = dt.replace(tzinfo=None) - dt.utcoffset()
+        else:
+            utc = dt
+        start, end, offset, tzinfo, abbreviation = self._interval
+        if start <= utc < end:
+            return (utc + offset).replace(tzinfo=tzinfo)
+        return self._find_interval(utc)
+
+    def from_local(self, dt, is_dst=False):
+        '''Return naive wall clock dt in this timezone as an aware datetime
+        in UTC'''
+        # Not through spytz.conversion, whose shared table cache request
+        # chosen zones would churn.
+        return self.tz.localize(dt, is_dst).astimezone(spytz.utc)
+
+    def now(self):
+        '''Return the current time in this timezone'''
+        return self.to_local(datetime.utcnow())
+
+    def format(self, dt, fmt=DEFAULT_FORMAT):
+        '''Convert dt as to_local() and format it with strftime()'''
+        local = self.to_local(dt)
+        abbreviation = self._interval[4]
+        last_fmt, last_abbreviation, filled = self._format
+        if fmt != last_fmt or abbreviation != last_abbreviation:
+            filled = _fill_abbreviation(fmt, abbreviation)
+            self._format = (fmt, abbreviation, filled)
+        return local.strftime(filled)
+
+
+def _fill_abbreviation(fmt, abbreviation):
+    '''Return strftime() format fmt with %Z replaced by abbreviation'''
+    abbreviation = abbreviation.replace('%', '%%')
+    return '%%'.join(part.replace('%Z', abbreviation)
+                     for part in fmt.split('%%'))
+
+
+def _cookie(environ, name):
+    try:
+        cookie = SimpleCookie(environ.get('HTTP_COOKIE', ''))
+    except CookieError:
+        return None
+    morsel = cookie.get(name)
+    return morsel and morsel.value
+
+
+def _converter(name):
+    try:
+        return name and ZoneConverter(spytz.timezone(name))
+    except (UnknownTimeZoneError, UnicodeError, ValueError):
+        return None
+
+
+def resolve_converter(environ, resolver=None, cookie='tz',
+                      header='X-Timezone', default='UTC'):
+    '''Return a ZoneConverter for the first valid timezone name from
+    resolver(environ), the cookie or the header, falling back to default'''
+    candidates = []
+    if resolver is not None:
+        candidates.append(lambda: resolver(environ))
+    if cookie:
+        candidates.append(lambda: _cookie(environ, cookie))
+    if header:
+        key = 'HTTP_' + header.upper().replace('-', '_')
+        candidates.append(lambda: environ.get(key))
+
+    for candidate in candidates:
+        converter = _converter(candidate())
+        if converter is not None:
+            return converter
+    return ZoneConverter(default)
+
+
+class TimezoneMiddleware(object):
+    '''WSGI middleware storing the request's timezone name and ZoneConverter
+    in the environ as spytz.zone and spytz.converter'''
+
+    def __init__(self, app, resolver=None, cookie='tz', header='X-Timezone',
+                 default='UTC'):
+        self.app = app
+        self.resolver = resolver
+        self.cookie = cookie
+        self.header = header
+        self.default = default
+
+    def __call__(self, environ, start_response):
+        converter = resolve_converter(environ, self.resolver, self.cookie,
+                                      self.header, self.default)
+        environ[ENVIRON_ZONE] = converter.zone
+        environ[ENVIRON_CONVERTER] = converter
+        return self.app(environ, start_response)
+
+
+def get_converter(request, **kwargs):
+    '''Return the ZoneConverter of a webapp2 or WebOb request, or of a WSGI
+    environ. Requests that didn't pass through TimezoneMiddleware are
+    resolved with resolve_converter() and kwargs.'''
+    environ = getattr(request, 'environ', request)
+    try:
+        return environ[ENVIRON_CONVERTER]
+    except KeyError:
+        converter = resolve_converter(environ, **kwargs)
+        environ[ENVIRON_ZONE] = converter.zone
+        return environ.setdefault(ENVIRON_CONVERTER, converter)
+
+
+def install_filters(environment, default='UTC'):
+    '''Add the localtime and tzformat filters to a Jinja2 environment.
+    Templates rendered without a spytz_converter use default.'''
+    try:
+        from jinja2 import pass_context
+    except ImportError:
+        # Jinja2 before 3.0.
+        from jinja2 import contextfilter as pass_context
+
+    fallback = ZoneConverter(default)
+
+    def converter(context):
+        return context.get(CONTEXT_CONVERTER) or fallback
+
+    @pass_context
+    def localtime(context, value):
+        if value is None:
+            return value
+        return converter(context).to_local(value)
+
+    @pass_context
+    def tzformat(context, value, fmt=DEFAULT_FORMAT):
+        if value is None:
+            return ''
+        return converter(context).format(value, fmt)
+
+    environment.filters['localtime'] = localtime
+    environment.filters['tzformat'] = tzformat
+    return environment
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2014 Chaosity Enterprises Pty Ltd. All Rights Reserved
+
+"""
+Spytz offline benchmark tool.
+
+Runs the spytz.bench suite against a compiled timezone bundle (see
+'spkg.py compile'), so no App Engine SDK, memcache or datastore is needed.
+Optionally compares against pytz and a stored baseline.
+
+Copyright (C) 2014 Chaosity Enterprises. All Rights Reserved.
+"""
+
+import os, sys, argparse, logging
+
+import imp
+import json
+import time
+import tarfile
+import py_compile
+
+__author__ = "Simon Dean <simon.dean@chaosity.net>"
+__status__  = "test"
+__version__ = "0.1.0"
+__date__  = "19 Sep 2014"
+__license__ = "MIT"
+
+app_version = __version__
+
+
+class BundleImporter(object):
+    """ Import hook loading a compiled timezone bundle from any path as
+    spytz.zonebundle.
+    """
+    fullname = 'spytz.zonebundle'
+
+    def __init__(self, compiled_path):
+        self.compiled_path = compiled_path
+
+    def find_module(self, fullname, path=None):
+        if fullname == self.fullname:
+            return self
+
+    def load_module(self, fullname):
+        return imp.load_compiled(fullname, self.compiled_path)
+
+
+def load_bundle(bundle_path):
+    """ Installs the bundle at 'bundle_path' as spytz.zonebundle, then
+    imports spytz. Returns the spytz module and its import time in seconds.
+    """
+    if 'spytz' in sys.modules:
+        raise RuntimeError('spytz is already imported.')
+
+    # Compile the bundle before timing the import, a deployed bundle is
+    # loaded from its cached .pyc.
+    compiled_path = bundle_path + 'c'
+    py_compile.compile(bundle_path, compiled_path, doraise=True)
+    sys.meta_path.insert(0, BundleImporter(compiled_path))
+    _ts = time.time()
+    import spytz
+    return spytz, time.time() - _ts
+
+
+def load_pytz():
+    """ Imports pytz if it is installed. Returns the module and its import
+    time, or (None, None).
+    """
+    _ts = time.time()
+    try:
+        import pytz
+    except ImportError:
+        logging.warning("pytz not installed, skipping comparison.")
+        return None, None
+    return pytz, time.time() - _ts
+
+
+def load_package(pkg_file):
+    """ Returns a dictionary of timezone name to raw tzfile(5) data from a
+    spytz release package.
+    """
+    import spytz
+
+    tzdata = {}
+    with tarfile.open(pkg_file) as tar:
+        for member in tar.getmembers():
+            if member.isfile() and spytz.is_tzdata(tar.extractfile(member)):
+                tzdata[member.name] = tar.extractfile(member).read()
+    return tzdata
+
+
+def run(mod, import_time, number, repeat):
+    from spytz import bench
+
+    logging.info("Benchmarking {}.".format(mod.__name__))
+    result = bench.describe(mod)
+    result['results'] = bench.run_suite(mod, number=number, repeat=repeat)
+    result['results']['import'] = import_time
+    return result
+
+
+# Build the command line parser arguments and options.
+ap = argparse.ArgumentParser(description="Spytz offline benchmark tool.")
+ap.add_argument('-v', action='store_const', dest='verbosity', const=20,
+                help="Verbose logging (INFO level).")
+ap.add_argument('-vv', action='store_const', dest='verbosity', const=10,
+                help="Verbose logging (DEBUG level).")
+
+ap.add_argument('--version', action='version', version=app_version)
+
+ap.add_argument('bundle', action="store", metavar="BUNDLE",
+                help="Compiled timezone bundle, as created by 'spkg.py compile'.")
+ap.add_argument('-n', '--number', action="store", type=int, default=10000,
+                help="Iterations per timing run.")
+ap.add_argument('-r', '--repeat', action="store", type=int, default=3,
+                help="Timing runs per benchmark, the best is reported.")
+ap.add_argument('--no-pytz', action="store_false", dest="pytz",
+                help="Don't benchmark pytz for comparison.")
+ap.add_argument('--tables', action="store", metavar="FILE",
+                help="Shared table file, as created by 'spkg.py share', to "
+                     "also benchmark spytz.shared against the bundle.")
+ap.add_argument('--package', action="store", metavar="FILE",
+                help="Spytz release package to benchmark storage codecs with.")
+ap.add_argument('--baseline', action="store", metavar="FILE",
+                help="Stored results to check for regressions against.")
+ap.add_argument('--threshold', action="store", type=float, default=0.1,
+                help="Allowed slowdown against the baseline, as a fraction.")
+ap.add_argument('--save', action="store", metavar="FILE",
+                help="Write the results to FILE, for use as a baseline.")
+
+args = ap.parse_args()
+
+logging.basicConfig(format='%(levelname)s: %(message)s')
+
+# Change the level of verbosity printed to STDOUT
+if args.verbosity:
+    l = logging.getLogger()
+    l.setLevel(args.verbosity)
+
+logging.debug(args)
+
+if __name__ == "__main__":
+
+    if not os.path.exists(args.bundle):
+        logging.critical("Bundle '{}' not found.".format(args.bundle))
+        sys.exit(1)
+
+    # spytz must be imported first, while its import is still cold.
+    spytz, import_time = load_bundle(args.bundle)
+    report = {'spytz': run(spytz, import_time, args.number, args.repeat)}
+
+    if args.tables:
+        from spytz import bench, shared
+
+        logging.info("Benchmarking shared tables.")
+        shared.install(args.tables)
+        try:
+            report['shared'] = bench.describe(spytz)
+            report['shared']['results'] = bench.run_suite(
+                spytz, number=args.number, repeat=args.repeat)
+        finally:
+            shared.install(None)
+
+        for metric in ('localize', 'fromutc'):
+            logging.info("Shared tables {}: {:.0%} of the bundle time.".format(
+                metric, report['shared']['results'][metric] /
+                report['spytz']['results'][metric]))
+
+    if args.pytz:
+        pytz, import_time = load_pytz()
+        if pytz:
+            report['pytz'] = run(pytz, import_time, args.number, args.repeat)
+
+    if args.package:
+        from spytz import bench
+
+        logging.info("Benchmarking codecs.")
+        report['codecs'] = bench.run_codecs(load_package(args.package),
+                                            repeat=args.repeat)
+
+    regressions = []
+    if args.baseline:
+        from spytz import bench
+
+        with open(args.baseline, "rb") as fo:
+            baseline = json.load(fo)
+
+        regressions = bench.compare(report['spytz']['results'],
+                                    baseline['spytz']['results'],
+                                    args.threshold)
+        report['regressions'] = [dict(zip(('metric', 'baseline', 'result',
+                                           'ratio'), r))
+                                 for r in regressions]
+
+    output = json.dumps(report, indent=4, sort_keys=True)
+    print(output)
+
+    if args.save:
+        with open(args.save, "wb") as fo:
+            fo.write(output)
+        logging.info("Results saved to '{}'.".format(args.save))
+
+    if regressions:
+        for metric, base, value, ratio in regressions:
+            logging.error("Regression in '{}': {:.3g} -> {:.3g} ({:.0%})."
+                          .format(metric, base, value, ratio - 1))
+        sys.exit(1)
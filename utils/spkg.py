@@ -12,9 +12,15 @@ import os, sys, re, argparse, logging
 
 import json
 import tarfile
+from cStringIO import StringIO
 
 # Spytz modules
 from spytz.spud import SpytzUpdateFile
+from spytz.tzfile import parse_tzfile
+from spytz import geo
+from spytz import transitions
+from spytz import reverse
+from spytz import shared
 
 __author__ = "Simon Dean <simon.dean@chaosity.net>"
 __status__  = "test"
@@ -36,6 +42,14 @@ REQUIRED_FILES = [VERSION_FILE, LICENCE_FILE, ALLTZ_FILE, ISO3166_FILE,
 
 PKG_FILENAME_FORMAT = 'spytz-zoneinfo-{}.tar.gz'
 
+# Header written to the top of compiled timezone bundles.
+BUNDLE_HEADER = '''\
+# Generated by 'spkg.py compile' from {}. Do not edit.
+#
+# Precompiled spytz timezone bundle. Install as spytz/zonebundle.py to load
+# timezones without tzfile parsing or datastore access.
+'''
+
 # Regex expression for correct version format
 REGEX_VERSION = "^[0-9]{4}\.[0-9]{1}$"
 
@@ -150,6 +164,109 @@ def build_package(build_path, dst_path, version):
         return fname
 
 
+def compile_bundle(pkg_file, dst_file):
+    """ Compiles a release package into a Python module holding every
+    timezone's parsed transition table, the country metadata and the list of
+    all timezones. The module is plain literals, so it imports from a zip
+    archive and is cached as a .pyc like any other module.
+    """
+    with open(pkg_file, "rb") as fo:
+        spfile = SpytzUpdateFile(fo.read())
+
+    zones = {}
+    zone_countries = {}
+    zone_coords = {}
+    for tz in spfile.next_tz():
+        zones[tz['name']] = parse_tzfile(StringIO(tz['data']))
+        if tz['country']:
+            zone_countries[tz['name']] = tz['country']
+            zone_coords[tz['name']] = tz['coords']
+
+    all_tzs = sorted(zones)
+    logging.info("{} timezones compiled.".format(len(all_tzs)))
+
+    with open(dst_file, "wb") as fo:
+        fo.write(BUNDLE_HEADER.format(os.path.basename(pkg_file)))
+        fo.write("\nVERSION = {!r}\n".format(spfile.version.strip()))
+
+        fo.write("\nALL_TIMEZONES = (\n")
+        for tz in all_tzs:
+            fo.write("    {!r},\n".format(tz))
+        fo.write(")\n")
+
+        # Country code to country name.
+        fo.write("\nCOUNTRY_NAMES = {\n")
+        for cc in sorted(spfile.countries):
+            fo.write("    {!r}: {!r},\n".format(cc, spfile.countries[cc]))
+        fo.write("}\n")
+
+        # Country code to timezones, in zone.tab order.
+        fo.write("\nCOUNTRY_ZONES = {\n")
+        for cc in sorted(spfile.country_zones):
+            fo.write("    {!r}: {!r},\n".format(
+                cc, spfile.country_zones[cc]))
+        fo.write("}\n")
+
+        # Timezone to country code and zone.tab coordinates.
+        fo.write("\nZONE_COUNTRIES = {\n")
+        for tz in sorted(zone_countries):
+            fo.write("    {!r}: {!r},\n".format(tz, zone_countries[tz]))
+        fo.write("}\n")
+
+        fo.write("\nZONE_COORDS = {\n")
+        for tz in sorted(zone_coords):
+            fo.write("    {!r}: {!r},\n".format(tz, zone_coords[tz]))
+        fo.write("}\n")
+
+        # spytz.geo nearest timezone index.
+        fo.write("\nGEO_INDEX = [\n")
+        for point in geo.build_index(zone_coords):
+            fo.write("    {!r},\n".format(point))
+        fo.write("]\n")
+
+        # spytz.transitions upcoming transition index.
+        fo.write("\nTRANSITION_INDEX = [\n")
+        for entry in transitions.build_index(zones):
+            fo.write("    {!r},\n".format(entry))
+        fo.write("]\n")
+
+        # spytz.reverse abbreviation and offset index.
+        index = reverse.build_index(zones)
+        fo.write("\nREVERSE_INDEX = {\n")
+        for part in sorted(index):
+            fo.write("    {!r}: {{\n".format(part))
+            for key in sorted(index[part]):
+                fo.write("        {!r}: {!r},\n".format(key, index[part][key]))
+            fo.write("    },\n")
+        fo.write("}\n")
+
+        # Timezone to (transitions, lindexes, ttinfos) parse_tzfile() tables.
+        fo.write("\nZONES = {\n")
+        for tz in all_tzs:
+            fo.write("    {!r}: {!r},\n".format(tz, zones[tz]))
+        fo.write("}\n")
+
+    logging.debug("Spytz bundle created as '{}'.".format(dst_file))
+    return dst_file
+
+
+def share_tables(pkg_file, dst_file):
+    """ Writes every timezone's transition table in a release package to a
+    spytz.shared table file, for pre-fork servers to map before forking.
+    """
+    with open(pkg_file, "rb") as fo:
+        spfile = SpytzUpdateFile(fo.read())
+
+    zones = {}
+    for tz in spfile.next_tz():
+        zones[tz['name']] = parse_tzfile(StringIO(tz['data']))
+    logging.info("{} timezones written.".format(len(zones)))
+
+    shared.write_tables(dst_file, zones, spfile.version.strip())
+    logging.debug("Spytz shared tables created as '{}'.".format(dst_file))
+    return dst_file
+
+
 def check_path(path, create=False):
     """ Checks if 'path' exists on the filesystem. If 'create' is True and
     'path' doesn't exist, the path will be created.
@@ -230,6 +347,23 @@ ap_check = subparsers.add_parser('check', help='Sanity check a spytz release pac
 ap_check.add_argument('source', action="store", metavar="SOURCE",
                       help="Spytz package file path.")
 
+# Parsers for the 'compile' command
+ap_compile = subparsers.add_parser('compile',
+                                   help='Compile a spytz release package into a Python module.')
+ap_compile.add_argument('source', action="store", metavar="SOURCE",
+                        help="Spytz package file path.")
+ap_compile.add_argument('dest', action="store", metavar="dest", nargs='?',
+                        default='spytz/zonebundle.py',
+                        help="Path of the generated module, usually spytz/zonebundle.py.")
+
+# Parsers for the 'share' command
+ap_share = subparsers.add_parser('share',
+                                 help='Write a spytz release package as a shared table file.')
+ap_share.add_argument('source', action="store", metavar="SOURCE",
+                      help="Spytz package file path.")
+ap_share.add_argument('dest', action="store", metavar="dest",
+                      help="Path of the shared table file.")
+
 # Parsers for the 'release' command
 ap_release = subparsers.add_parser('publish', help='Build the release.json file.')
 ap_release.add_argument('dest', action='store', metavar='dest',
@@ -271,6 +405,20 @@ if __name__ == "__main__":
             logging.error("Sanity check failed.")
             sys.exit(1)
     
+    elif args.cmd_name == 'compile':
+        if compile_bundle(args.source, args.dest):
+            logging.info("Bundle successfully compiled.")
+        else:
+            logging.error("Bundle not compiled.")
+            sys.exit(1)
+
+    elif args.cmd_name == 'share':
+        if share_tables(args.source, args.dest):
+            logging.info("Shared tables successfully written.")
+        else:
+            logging.error("Shared tables not written.")
+            sys.exit(1)
+
     elif args.cmd_name == 'publish':
         if build_json(args.dest):
             logging.info("Release file successfully published.")